@@ -32,12 +32,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware
+    'equipment.middleware.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Needs request.user; profiles staff requests that ask for it
+    'equipment.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,9 +73,14 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # EQUIPMENT_DB_PATH points a run at another database (e.g. benchmarks)
+        'NAME': os.environ.get('EQUIPMENT_DB_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
+# EQUIPMENT_SQLITE_WAL=1 switches SQLite to write-ahead logging, so readers
+# are not blocked while an upload is written. Opt-in: it changes the
+# database file's header and adds -wal/-shm files next to it.
+EQUIPMENT_SQLITE_WAL = os.environ.get('EQUIPMENT_SQLITE_WAL', '') == '1'
 
 
 # Password validation
@@ -130,9 +139,97 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'equipment.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        # Column-wise binary rows for Accept: application/x-msgpack
+        'equipment.renderers.MsgpackRenderer',
+    ],
 }
 
 
+# Background ingestion (POST /api/upload/?async=true)
+EQUIPMENT_INGEST_WORKERS = int(os.environ.get('EQUIPMENT_INGEST_WORKERS', 2))
+# Uploads waiting to be analyzed
+EQUIPMENT_SPOOL_DIR = os.environ.get('EQUIPMENT_SPOOL_DIR', os.path.join(BASE_DIR, 'spool'))
+EQUIPMENT_JOBS_SYNC = False  # Run jobs inline instead of on the pool (tests)
+# Seconds after which an upload or append still in progress is presumed
+# dead (its process stopped) and its partial rows are removed
+EQUIPMENT_INGEST_STALE_AFTER = int(os.environ.get('EQUIPMENT_INGEST_STALE_AFTER', 6 * 60 * 60))
+
+# Resumable chunked uploads (/api/uploads/)
+EQUIPMENT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Default chunk size offered to clients
+EQUIPMENT_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+EQUIPMENT_UPLOAD_MAX_BYTES = int(os.environ.get('EQUIPMENT_UPLOAD_MAX_BYTES', 4 * 1024 ** 3))
+EQUIPMENT_UPLOAD_SESSION_TTL = 24 * 60 * 60  # Seconds before an abandoned session is purged
+
+
+# Cache for dashboard responses. 'locmem' suits a single process; use
+# 'file' or 'db' (run `manage.py createcachetable` first) when several
+# worker processes must see each other's invalidations.
+EQUIPMENT_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'equipment',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('EQUIPMENT_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'equipment_cache',
+    },
+}
+CACHES = {
+    'default': {
+        **EQUIPMENT_CACHE_BACKENDS[os.environ.get('EQUIPMENT_CACHE_BACKEND', 'locmem')],
+        'TIMEOUT': int(os.environ.get('EQUIPMENT_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            # Entries kept before the oldest are culled
+            'MAX_ENTRIES': int(os.environ.get('EQUIPMENT_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+EQUIPMENT_CACHE_ALIAS = 'default'
+
+
+# Rendered PDF reports, reused until a dataset's summary changes
+EQUIPMENT_REPORT_CACHE_DIR = os.environ.get('EQUIPMENT_REPORT_CACHE_DIR', os.path.join(BASE_DIR, 'report_cache'))
+EQUIPMENT_REPORT_CACHE_MAX_BYTES = int(os.environ.get('EQUIPMENT_REPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+EQUIPMENT_REPORT_PRERENDER = os.environ.get('EQUIPMENT_REPORT_PRERENDER', '') == '1'  # Render right after upload
+
+# Report rendering process pool; 0 workers renders inline
+EQUIPMENT_REPORT_WORKERS = int(os.environ.get('EQUIPMENT_REPORT_WORKERS', 2))
+EQUIPMENT_REPORT_QUEUE_DEPTH = int(os.environ.get('EQUIPMENT_REPORT_QUEUE_DEPTH', 8))  # Renders allowed to wait
+EQUIPMENT_REPORT_RETRY_AFTER = 5  # Seconds clients are told to wait when the queue is full
+
+
+# Scrapers allowed to read /api/metrics/ without a staff login: requests
+# sending 'Authorization: Bearer <EQUIPMENT_METRICS_TOKEN>', and requests
+# from EQUIPMENT_METRICS_ALLOWED_IPS. Both are off by default; behind a
+# reverse proxy every request comes from the proxy's address.
+EQUIPMENT_METRICS_TOKEN = os.environ.get('EQUIPMENT_METRICS_TOKEN', '')
+EQUIPMENT_METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('EQUIPMENT_METRICS_ALLOWED_IPS', '').split(',') if ip]
+
+# Server-sent events (/api/events/): events kept per user for clients
+# resuming with Last-Event-ID, seconds between keepalive comments, and
+# seconds after which a stream ends and the client reconnects
+EQUIPMENT_EVENTS_BUFFER = int(os.environ.get('EQUIPMENT_EVENTS_BUFFER', 100))
+EQUIPMENT_EVENTS_KEEPALIVE = 15
+EQUIPMENT_EVENTS_MAX_AGE = 300
+
+# Request profiles of staff users (?profile=1), newest EQUIPMENT_PROFILE_KEEP kept
+EQUIPMENT_PROFILE_DIR = os.environ.get('EQUIPMENT_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+EQUIPMENT_PROFILE_KEEP = int(os.environ.get('EQUIPMENT_PROFILE_KEEP', 50))
+
+
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Hash uploads as they are received so repeated files are recognized
+FILE_UPLOAD_HANDLERS = [
+    'equipment.uploads.HashingMemoryFileUploadHandler',
+    'equipment.uploads.HashingTemporaryFileUploadHandler',
+]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Dataset
+from .models import Anomaly, Dataset, EquipmentRecord, IngestJob, UploadSession
 
 
 @admin.register(Dataset)
@@ -7,8 +7,37 @@ class DatasetAdmin(admin.ModelAdmin):
     list_display = ['file_name', 'uploaded_at', 'get_equipment_count']
     list_filter = ['uploaded_at']
     search_fields = ['file_name']
-    readonly_fields = ['uploaded_at', 'summary', 'raw_data']
+    readonly_fields = ['uploaded_at', 'summary']
     
     def get_equipment_count(self, obj):
         return obj.summary.get('total_equipment', 0)
     get_equipment_count.short_description = 'Equipment Count'
+
+
+@admin.register(EquipmentRecord)
+class EquipmentRecordAdmin(admin.ModelAdmin):
+    list_display = ['name', 'type', 'flowrate', 'pressure', 'temperature', 'dataset']
+    list_filter = ['type']
+    search_fields = ['name']
+    raw_id_fields = ['dataset']
+
+
+@admin.register(Anomaly)
+class AnomalyAdmin(admin.ModelAdmin):
+    list_display = ['dataset', 'row_index', 'column', 'value', 'z_score', 'iqr_score', 'mad_score']
+    list_filter = ['column']
+    raw_id_fields = ['dataset']
+
+
+@admin.register(IngestJob)
+class IngestJobAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'user', 'status', 'stage', 'rows_processed', 'created_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'updated_at', 'timings']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'user', 'status', 'total_size', 'chunk_size', 'created_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'updated_at']
@@ -0,0 +1,276 @@
+"""
+Anomaly detection for uploaded datasets.
+Every Flowrate, Pressure and Temperature value gets three scores:
+
+- a z-score against the column's mean and standard deviation,
+- an IQR-fence score: its distance outside the quartiles, in IQRs,
+- a robust (modified) z-score, 0.6745 * (x - median) / MAD, against the
+  median and MAD of the rows of the same Type.
+
+When over half the values are equal, the MAD (or the IQR) is 0 and says
+nothing about the spread of the rest. The score then falls back to the
+mean absolute deviation from the median, scaled to match, as in IBM
+SPSS: (x - median) / (1.253314 * MeanAD).
+
+A value is flagged when any score passes its threshold. The statistics
+are only known once the whole file has been read, so the parse pass
+spools each chunk's numeric columns to a temporary file (AnomalySpool)
+and the spool is scored chunk by chunk afterwards. Both passes are
+linear and vectorized; memory stays bounded by the chunk size.
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Anomaly
+from .queries import QueryError
+from .stats import mean_absolute_deviation, median_absolute_deviation
+from .utils import NUMERIC_COLUMNS
+
+
+# A value is flagged when |z-score| > Z_THRESHOLD, when it lies more than
+# IQR_FACTOR IQRs outside the quartiles, or when |modified z-score| > MAD_THRESHOLD
+Z_THRESHOLD = 3.0
+IQR_FACTOR = 1.5
+MAD_THRESHOLD = 3.5
+
+# Makes the MAD of normally distributed data comparable to a standard deviation
+MAD_SCALE = 0.6745
+# Likewise for the mean absolute deviation, the fallback when the MAD is 0
+MEANAD_SCALE = 1.253314
+# IQRs per standard deviation of normally distributed data, to turn the
+# fallback into an IQR when the quartiles coincide
+IQR_PER_STD = 1.349
+
+# Anomalies written per INSERT
+ANOMALY_BATCH_SIZE = 2000
+
+# ?method= values and the score each one thresholds
+METHODS = {
+    'zscore': ('z_score', Z_THRESHOLD),
+    'iqr': ('iqr_score', IQR_FACTOR),
+    'mad': ('mad_score', MAD_THRESHOLD),
+}
+
+
+class AnomalySpool:
+    """
+    Numeric columns and Type codes of a dataset's rows, written to a
+    temporary file chunk by chunk during the parse pass and read back
+    in the same chunks for scoring.
+    """
+
+    def __init__(self, start_index=0):
+        spool_dir = getattr(settings, 'EQUIPMENT_SPOOL_DIR', None) or tempfile.gettempdir()
+        os.makedirs(spool_dir, exist_ok=True)
+        self.file = tempfile.TemporaryFile(dir=spool_dir)
+        self.start_index = start_index
+        self.types = {}  # Type -> code
+        self.chunk_sizes = []
+
+    def add(self, chunk):
+        """
+        Spools a validated DataFrame chunk.
+        """
+        inverse, uniques = pd.factorize(chunk['Type'].astype(str))
+        codes = np.array([self.types.setdefault(t, len(self.types)) for t in uniques], dtype=float)[inverse]
+        matrix = np.column_stack([chunk[col].to_numpy(dtype=float) for col in NUMERIC_COLUMNS] + [codes])
+        self.file.write(matrix.tobytes())
+        self.chunk_sizes.append(len(matrix))
+
+    def chunks(self):
+        """
+        Yields (index of the first row, values with one column per
+        numeric column, Type codes) for every spooled chunk.
+        """
+        width = len(NUMERIC_COLUMNS) + 1
+        self.file.seek(0)
+        row_index = self.start_index
+        for size in self.chunk_sizes:
+            matrix = np.frombuffer(self.file.read(size * width * 8), dtype=float).reshape(size, width)
+            yield row_index, matrix[:, :-1], matrix[:, -1].astype(np.int64)
+            row_index += size
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def anomaly_thresholds(accumulator):
+    """
+    Statistics the scores are computed against, from a dataset's
+    SummaryAccumulator: per column the mean, standard deviation,
+    quartiles and the ``iqr`` the IQR score divides by, and the median,
+    MAD and robust ``scale`` (what the modified z-score divides
+    ``x - median`` by) of every Type.
+    """
+    thresholds = {}
+    for col in NUMERIC_COLUMNS:
+        digest = accumulator.digests[col]
+        q1, median, q3 = digest.quantiles([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        if not iqr > 0:
+            iqr = IQR_PER_STD * MEANAD_SCALE * mean_absolute_deviation(digest, median)
+        types = {}
+        for equipment_type, digests in accumulator.type_digests.items():
+            type_median, mad = median_absolute_deviation(digests[col])
+            if mad > 0:
+                scale = mad / MAD_SCALE
+            else:
+                scale = MEANAD_SCALE * mean_absolute_deviation(digests[col], type_median)
+            types[equipment_type] = {'median': type_median, 'mad': mad, 'scale': scale}
+        thresholds[col] = {
+            'mean': accumulator.moments[col].mean,
+            'std': accumulator.moments[col].std,
+            'q1': q1,
+            'q3': q3,
+            'iqr': iqr,
+            'lower_fence': q1 - IQR_FACTOR * iqr,
+            'upper_fence': q3 + IQR_FACTOR * iqr,
+            'types': types,
+        }
+    return thresholds
+
+
+def _ratio(numerator, denominator):
+    """
+    numerator / denominator, with 0 where the denominator is 0 or unknown.
+    """
+    valid = np.isfinite(denominator) & (denominator > 0)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=valid)
+
+
+def score_values(values, codes, thresholds, type_names):
+    """
+    Scores of a chunk of values (one column per numeric column).
+
+    Args:
+        codes: Type code of every row, indexing ``type_names``
+
+    Returns:
+        tuple: (z-scores, IQR-fence scores, modified z-scores), each
+        shaped like ``values``
+    """
+    def stat(name):
+        return np.array([thresholds[col][name] for col in NUMERIC_COLUMNS], dtype=float)
+
+    def type_stat(name):
+        return np.array([
+            [thresholds[col]['types'].get(t, {}).get(name, np.nan) for col in NUMERIC_COLUMNS]
+            for t in type_names
+        ], dtype=float).reshape(len(type_names), len(NUMERIC_COLUMNS))
+
+    q1, q3 = stat('q1'), stat('q3')
+    z_scores = _ratio(values - stat('mean'), np.broadcast_to(stat('std'), values.shape))
+    outside = np.where(values < q1, values - q1, np.where(values > q3, values - q3, 0.0))
+    iqr_scores = _ratio(outside, np.broadcast_to(stat('iqr'), values.shape))
+    medians, scales = type_stat('median')[codes], type_stat('scale')[codes]
+    mad_scores = _ratio(values - medians, scales)
+    return z_scores, iqr_scores, mad_scores
+
+
+def detect_anomalies(spool, thresholds):
+    """
+    Yields (row_index, column, value, z_score, iqr_score, mad_score) for
+    every flagged value of the spooled rows.
+    """
+    type_names = list(spool.types)
+    for first_index, values, codes in spool.chunks():
+        z_scores, iqr_scores, mad_scores = score_values(values, codes, thresholds, type_names)
+        flagged = ((np.abs(z_scores) > Z_THRESHOLD)
+                   | (np.abs(iqr_scores) > IQR_FACTOR)
+                   | (np.abs(mad_scores) > MAD_THRESHOLD))
+        rows, cols = np.nonzero(flagged)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            yield (first_index + row, NUMERIC_COLUMNS[col], float(values[row, col]),
+                   float(z_scores[row, col]), float(iqr_scores[row, col]), float(mad_scores[row, col]))
+
+
+def store_anomalies(dataset, spool, thresholds):
+    """
+    Scores the spooled rows of a dataset and writes the flagged values.
+
+    Returns:
+        int: number of anomalies stored
+    """
+    stored = 0
+    batch = []
+    for row_index, column, value, z_score, iqr_score, mad_score in detect_anomalies(spool, thresholds):
+        batch.append(Anomaly(
+            dataset_id=dataset.pk, row_index=row_index, column=column, value=value,
+            z_score=z_score, iqr_score=iqr_score, mad_score=mad_score
+        ))
+        if len(batch) >= ANOMALY_BATCH_SIZE:
+            Anomaly.objects.bulk_create(batch)
+            stored += len(batch)
+            batch = []
+    if batch:
+        Anomaly.objects.bulk_create(batch)
+        stored += len(batch)
+    return stored
+
+
+def flagged_methods(anomaly):
+    """
+    Names of the methods (see METHODS) that flag an anomaly.
+    """
+    return [method for method, (field, threshold) in METHODS.items()
+            if abs(getattr(anomaly, field)) > threshold]
+
+
+def method_filter(method):
+    """
+    Q object selecting the anomalies flagged by ``method``.
+    """
+    field, threshold = METHODS[method]
+    return Q(**{f'{field}__gt': threshold}) | Q(**{f'{field}__lt': -threshold})
+
+
+def filter_anomalies(queryset, params):
+    """
+    Applies query-string filters to an Anomaly queryset.
+
+    Supported parameters:
+        column: Flowrate, Pressure or Temperature; comma-separate for several
+        method: zscore, iqr or mad; only anomalies flagged by it
+
+    Raises:
+        QueryError: if a parameter is malformed
+    """
+    columns = [c for value in params.getlist('column') for c in value.split(',') if c]
+    unknown = [c for c in columns if c not in NUMERIC_COLUMNS]
+    if unknown:
+        raise QueryError(f"Unknown column '{unknown[0]}'. Choose from: {', '.join(NUMERIC_COLUMNS)}")
+    if columns:
+        queryset = queryset.filter(column__in=columns)
+
+    method = params.get('method')
+    if method:
+        if method not in METHODS:
+            raise QueryError(f"Unknown method '{method}'. Choose from: {', '.join(METHODS)}")
+        queryset = queryset.filter(method_filter(method))
+    return queryset
+
+
+def anomaly_counts(anomalies):
+    """
+    Number of flagged values per column and method, in one query.
+    """
+    aggregates = {
+        f'{col}_{method}': Count('pk', filter=Q(column=col) & method_filter(method))
+        for col in NUMERIC_COLUMNS for method in METHODS
+    }
+    counts = anomalies.aggregate(**aggregates)
+    return {
+        col: {method: counts[f'{col}_{method}'] for method in METHODS}
+        for col in NUMERIC_COLUMNS
+    }
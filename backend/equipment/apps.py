@@ -1,6 +1,34 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from .timing import execute_wrapper
+
+
+def enable_sqlite_wal(sender, connection, **kwargs):
+    """
+    Puts SQLite into WAL mode so readers (dashboards, job polling) are not
+    blocked while an upload is being written. Only with
+    EQUIPMENT_SQLITE_WAL, as it rewrites the database file's header.
+    """
+    if settings.EQUIPMENT_SQLITE_WAL and connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL;')
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    """
+    Lets request timings count the queries of every connection,
+    whichever thread it belongs to.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
 
 
 class EquipmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'equipment'
+
+    def ready(self):
+        connection_created.connect(enable_sqlite_wal)
+        connection_created.connect(install_execute_wrapper)
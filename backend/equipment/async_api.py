@@ -0,0 +1,93 @@
+"""
+``@async_api_view``: DRF's ``@api_view`` for ``async def`` views.
+DRF 3.14 only runs synchronous views, so under ASGI every request would
+hold a worker thread for its whole duration. AsyncAPIView is an APIView
+whose ``dispatch`` is a coroutine: authentication, permissions,
+throttling, content negotiation, exception handling and response
+finalization are APIView's own, and only the handler itself runs on the
+event loop. ``initial()`` (which looks up the session) runs in an
+executor thread, and Django renders the response in one.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.cache import patch_vary_headers
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with ``async def`` handlers.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        # APIView.dispatch(), awaiting the handler
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                # OPTIONS and 405s
+                response = handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if len(self.renderer_classes) > 1:
+            patch_vary_headers(response, ('Accept',))
+        return response
+
+
+def async_api_view(http_method_names):
+    """
+    Decorator turning an ``async def`` view into an AsyncAPIView, like
+    ``@api_view`` does for functions. The policy decorators
+    (``@permission_classes``, ``@renderer_classes``,
+    ``@throttle_classes``, ...) are honoured the same way.
+    """
+
+    def decorator(func):
+        WrappedAPIView = type('WrappedAPIView', (AsyncAPIView,), {'__doc__': func.__doc__})
+
+        async def handler(self, *args, **kwargs):
+            return await func(*args, **kwargs)
+
+        for method in http_method_names:
+            setattr(WrappedAPIView, method.lower(), handler)
+        WrappedAPIView.__name__ = func.__name__
+        WrappedAPIView.__module__ = func.__module__
+        allowed = {method.lower() for method in http_method_names} | {'options'}
+        if 'get' in allowed:
+            allowed.add('head')  # Answered by the GET handler (View.setup)
+        WrappedAPIView.http_method_names = sorted(allowed)
+
+        for policy in ('renderer_classes', 'parser_classes', 'authentication_classes', 'throttle_classes',
+                       'permission_classes', 'schema'):
+            if hasattr(func, policy):
+                setattr(WrappedAPIView, policy, getattr(func, policy))
+
+        return WrappedAPIView.as_view()
+
+    return decorator
+
+
+def is_asgi(request):
+    """
+    True when a request is served by an ASGI server rather than WSGI.
+    """
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
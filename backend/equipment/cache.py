@@ -0,0 +1,83 @@
+"""
+Per-user cache for dashboard responses (latest summary and history),
+built on Django's cache framework.
+Keys combine the user id with a per-user generation number. Anything
+that changes a user's datasets bumps the generation, which orphans all
+of that user's entries at once; orphans age out under the backend's
+TIMEOUT and MAX_ENTRIES limits.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import CACHE_HITS, CACHE_MISSES
+
+
+def get_cache():
+    return caches[settings.EQUIPMENT_CACHE_ALIAS]
+
+
+def _generation_key(user_id):
+    return f'equipment:user:{user_id}:generation'
+
+
+def user_generation(user_id):
+    """
+    Current cache generation of a user.
+    Generations start from the clock rather than 0, so one evicted from
+    the cache is never recreated with a value that old entries used.
+    """
+    cache = get_cache()
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_user_cache(user_id):
+    """
+    Drops every cached response of a user by bumping their generation.
+    """
+    cache = get_cache()
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        # Not cached (yet, or any more)
+        cache.set(_generation_key(user_id), time.time_ns(), timeout=None)
+
+
+def cache_key(user_id, generation, name, *parts):
+    key = f'equipment:user:{user_id}:{generation}:{name}'
+    if parts:
+        digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+        key = f'{key}:{digest}'
+    return key
+
+
+def _lookup(user_id, name, parts):
+    key = cache_key(user_id, user_generation(user_id), name, *parts)
+    return key, get_cache().get(key)
+
+
+async def acached(user_id, name, compute, *parts):
+    """
+    Returns the cached value for ``name`` (and ``parts``) of a user,
+    awaiting ``compute()`` and storing its result on a miss.
+    ``compute`` must be a coroutine function and not return None.
+    Django 4.2's cache backends have no native async methods (theirs run
+    in a thread), so the generation and the value are read in one go.
+    """
+    key, value = await sync_to_async(_lookup)(user_id, name, parts)
+    if value is not None:
+        CACHE_HITS.inc()
+        return value
+
+    CACHE_MISSES.inc()
+    value = await compute()
+    await get_cache().aset(key, value)
+    return value
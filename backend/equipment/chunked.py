@@ -0,0 +1,187 @@
+"""
+Resumable chunked uploads.
+A client opens an UploadSession, PUTs numbered chunks (each with a
+SHA-256 checksum) in any order and in parallel, asks which byte ranges
+have arrived, and completes the session. Chunks are written straight
+into a preallocated spool file at their offsets; the finished file is
+handed to the background ingestion queue.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue_ingest_job
+from .models import UploadSession, UploadChunk
+
+
+# Bytes read from the request per write while receiving a chunk
+CHUNK_READ_SIZE = 64 * 1024
+
+
+class ChunkedUploadError(ValueError):
+    """
+    Raised for invalid session parameters or chunk contents.
+    """
+    pass
+
+
+class UploadIncomplete(ChunkedUploadError):
+    """
+    Raised when a session is completed before all chunks have arrived.
+    """
+
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"{len(missing)} chunk(s) have not been received")
+
+
+def spool_path(session):
+    return os.path.join(settings.EQUIPMENT_SPOOL_DIR, f'{session.pk}.upload')
+
+
+def purge_stale_sessions():
+    """
+    Deletes open sessions untouched for EQUIPMENT_UPLOAD_SESSION_TTL
+    seconds, along with their spool files.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.EQUIPMENT_UPLOAD_SESSION_TTL)
+    stale = UploadSession.objects.filter(status=UploadSession.STATUS_OPEN, updated_at__lt=cutoff)
+    for session in stale:
+        try:
+            os.remove(spool_path(session))
+        except OSError:
+            pass
+    stale.delete()
+
+
+def create_session(user, file_name, total_size, chunk_size=None):
+    """
+    Opens an upload session and preallocates its spool file.
+
+    Raises:
+        ChunkedUploadError: if the name, size or chunk size is invalid
+    """
+    if not file_name or not file_name.endswith('.csv'):
+        raise ChunkedUploadError('File must be a CSV')
+    try:
+        total_size = int(total_size)
+        chunk_size = int(chunk_size or settings.EQUIPMENT_UPLOAD_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        raise ChunkedUploadError("'total_size' and 'chunk_size' must be integers")
+    if total_size < 1 or total_size > settings.EQUIPMENT_UPLOAD_MAX_BYTES:
+        raise ChunkedUploadError(f"'total_size' must be between 1 and {settings.EQUIPMENT_UPLOAD_MAX_BYTES} bytes")
+    if chunk_size < 1 or chunk_size > settings.EQUIPMENT_UPLOAD_MAX_CHUNK_SIZE:
+        raise ChunkedUploadError(f"'chunk_size' must be between 1 and {settings.EQUIPMENT_UPLOAD_MAX_CHUNK_SIZE} bytes")
+
+    purge_stale_sessions()
+    session = UploadSession.objects.create(
+        user=user, file_name=file_name, total_size=total_size, chunk_size=chunk_size
+    )
+    os.makedirs(os.path.dirname(spool_path(session)), exist_ok=True)
+    with open(spool_path(session), 'wb') as spool:
+        spool.truncate(total_size)
+    return session
+
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, 'pwrite'):
+        return os.pwrite(fd, data, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, data)
+
+
+def write_chunk(session, index, stream, checksum):
+    """
+    Reads chunk ``index`` from ``stream`` into the session's spool file at
+    its offset, verifying its length and SHA-256 checksum. Re-sending a
+    chunk overwrites it, so retries are safe.
+
+    Raises:
+        ChunkedUploadError: if the session is closed or the chunk is invalid
+    """
+    if session.status != UploadSession.STATUS_OPEN:
+        raise ChunkedUploadError('Upload session is already completed')
+    if index >= session.chunk_count:
+        raise ChunkedUploadError(f'Chunk index must be below {session.chunk_count}')
+    if not checksum:
+        raise ChunkedUploadError('Missing X-Chunk-Checksum header')
+
+    expected = session.chunk_length(index)
+    offset = index * session.chunk_size
+    hasher = hashlib.sha256()
+    received = 0
+    fd = os.open(spool_path(session), os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        while received <= expected:
+            data = stream.read(min(CHUNK_READ_SIZE, expected + 1 - received))
+            if not data:
+                break
+            if received + len(data) > expected:
+                raise ChunkedUploadError(f'Chunk {index} must be {expected} bytes')
+            hasher.update(data)
+            _pwrite(fd, data, offset + received)
+            received += len(data)
+    finally:
+        os.close(fd)
+
+    if received != expected:
+        raise ChunkedUploadError(f'Chunk {index} must be {expected} bytes')
+    if hasher.hexdigest() != checksum.lower():
+        raise ChunkedUploadError(f'Checksum mismatch for chunk {index}')
+
+    chunk, _ = UploadChunk.objects.update_or_create(
+        session=session, index=index, defaults={'size': received, 'checksum': checksum.lower()}
+    )
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+    return chunk
+
+
+def received_ranges(session):
+    """
+    Byte ranges received so far, merged, as inclusive [start, end] pairs.
+    """
+    ranges = []
+    for index, size in session.chunks.order_by('index').values_list('index', 'size'):
+        start = index * session.chunk_size
+        if ranges and ranges[-1][1] + 1 == start:
+            ranges[-1][1] = start + size - 1
+        else:
+            ranges.append([start, start + size - 1])
+    return ranges
+
+
+def missing_chunks(session):
+    received = set(session.chunks.values_list('index', flat=True))
+    return [index for index in range(session.chunk_count) if index not in received]
+
+
+def complete_session(session):
+    """
+    Closes a session whose chunks have all arrived and queues the
+    assembled file for ingestion.
+
+    Returns:
+        IngestJob: the ingestion job
+
+    Raises:
+        UploadIncomplete: if chunks are missing
+        ChunkedUploadError: if the session is already completed
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != UploadSession.STATUS_OPEN:
+            raise ChunkedUploadError('Upload session is already completed')
+        missing = missing_chunks(session)
+        if missing:
+            raise UploadIncomplete(missing)
+        session.status = UploadSession.STATUS_COMPLETED
+        session.save(update_fields=['status', 'updated_at'])
+
+    job = enqueue_ingest_job(session.user, session.file_name, spool_path(session))
+    UploadSession.objects.filter(pk=session.pk).update(job=job)
+    session.job = job
+    return job
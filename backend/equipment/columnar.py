@@ -0,0 +1,93 @@
+"""
+Column-wise encoding of dataset rows for binary responses.
+Numeric columns become typed little-endian buffers that clients can wrap
+with ``numpy.frombuffer`` instead of rebuilding arrays row by row.
+"""
+import numpy as np
+
+from .queries import QueryError
+
+
+# Column name -> (EquipmentRecord field, encoding)
+COLUMN_SPECS = {
+    'row_index': ('row_index', '<i8'),
+    'Equipment Name': ('name', 'str'),
+    'Type': ('type', 'category'),
+    'Flowrate': ('flowrate', '<f8'),
+    'Pressure': ('pressure', '<f8'),
+    'Temperature': ('temperature', '<f8'),
+}
+
+
+def parse_columns(value):
+    """
+    Parses ``?columns=Flowrate,Pressure`` into column names (all by default).
+
+    Raises:
+        QueryError: if an unknown column is requested
+    """
+    if not value:
+        return list(COLUMN_SPECS)
+    columns = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in columns if name not in COLUMN_SPECS]
+    if unknown:
+        raise QueryError(f"Unknown columns: {', '.join(unknown)}. Choose from: {', '.join(COLUMN_SPECS)}")
+    return columns
+
+
+def _encode_column(values, encoding):
+    if encoding == 'str':
+        return {'dtype': 'str', 'values': list(values)}
+    if encoding == 'category':
+        categories, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+        return {
+            'dtype': 'category',
+            'categories': [str(c) for c in categories],
+            'codes': {'dtype': '<i4', 'data': codes.astype('<i4').tobytes()},
+        }
+    return {'dtype': encoding, 'data': np.asarray(values, dtype=encoding).tobytes()}
+
+
+def encode_rows(rows, columns):
+    """
+    Encodes row tuples (ordered like ``columns``) column by column.
+
+    Returns:
+        dict: {'length': n, 'columns': {name: encoded column}}
+    """
+    rows = list(rows)
+    transposed = list(zip(*rows)) if rows else [()] * len(columns)
+    return {
+        'length': len(rows),
+        'columns': {
+            name: _encode_column(values, COLUMN_SPECS[name][1])
+            for name, values in zip(columns, transposed)
+        },
+    }
+
+
+def encode_queryset(queryset, columns):
+    """
+    Encodes an EquipmentRecord queryset straight from ``values_list``.
+    """
+    fields = [COLUMN_SPECS[name][0] for name in columns]
+    return encode_rows(queryset.values_list(*fields), columns)
+
+
+def encode_records(records, columns):
+    """
+    Encodes already-fetched EquipmentRecord instances (e.g. a page).
+    """
+    fields = [COLUMN_SPECS[name][0] for name in columns]
+    return encode_rows(
+        (tuple(getattr(record, field) for field in fields) for record in records),
+        columns
+    )
+
+
+def encode_arrays(arrays):
+    """
+    Encodes already-built columns (name -> NumPy array), e.g. the
+    downsampled series of equipment/downsampling.py.
+    """
+    return {name: _encode_column(values, COLUMN_SPECS[name][1]) for name, values in arrays.items()}
@@ -0,0 +1,59 @@
+"""
+ETags and conditional GET handling for dataset endpoints.
+A dataset's content is fixed by its id, upload time and revision, so
+tags can be computed from those columns without loading rows or summaries.
+"""
+import hashlib
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, *parts):
+    """
+    Builds a strong ETag from dataset version parts and the request's
+    representation (path, query string and negotiated media type), so
+    that e.g. the full and the summary-only payload of one dataset get
+    different tags.
+    """
+    representation = [
+        request.path,
+        request.META.get('QUERY_STRING', ''),
+        getattr(request, 'accepted_media_type', ''),
+    ]
+    payload = '|'.join(str(part) for part in representation + list(parts))
+    return '"' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:40] + '"'
+
+
+# Dataset columns that make up its version, for values_list()
+VERSION_FIELDS = ('id', 'uploaded_at', 'revision')
+
+
+def version_token(pk, uploaded_at, revision):
+    return f"{pk}:{uploaded_at.isoformat()}:{revision}"
+
+
+def dataset_version(dataset):
+    """
+    Version token of a dataset, for use in make_etag().
+    """
+    return version_token(dataset.id, dataset.uploaded_at, dataset.revision)
+
+
+def etag_matches(request, etag):
+    """
+    True if the request's ``If-None-Match`` header matches the ETag.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def not_modified_response(etag):
+    """
+    Empty ``304 Not Modified`` response carrying the ETag.
+    """
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
@@ -0,0 +1,198 @@
+"""
+Downsampled Flowrate, Pressure and Temperature series for trend charts.
+A chart a thousand pixels wide cannot show more than about a thousand
+points, so instead of sending every row the server keeps the few that
+preserve the shape of each series:
+
+- ``lttb``: Largest-Triangle-Three-Buckets. The rows are split into
+  equal buckets and from each the point forming the largest triangle
+  with the previously kept point and the next bucket's average is kept.
+- ``minmax``: the lowest and the highest value of every bucket, so no
+  spike is ever lost.
+
+Every series is downsampled on its own, to an equal share of the point
+budget; the response carries the union of the rows kept for any of
+them, so all series share one x axis and it never exceeds the budget.
+"""
+import itertools
+
+import numpy as np
+
+from .models import EquipmentRecord
+from .queries import QueryError
+from .timing import span
+from .utils import NUMERIC_COLUMNS
+
+
+METHODS = ('lttb', 'minmax')
+
+# Rows returned unless ?points= asks otherwise, and its bounds; the
+# minimum is per series
+DEFAULT_POINTS = 500
+MIN_POINTS = 3
+MAX_POINTS = 5000
+
+# Rows fetched per database round trip while loading a window
+LOAD_CHUNK_SIZE = 10000
+
+
+def _parse_int(params, key, default, minimum, maximum=None):
+    value = params.get(key)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise QueryError(f"'{key}' must be an integer")
+    if number < minimum or (maximum is not None and number > maximum):
+        bounds = f'between {minimum} and {maximum}' if maximum is not None else f'at least {minimum}'
+        raise QueryError(f"'{key}' must be {bounds}")
+    return number
+
+
+def parse_trend_params(params):
+    """
+    Parses the query string of a trends request.
+
+    Supported parameters:
+        points: rows returned at most, shared by the series (default DEFAULT_POINTS)
+        start / end: window of row indexes, end exclusive (default: all rows)
+        method: lttb (default) or minmax
+        columns: Flowrate, Pressure and/or Temperature, comma-separated
+
+    Returns:
+        dict: points, start, end (None for the last row), method and columns
+
+    Raises:
+        QueryError: if a parameter is malformed
+    """
+    start = _parse_int(params, 'start', 0, 0)
+    end = _parse_int(params, 'end', None, start + 1)
+
+    method = params.get('method') or METHODS[0]
+    if method not in METHODS:
+        raise QueryError(f"Unknown method '{method}'. Choose from: {', '.join(METHODS)}")
+
+    columns = [c.strip() for c in (params.get('columns') or '').split(',') if c.strip()]
+    unknown = [c for c in columns if c not in NUMERIC_COLUMNS]
+    if unknown:
+        raise QueryError(f"Unknown column '{unknown[0]}'. Choose from: {', '.join(NUMERIC_COLUMNS)}")
+    columns = [c for c in NUMERIC_COLUMNS if c in columns] or list(NUMERIC_COLUMNS)
+    points = _parse_int(params, 'points', DEFAULT_POINTS, MIN_POINTS * len(columns), MAX_POINTS)
+
+    return {'points': points, 'start': start, 'end': end, 'method': method, 'columns': columns}
+
+
+def load_series(dataset_id, columns, start=0, end=None):
+    """
+    Reads a window of a dataset's rows into NumPy arrays, without
+    building a Python object per row.
+
+    Returns:
+        tuple: (row indexes, values with one column per entry of ``columns``)
+    """
+    fields = ['row_index'] + [EquipmentRecord.CSV_FIELDS[col] for col in columns]
+    records = EquipmentRecord.objects.filter(dataset_id=dataset_id, row_index__gte=start)
+    if end is not None:
+        records = records.filter(row_index__lt=end)
+    rows = records.order_by('row_index').values_list(*fields).iterator(chunk_size=LOAD_CHUNK_SIZE)
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=float)
+    matrix = flat.reshape(-1, len(fields))
+    return matrix[:, 0].astype(np.int64), matrix[:, 1:]
+
+
+def lttb_indices(x, y, points):
+    """
+    Positions of the points Largest-Triangle-Three-Buckets keeps out of
+    the series (x, y); the first and the last point are always kept.
+    One pass over the data, vectorized within each bucket.
+    """
+    n = len(y)
+    if n <= points:
+        return np.arange(n)
+
+    # points - 2 buckets between the first and the last point
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    sums_x = np.concatenate(([0.0], np.cumsum(x, dtype=float)))
+    sums_y = np.concatenate(([0.0], np.cumsum(y, dtype=float)))
+    sizes = np.diff(edges)
+    means_x = (sums_x[edges[1:]] - sums_x[edges[:-1]]) / sizes
+    means_y = (sums_y[edges[1:]] - sums_y[edges[:-1]]) / sizes
+    # The bucket after the last one is the last point
+    means_x = np.append(means_x, x[-1])
+    means_y = np.append(means_y, y[-1])
+
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = means_x[bucket + 1], means_y[bucket + 1]
+        # Twice the triangle areas; the constant factor does not change the argmax
+        areas = np.abs((ax - cx) * (y[low:high] - ay) - (ax - x[low:high]) * (cy - ay))
+        previous = low + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def minmax_indices(y, points):
+    """
+    Positions of the lowest and highest value of each of ``points // 2``
+    equal buckets of ``y``, in order. Fully vectorized.
+    """
+    n = len(y)
+    if n <= points:
+        return np.arange(n)
+
+    size = -(-n // (points // 2))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    kept = np.concatenate((offsets + np.nanargmin(padded, axis=1), offsets + np.nanargmax(padded, axis=1)))
+    return np.unique(kept)
+
+
+def downsample(row_index, values, points, method='lttb'):
+    """
+    Downsamples the columns of ``values`` to at most ``points`` rows in
+    all: each column keeps at most ``points // columns`` of them.
+
+    Returns:
+        ndarray: positions of the rows kept for any column, in order
+    """
+    if len(row_index) <= points:
+        return np.arange(len(row_index))
+    share = points // values.shape[1]
+    kept = [
+        lttb_indices(row_index, values[:, i], share) if method == 'lttb' else minmax_indices(values[:, i], share)
+        for i in range(values.shape[1])
+    ]
+    return np.unique(np.concatenate(kept))
+
+
+def dataset_trends(dataset_id, points, start=0, end=None, method='lttb', columns=NUMERIC_COLUMNS):
+    """
+    Downsampled series of a window of a dataset's rows.
+
+    Returns:
+        dict: the request's ``method``, ``points``, ``start`` and ``end``,
+        the number of ``rows`` in the window, and the kept rows as
+        NumPy ``columns`` (``row_index`` plus one per series) of ``length``
+    """
+    row_index, values = load_series(dataset_id, columns, start, end)
+    with span('downsample'):
+        kept = downsample(row_index, values, points, method)
+    arrays = {'row_index': row_index[kept]}
+    arrays.update((col, values[kept, i]) for i, col in enumerate(columns))
+    return {
+        'method': method,
+        'points': points,
+        'start': start,
+        'end': end if end is not None else int(row_index[-1]) + 1 if len(row_index) else start,
+        'rows': len(row_index),
+        'length': len(kept),
+        'columns': arrays,
+    }
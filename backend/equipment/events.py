@@ -0,0 +1,209 @@
+"""
+Per-user event stream behind ``/api/events/`` (server-sent events).
+Ingestion, appends, retention and background jobs publish events as
+they happen, and every open stream of the user receives them, so
+clients update incrementally instead of polling and re-downloading.
+
+Events are kept in memory, like the job queue's progress: with several
+server processes a stream only carries the events of its own process.
+The newest EQUIPMENT_EVENTS_BUFFER events per user are kept so that a
+reconnecting client can resume from its ``Last-Event-ID``; when that is
+no longer possible it gets a ``resync`` event and should reload.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+
+from .metrics import EVENT_STREAMS
+from .renderers import orjson_dumps
+
+
+DATASET_CREATED = 'dataset.created'  # A dataset became the latest upload
+DATASET_UPDATED = 'dataset.updated'  # Rows were appended to a dataset
+RETENTION_DELETED = 'retention.deleted'  # Old datasets were deleted
+JOB_PROGRESS = 'job.progress'  # A background ingestion job moved on
+RESYNC = 'resync'  # Events were missed; reload everything
+
+# Milliseconds browsers wait before reconnecting a dropped stream
+RETRY_MS = 3000
+
+Event = namedtuple('Event', ['id', 'type', 'data'])
+
+# Ids start from the clock, so ids handed out by an earlier server
+# process are all lower than this process's and trigger a resync.
+_ids = itertools.count(time.time_ns() // 1000)
+_first_id = next(_ids)
+_last_id = _first_id
+
+_lock = threading.Lock()
+_buffers = {}  # user id -> deque of Events
+_dropped = {}  # user id -> id of the newest event pushed out of the buffer
+_subscribers = {}  # user id -> set of Subscribers
+
+
+class Subscriber:
+    """
+    An open stream, woken (from any thread) when its user gets an
+    event. Streams served on an event loop pass that loop.
+    """
+
+    def __init__(self, user_id, loop=None):
+        self.user_id = user_id
+        self.loop = loop
+        self.ready = asyncio.Event() if loop is not None else threading.Event()
+
+    def notify(self):
+        if self.loop is None:
+            self.ready.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            pass  # The loop is gone, and the stream with it
+
+
+def publish(user_id, event_type, data):
+    """
+    Sends an event to the streams of a user and keeps it for replay.
+    """
+    global _last_id
+    with _lock:
+        event = Event(next(_ids), event_type, data)
+        _last_id = event.id
+        buffer = _buffers.get(user_id)
+        if buffer is None:
+            buffer = _buffers[user_id] = deque(maxlen=settings.EQUIPMENT_EVENTS_BUFFER)
+        if len(buffer) == buffer.maxlen:
+            _dropped[user_id] = buffer[0].id
+        buffer.append(event)
+        subscribers = list(_subscribers.get(user_id, ()))
+    for subscriber in subscribers:
+        subscriber.notify()
+    return event
+
+
+def last_event_id():
+    """
+    Id of the newest event published in this process, for any user.
+    """
+    return _last_id
+
+
+def events_since(user_id, after_id):
+    """
+    The user's events newer than ``after_id``, oldest first, or None if
+    some of them are no longer available.
+    """
+    with _lock:
+        if after_id < _first_id or after_id > _last_id or after_id < _dropped.get(user_id, 0):
+            return None
+        return [event for event in _buffers.get(user_id, ()) if event.id > after_id]
+
+
+def subscribe(user_id, loop=None):
+    subscriber = Subscriber(user_id, loop)
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(subscriber)
+    EVENT_STREAMS.inc()
+    return subscriber
+
+
+def unsubscribe(subscriber):
+    with _lock:
+        subscribers = _subscribers.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del _subscribers[subscriber.user_id]
+    EVENT_STREAMS.dec()
+
+
+def parse_event_id(value):
+    """
+    Event id from a ``Last-Event-ID`` header or query parameter, or None.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_event(event):
+    return f'id: {event.id}\nevent: {event.type}\ndata: '.encode('utf-8') + orjson_dumps(event.data) + b'\n\n'
+
+
+def _pending(user_id, after_id):
+    """
+    Encoded events after ``after_id`` and the id to continue from.
+    """
+    events = events_since(user_id, after_id)
+    if events is None:
+        resync = Event(last_event_id(), RESYNC, {})
+        return format_event(resync), resync.id
+    if not events:
+        return b'', after_id
+    return b''.join(format_event(event) for event in events), events[-1].id
+
+
+def iter_event_stream(user_id, after_id=None):
+    """
+    Yields a user's events as ``text/event-stream``, starting after
+    ``after_id`` (or with the next new event), with a comment every
+    EQUIPMENT_EVENTS_KEEPALIVE seconds of silence. Holds a thread while
+    open; see aiter_event_stream() for ASGI.
+
+    Ends after EQUIPMENT_EVENTS_MAX_AGE seconds; clients reconnect with
+    their Last-Event-ID and miss nothing.
+    """
+    subscriber = subscribe(user_id)
+    try:
+        if after_id is None:
+            after_id = last_event_id()
+        deadline = time.monotonic() + settings.EQUIPMENT_EVENTS_MAX_AGE
+        yield f'retry: {RETRY_MS}\n\n'.encode('utf-8')
+        while True:
+            # Cleared before reading, so an event published meanwhile still wakes us
+            subscriber.ready.clear()
+            data, after_id = _pending(user_id, after_id)
+            if data:
+                yield data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not subscriber.ready.wait(min(settings.EQUIPMENT_EVENTS_KEEPALIVE, remaining)):
+                yield b': keepalive\n\n'
+    finally:
+        unsubscribe(subscriber)
+
+
+async def aiter_event_stream(user_id, after_id=None):
+    """
+    iter_event_stream() as an async iterator, which waits on the event
+    loop instead of holding a thread. Django 4.2 does not stop streaming
+    when an ASGI client disconnects, so here the time limit is also what
+    ends abandoned streams.
+    """
+    subscriber = subscribe(user_id, asyncio.get_running_loop())
+    try:
+        if after_id is None:
+            after_id = last_event_id()
+        deadline = time.monotonic() + settings.EQUIPMENT_EVENTS_MAX_AGE
+        yield f'retry: {RETRY_MS}\n\n'.encode('utf-8')
+        while True:
+            subscriber.ready.clear()
+            data, after_id = _pending(user_id, after_id)
+            if data:
+                yield data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(subscriber.ready.wait(), min(settings.EQUIPMENT_EVENTS_KEEPALIVE, remaining))
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+    finally:
+        unsubscribe(subscriber)
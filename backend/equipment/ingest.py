@@ -0,0 +1,297 @@
+"""
+Persistence side of the CSV ingestion pipeline.
+Streams parsed chunks into EquipmentRecord rows and enforces retention.
+
+Each chunk's rows are committed on their own, so an upload never holds
+the database's write lock (on SQLite, the whole database) for longer
+than one chunk. Dataset.status keeps datasets that are still being
+written out of clients' sight, and failed or interrupted ingests are
+cleaned up.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .anomalies import AnomalySpool, anomaly_thresholds, store_anomalies
+from .cache import invalidate_user_cache
+from .events import publish, DATASET_CREATED, DATASET_UPDATED, RETENTION_DELETED
+from .models import Anomaly, Dataset, EquipmentRecord
+from .reports import get_report_cache
+from .serializers import DatasetSummarySerializer
+from .timing import span
+from .utils import process_csv, accumulate_records, CSVValidationError, SummaryAccumulator, SKETCH_VERSION
+
+
+# Number of datasets kept per user
+MAX_DATASETS_PER_USER = 5
+
+# Rows written per INSERT
+RECORD_BATCH_SIZE = 2000
+
+
+class DatasetBusy(Exception):
+    """
+    Raised when rows are appended to a dataset that is already being
+    appended to.
+    """
+    pass
+
+
+class DuplicateUpload(Exception):
+    """
+    Raised when the same file finished ingesting for the same user while
+    this copy was being processed. ``dataset`` is that upload.
+    """
+
+    def __init__(self, dataset):
+        super().__init__("This file has already been uploaded")
+        self.dataset = dataset
+
+
+class RecordWriter:
+    """
+    Callback for ``process_csv`` that writes each chunk of records
+    with batched ``bulk_create`` as soon as it is parsed.
+    """
+
+    def __init__(self, dataset, start_index=0, on_progress=None):
+        self.dataset = dataset
+        self.start_index = start_index
+        self.next_index = start_index
+        self.on_progress = on_progress
+        self.elapsed = 0.0  # Seconds spent writing rows
+
+    def __call__(self, records):
+        started = time.perf_counter()
+        with span('store'):
+            objs = [
+                EquipmentRecord.from_row(self.dataset, self.next_index + offset, row)
+                for offset, row in enumerate(records)
+            ]
+            EquipmentRecord.objects.bulk_create(objs, batch_size=RECORD_BATCH_SIZE)
+        self.next_index += len(objs)
+        self.elapsed += time.perf_counter() - started
+
+        if self.on_progress is not None:
+            self.on_progress(self.next_index - self.start_index)
+
+
+def enforce_retention(user):
+    """
+    Deletes all but the newest MAX_DATASETS_PER_USER datasets of a user,
+    along with their cached reports and dashboard responses, and tells
+    the user's open sessions.
+
+    Returns:
+        list: ids of the deleted datasets
+    """
+    ids_to_keep = list(
+        Dataset.objects.filter(user=user).order_by('-uploaded_at').values_list('id', flat=True)[:MAX_DATASETS_PER_USER]
+    )
+    if not ids_to_keep:
+        return []
+
+    stale = Dataset.objects.filter(user=user).exclude(id__in=ids_to_keep)
+    deleted_ids = list(stale.values_list('id', flat=True))
+    if deleted_ids:
+        stale.delete()
+        report_cache = get_report_cache()
+        for dataset_id in deleted_ids:
+            report_cache.invalidate(dataset_id)
+        invalidate_user_cache(user.pk)
+        publish(user.pk, RETENTION_DELETED, {'ids': deleted_ids})
+    return deleted_ids
+
+
+def _discard_rows(dataset_id, start_index):
+    """
+    Deletes the rows (and their anomalies) an unfinished append wrote
+    from ``start_index`` on, and makes the dataset ready again.
+    """
+    EquipmentRecord.objects.filter(dataset_id=dataset_id, row_index__gte=start_index).delete()
+    Anomaly.objects.filter(dataset_id=dataset_id, row_index__gte=start_index).delete()
+    Dataset.all_objects.filter(pk=dataset_id).update(
+        status=Dataset.STATUS_READY, status_changed_at=timezone.now()
+    )
+
+
+def recover_interrupted_ingests():
+    """
+    Cleans up after uploads and appends whose process died part-way:
+    datasets left ``processing`` or ``appending`` for longer than
+    EQUIPMENT_INGEST_STALE_AFTER seconds. Partial uploads are deleted;
+    partial appends lose the rows past those their summary counts.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.EQUIPMENT_INGEST_STALE_AFTER)
+    stale = Dataset.all_objects.filter(status_changed_at__lt=cutoff)
+    stale.filter(status=Dataset.STATUS_PROCESSING).delete()
+    for dataset in stale.filter(status=Dataset.STATUS_APPENDING).only('id', 'user_id', 'summary'):
+        _discard_rows(dataset.pk, dataset.summary['total_equipment'])
+        invalidate_user_cache(dataset.user_id)
+
+
+def find_duplicate(user, content_hash):
+    """
+    Returns the user's dataset with the given content hash, or None.
+    A match is moved to the front of the history (its upload time is
+    refreshed), as if the file had just been uploaded again, and
+    announced as updated.
+    """
+    if not content_hash:
+        return None
+    dataset = Dataset.objects.filter(user=user, content_hash=content_hash).first()
+    if dataset is not None:
+        dataset.uploaded_at = timezone.now()
+        Dataset.objects.filter(pk=dataset.pk).update(uploaded_at=dataset.uploaded_at)
+        invalidate_user_cache(user.pk)
+        publish(user.pk, DATASET_UPDATED, DatasetSummarySerializer(dataset).data)
+    return dataset
+
+
+def ingest_csv(user, file, file_name, on_progress=None, timings=None, content_hash=None):
+    """
+    Parses, analyzes and stores a CSV upload in a single pass, then
+    flags its anomalies from a spool of the numeric columns.
+    Rows are committed chunk by chunk while the dataset stays
+    ``processing``; it becomes ready (and the latest upload) once its
+    summary is stored. A file that fails validation part-way through
+    leaves nothing behind. The content hash is only stored then, and is
+    unique per user, so of two concurrent uploads of one file the one
+    finishing second is discarded.
+
+    Args:
+        on_progress: optional callable receiving the number of rows
+            stored so far, called after every chunk
+        timings: optional dict that receives seconds spent per stage
+            ('analyze', 'store', 'anomalies', 'retention')
+        content_hash: SHA-256 of the file, stored for deduplication
+
+    Returns:
+        Dataset: the newly created dataset
+
+    Raises:
+        CSVValidationError: if the CSV is malformed
+        DuplicateUpload: if the same file was stored meanwhile
+    """
+    started = time.perf_counter()
+    recover_interrupted_ingests()
+    dataset = Dataset.all_objects.create(user=user, file_name=file_name, summary={}, status=Dataset.STATUS_PROCESSING)
+    try:
+        with AnomalySpool() as spool:
+            writer = RecordWriter(dataset, on_progress=on_progress)
+            accumulator = SummaryAccumulator()
+            dataset.summary = process_csv(file, on_records=writer, accumulator=accumulator, on_chunk=spool.add)
+            analyzed = time.perf_counter()
+            with span('anomalies'):
+                store_anomalies(dataset, spool, anomaly_thresholds(accumulator))
+        dataset.sketches = accumulator.to_sketches()
+        dataset.content_hash = content_hash
+        dataset.status = Dataset.STATUS_READY
+        dataset.uploaded_at = dataset.status_changed_at = timezone.now()
+        with transaction.atomic():
+            dataset.save(update_fields=[
+                'summary', 'sketches', 'content_hash', 'status', 'uploaded_at', 'status_changed_at'
+            ])
+    except IntegrityError:
+        Dataset.all_objects.filter(pk=dataset.pk).delete()
+        duplicate = find_duplicate(user, content_hash)
+        if duplicate is None:
+            raise
+        raise DuplicateUpload(duplicate)
+    except BaseException:
+        Dataset.all_objects.filter(pk=dataset.pk).delete()
+        raise
+    stored = time.perf_counter()
+
+    with span('retention'):
+        enforce_retention(user)
+    invalidate_user_cache(user.pk)
+    publish(user.pk, DATASET_CREATED, DatasetSummarySerializer(dataset).data)
+
+    if timings is not None:
+        timings['analyze'] = analyzed - started - writer.elapsed
+        timings['store'] = writer.elapsed
+        timings['anomalies'] = stored - analyzed
+        timings['retention'] = time.perf_counter() - stored
+    return dataset
+
+
+def append_csv(dataset, file, timings=None):
+    """
+    Appends the rows of a CSV to an existing dataset.
+    The summary is updated from the dataset's stored sketches, so only
+    the new rows are parsed and analyzed; existing rows are not read.
+    The new rows are checked for anomalies against the updated
+    statistics; earlier rows keep the flags they got.
+    New rows are committed chunk by chunk and can be read before the
+    summary catches up; if the file fails validation they are removed.
+    The dataset's revision is bumped and its cached reports and
+    dashboard responses dropped.
+
+    Args:
+        timings: optional dict that receives seconds spent per stage
+            ('analyze', 'store', 'anomalies')
+
+    Returns:
+        int: number of rows appended
+
+    Raises:
+        CSVValidationError: if the CSV is malformed
+        DatasetBusy: if another append to the dataset is under way
+    """
+    started = time.perf_counter()
+    recover_interrupted_ingests()
+    # Claimed with a conditional update, so concurrent appends cannot interleave
+    claimed = Dataset.objects.filter(pk=dataset.pk, status=Dataset.STATUS_READY).update(
+        status=Dataset.STATUS_APPENDING, status_changed_at=timezone.now()
+    )
+    if not claimed:
+        raise DatasetBusy("Rows are already being appended to this dataset; try again when that finishes")
+
+    dataset = Dataset.objects.get(pk=dataset.pk)
+    last_index = dataset.records.aggregate(last=Max('row_index'))['last']
+    start_index = 0 if last_index is None else last_index + 1
+    try:
+        if dataset.sketches.get('version') == SKETCH_VERSION:
+            accumulator = SummaryAccumulator.from_sketches(dataset.sketches)
+        else:
+            accumulator = accumulate_records(dataset.records.all())
+
+        writer = RecordWriter(dataset, start_index=start_index)
+        with AnomalySpool(start_index=start_index) as spool:
+            process_csv(file, on_records=writer, accumulator=accumulator, on_chunk=spool.add)
+            appended = writer.next_index - writer.start_index
+            if not appended:
+                raise CSVValidationError("CSV file contains no equipment rows")
+            analyzed = time.perf_counter()
+            with span('anomalies'):
+                store_anomalies(dataset, spool, anomaly_thresholds(accumulator))
+            flagged = time.perf_counter()
+
+        Dataset.all_objects.filter(pk=dataset.pk).update(
+            summary=accumulator.to_summary(),
+            sketches=accumulator.to_sketches(),
+            content_hash=None,  # No longer the content of a single upload
+            revision=F('revision') + 1,
+            status=Dataset.STATUS_READY,
+            status_changed_at=timezone.now()
+        )
+    except BaseException:
+        _discard_rows(dataset.pk, start_index)
+        invalidate_user_cache(dataset.user_id)
+        raise
+
+    get_report_cache().invalidate(dataset.pk)
+    invalidate_user_cache(dataset.user_id)
+    dataset.refresh_from_db(fields=['uploaded_at', 'summary', 'revision'])
+    publish(dataset.user_id, DATASET_UPDATED, DatasetSummarySerializer(dataset).data)
+
+    if timings is not None:
+        timings['analyze'] = analyzed - started - writer.elapsed
+        timings['store'] = writer.elapsed
+        timings['anomalies'] = flagged - analyzed
+    return appended
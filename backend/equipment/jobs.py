@@ -0,0 +1,244 @@
+"""
+In-process background job queue for CSV ingestion.
+Jobs run on a local thread pool; no external broker is needed.
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import IngestJob
+from .events import publish, JOB_PROGRESS
+from .ingest import ingest_csv, find_duplicate, DuplicateUpload
+from .reports import prerender_report
+from .uploads import file_content_hash
+from .utils import CSVValidationError
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Live (rows_processed, progress) of running jobs, kept in memory so that
+# polling does not cost a write to the job row for every chunk.
+_live_progress = {}
+
+# Minimum progress step and seconds between job.progress events of a job
+PROGRESS_EVENT_STEP = 0.05
+PROGRESS_EVENT_INTERVAL = 0.5
+
+
+def get_executor():
+    """
+    Returns the shared ingestion thread pool, creating it on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EQUIPMENT_INGEST_WORKERS', 2),
+                thread_name_prefix='ingest'
+            )
+        return _executor
+
+
+def get_live_progress(job_id):
+    """
+    Returns (rows_processed, progress) of a job running in this process,
+    or None.
+    """
+    return _live_progress.get(job_id)
+
+
+def publish_progress(job, status, stage, progress, rows_processed=0, dataset=None, error=None):
+    """
+    Sends a ``job.progress`` event to the job owner's event streams.
+    """
+    publish(job.user_id, JOB_PROGRESS, {
+        'id': str(job.pk),
+        'file_name': job.file_name,
+        'status': status,
+        'stage': stage,
+        'progress': progress,
+        'rows_processed': rows_processed,
+        'dataset': dataset.pk if dataset is not None else None,
+        'error': error,
+    })
+
+
+def spool_upload(file):
+    """
+    Copies an uploaded file to local disk so it outlives the request.
+
+    Returns:
+        str: path of the spooled file
+    """
+    spool_dir = getattr(settings, 'EQUIPMENT_SPOOL_DIR', None) or tempfile.gettempdir()
+    os.makedirs(spool_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=spool_dir)
+    with os.fdopen(fd, 'wb') as out:
+        for chunk in file.chunks():
+            out.write(chunk)
+    return path
+
+
+def submit_ingest_job(user, file, content_hash=None):
+    """
+    Queues an uploaded CSV for background ingestion.
+    With EQUIPMENT_JOBS_SYNC enabled the job runs before this returns.
+
+    Returns:
+        IngestJob: the queued (or, in sync mode, finished) job
+    """
+    started = time.perf_counter()
+    path = spool_upload(file)
+    return enqueue_ingest_job(user, file.name, path, {'spool': time.perf_counter() - started}, content_hash)
+
+
+def enqueue_ingest_job(user, file_name, path, timings=None, content_hash=None):
+    """
+    Queues a file that is already on local disk for background ingestion.
+    The job owns ``path`` and removes it when done. Without a
+    ``content_hash`` the file is hashed by the job before analysis.
+
+    Returns:
+        IngestJob: the queued (or, in sync mode, finished) job
+    """
+    job = IngestJob.objects.create(user=user, file_name=file_name, timings=timings or {})
+
+    if getattr(settings, 'EQUIPMENT_JOBS_SYNC', False):
+        run_ingest_job(job.pk, path, time.perf_counter(), content_hash)
+        job.refresh_from_db()
+    else:
+        get_executor().submit(_call_in_worker, run_ingest_job, job.pk, path, time.perf_counter(), content_hash)
+    return job
+
+
+def completed_job(user, file_name, dataset):
+    """
+    Records an upload that needed no analysis (its content was already
+    stored) as a job that has already succeeded with ``dataset``.
+    """
+    return IngestJob.objects.create(
+        user=user,
+        file_name=file_name,
+        status=IngestJob.STATUS_SUCCEEDED,
+        stage='done',
+        progress=1.0,
+        rows_processed=dataset.summary['total_equipment'],
+        dataset=dataset
+    )
+
+
+def run_in_background(fn, *args):
+    """
+    Runs a task on the shared pool (inline with EQUIPMENT_JOBS_SYNC).
+    """
+    if getattr(settings, 'EQUIPMENT_JOBS_SYNC', False):
+        fn(*args)
+    else:
+        get_executor().submit(_call_in_worker, fn, *args)
+
+
+def _call_in_worker(fn, *args):
+    """
+    Thread-pool entry point; releases the thread's DB connection afterwards.
+    """
+    try:
+        fn(*args)
+    finally:
+        close_old_connections()
+
+
+def schedule_report_prerender(dataset):
+    """
+    Renders a new dataset's report in the background when
+    EQUIPMENT_REPORT_PRERENDER is enabled.
+    """
+    if getattr(settings, 'EQUIPMENT_REPORT_PRERENDER', False):
+        run_in_background(prerender_report, dataset.id)
+
+
+def run_ingest_job(job_id, path, queued_at, content_hash=None):
+    """
+    Runs the ingestion pipeline for a spooled file, recording progress,
+    per-stage timings and the outcome on the job. A file the user has
+    already uploaded resolves to the existing dataset without analysis.
+    """
+    job = IngestJob.objects.select_related('user').get(pk=job_id)
+    timings = dict(job.timings)
+    timings['queue_wait'] = time.perf_counter() - queued_at
+    IngestJob.objects.filter(pk=job_id).update(
+        status=IngestJob.STATUS_RUNNING, stage='analyzing', timings=timings
+    )
+    publish_progress(job, IngestJob.STATUS_RUNNING, 'analyzing', 0.0)
+
+    started = time.perf_counter()
+    try:
+        if content_hash is None:
+            content_hash = file_content_hash(path)
+            timings['hash'] = time.perf_counter() - started
+        duplicate = find_duplicate(job.user, content_hash)
+        if duplicate is not None:
+            timings['total'] = time.perf_counter() - started
+            IngestJob.objects.filter(pk=job_id).update(
+                status=IngestJob.STATUS_SUCCEEDED,
+                stage='done',
+                progress=1.0,
+                rows_processed=duplicate.summary['total_equipment'],
+                timings=timings,
+                dataset=duplicate
+            )
+            publish_progress(job, IngestJob.STATUS_SUCCEEDED, 'done', 1.0,
+                             duplicate.summary['total_equipment'], duplicate)
+            return
+
+        total_bytes = os.path.getsize(path) or 1
+        last_event = [0.0, time.perf_counter()]  # progress, time
+        with open(path, 'rb') as file:
+            def on_progress(rows):
+                progress = min(file.tell() / total_bytes, 1.0)
+                _live_progress[job_id] = (rows, progress)
+                now = time.perf_counter()
+                if (progress - last_event[0] >= PROGRESS_EVENT_STEP
+                        or now - last_event[1] >= PROGRESS_EVENT_INTERVAL):
+                    last_event[:] = progress, now
+                    publish_progress(job, IngestJob.STATUS_RUNNING, 'analyzing', progress, rows)
+
+            try:
+                dataset = ingest_csv(
+                    job.user, file, job.file_name,
+                    on_progress=on_progress, timings=timings, content_hash=content_hash
+                )
+            except DuplicateUpload as e:
+                # The same file was uploaded concurrently and finished first
+                dataset = e.dataset
+
+        timings['total'] = time.perf_counter() - started
+        IngestJob.objects.filter(pk=job_id).update(
+            status=IngestJob.STATUS_SUCCEEDED,
+            stage='done',
+            progress=1.0,
+            rows_processed=dataset.summary['total_equipment'],
+            timings=timings,
+            dataset=dataset
+        )
+        publish_progress(job, IngestJob.STATUS_SUCCEEDED, 'done', 1.0,
+                         dataset.summary['total_equipment'], dataset)
+        schedule_report_prerender(dataset)
+    except Exception as e:
+        timings['total'] = time.perf_counter() - started
+        message = str(e) if isinstance(e, CSVValidationError) else f'Error analyzing CSV: {str(e)}'
+        IngestJob.objects.filter(pk=job_id).update(
+            status=IngestJob.STATUS_FAILED, stage='failed', timings=timings, error=message
+        )
+        publish_progress(job, IngestJob.STATUS_FAILED, 'failed', 0.0, error=message)
+    finally:
+        _live_progress.pop(job_id, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,334 @@
+"""
+Microbenchmarks of the ingestion and analytics functions.
+
+    python manage.py benchanalytics --scales 1e3,1e4,1e5,1e6 --save-baseline
+    python manage.py benchanalytics --scales 1e3,1e4,1e5,1e6 --check
+
+Every function is timed (best and median of ``--repeat`` runs) and
+memory-profiled (peak traced allocations of one more run) on synthetic
+CSVs of each size. Results can be saved as a baseline and later checked
+against it: the command fails when a function got slower or needed more
+memory than the baseline by more than ``--threshold``.
+
+Timings only compare on one machine, so a local baseline is saved next
+to (and ignored by git, unlike) ``benchmarks/reference_baseline.json``,
+a reference run kept to show what to expect. Checking against a
+baseline from another environment warns that the comparison is loose.
+
+Database-backed functions run against a temporary SQLite database, never
+the configured one.
+"""
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from equipment.ingest import ingest_csv, append_csv
+from equipment.models import Dataset
+from equipment.reports import build_report_pdf
+from equipment.synthetic import write_synthetic_csv, EQUIPMENT_TYPES
+from equipment.utils import (iter_csv_chunks, validate_csv_structure, analyze_csv, process_csv,
+                             accumulate_records, get_chart_data, SummaryAccumulator)
+
+from .loadtest import git_commit
+
+
+DEFAULT_SCALES = '1e3,1e4,1e5,1e6'
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'analytics_baseline.json')
+REFERENCE_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'reference_baseline.json')
+
+# Differences below these are treated as noise, whatever the threshold
+MIN_SECONDS_DELTA = 0.005
+MIN_BYTES_DELTA = 1024 * 1024
+
+
+def bench_iter_csv_chunks(context):
+    for _ in iter_csv_chunks(context['path']):
+        pass
+
+
+def bench_validate_csv_structure(context):
+    return validate_csv_structure(context['path'])
+
+
+def bench_validate_invalid_csv(context):
+    return validate_csv_structure(context['invalid_path'])
+
+
+def bench_process_csv(context):
+    return process_csv(context['path'])
+
+
+def bench_analyze_csv(context):
+    return analyze_csv(context['path'])
+
+
+def bench_summary_from_sketches(context):
+    return SummaryAccumulator.from_sketches(context['sketches']).to_summary()
+
+
+def bench_merge_sketches(context):
+    accumulator = SummaryAccumulator.from_sketches(context['sketches'])
+    return accumulator.merge(SummaryAccumulator.from_sketches(context['sketches'])).to_summary()
+
+
+def bench_get_chart_data(context):
+    return get_chart_data(context['summary'])
+
+
+def bench_build_report_pdf(context):
+    return build_report_pdf({
+        'id': 0, 'file_name': 'benchmark.csv', 'uploaded_at': datetime.now(), 'summary': context['summary'],
+    })
+
+
+def bench_ingest_csv(context):
+    context['dataset'] = ingest_csv(context['user'], context['path'], 'benchmark.csv')
+
+
+def bench_append_csv(context):
+    return append_csv(context['dataset'], context['path'])
+
+
+def bench_accumulate_records(context):
+    return accumulate_records(context['dataset'].records.all())
+
+
+# (name, function, needs the database, largest scale it runs at or None)
+BENCHMARKS = [
+    ('iter_csv_chunks', bench_iter_csv_chunks, False, None),
+    ('validate_csv_structure', bench_validate_csv_structure, False, None),
+    ('validate_csv_structure:invalid', bench_validate_invalid_csv, False, None),
+    ('process_csv', bench_process_csv, False, None),
+    # Materializes every row as a dict
+    ('analyze_csv', bench_analyze_csv, False, 1000000),
+    ('summary_from_sketches', bench_summary_from_sketches, False, None),
+    ('merge_sketches', bench_merge_sketches, False, None),
+    ('get_chart_data', bench_get_chart_data, False, None),
+    ('build_report_pdf', bench_build_report_pdf, False, None),
+    ('ingest_csv', bench_ingest_csv, True, None),
+    ('accumulate_records', bench_accumulate_records, True, None),
+    # Last, since every run grows the dataset
+    ('append_csv', bench_append_csv, True, None),
+]
+
+
+def measure(function, context, repeat):
+    """
+    Times ``repeat`` runs of ``function(context)``, then traces the peak
+    memory allocated by one more run (kept separate so tracing does not
+    slow down the timed runs).
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function(context)
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(context)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': min(timings),
+        'median_seconds': statistics.median(timings),
+        'peak_bytes': peak,
+    }
+
+
+def environment():
+    """
+    What the timings depend on besides the code.
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Lists results that are worse than the baseline by more than
+    ``threshold`` (a fraction) in time or peak memory.
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        for metric, floor in (('seconds', MIN_SECONDS_DELTA), ('peak_bytes', MIN_BYTES_DELTA)):
+            old, new = base[metric], result[metric]
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append({
+                    'benchmark': key, 'metric': metric, 'baseline': old, 'current': new,
+                    'change': (new - old) / old if old else None,
+                })
+    return regressions
+
+
+def parse_scales(value):
+    try:
+        scales = [int(float(part)) for part in value.split(',')]
+    except ValueError:
+        raise CommandError("'--scales' must be comma-separated row counts, e.g. 1e3,1e5")
+    if any(scale < 1 for scale in scales):
+        raise CommandError("'--scales' must be positive")
+    return scales
+
+
+class Command(BaseCommand):
+    help = 'Time and memory-profile the ingestion and analytics functions on synthetic CSVs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default=DEFAULT_SCALES, help=f'Row counts to test (default: {DEFAULT_SCALES})')
+        parser.add_argument('--types', type=int, default=len(EQUIPMENT_TYPES), help='Distinct equipment types')
+        parser.add_argument('--invalid', type=float, default=0.001,
+                            help='Share of invalid rows in the file used for the invalid-CSV benchmark')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark (best is kept)')
+        parser.add_argument('--only', help='Comma-separated benchmark names to run')
+        parser.add_argument('--no-db', action='store_true', help='Skip benchmarks that write to a database')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file')
+        parser.add_argument('--save-baseline', action='store_true', help='Save the results as the baseline')
+        parser.add_argument('--check', action='store_true', help='Fail if results regressed against the baseline')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed slowdown or memory growth for --check, as a fraction (default 0.2)')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        scales = parse_scales(options['scales'])
+        benchmarks = BENCHMARKS
+        if options['only']:
+            names = set(options['only'].split(','))
+            unknown = names - {name for name, _, _, _ in BENCHMARKS}
+            if unknown:
+                raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+            benchmarks = [benchmark for benchmark in BENCHMARKS if benchmark[0] in names]
+        if options['no_db']:
+            benchmarks = [benchmark for benchmark in benchmarks if not benchmark[2]]
+        if options['repeat'] < 1:
+            raise CommandError("'--repeat' must be at least 1")
+
+        baseline = None
+        if options['check']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except FileNotFoundError:
+                raise CommandError(
+                    f"No baseline at {options['baseline']}; run with --save-baseline first "
+                    f"(or pass --baseline {REFERENCE_BASELINE} for a rough comparison with the reference run)"
+                )
+            if baseline.get('environment') != environment():
+                self.stderr.write(
+                    'Warning: the baseline comes from another environment '
+                    f"({baseline.get('environment')}); timings are machine-specific, so expect false results"
+                )
+
+        workdir = tempfile.mkdtemp(prefix='benchanalytics-')
+        old_database = None
+        try:
+            if any(needs_db for _, _, needs_db, _ in benchmarks):
+                # A throwaway database file, created the way the test runner does
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+                old_database = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            results = self.run_benchmarks(benchmarks, scales, workdir, options)
+        finally:
+            if old_database is not None:
+                connection.creation.destroy_test_db(old_database, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'environment': environment(),
+            'machine_specific': True,  # Timings only compare with runs on the same machine
+            'config': {
+                'scales': scales, 'types': options['types'], 'invalid': options['invalid'],
+                'seed': options['seed'], 'repeat': options['repeat'],
+            },
+            'results': results,
+        }
+
+        if baseline is not None:
+            report['baseline_commit'] = baseline.get('commit')
+            report['regressions'] = compare(results, baseline, options['threshold'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['baseline'])), exist_ok=True)
+            with open(options['baseline'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"Saved baseline to {options['baseline']}")
+
+        if baseline is not None and report['regressions']:
+            lines = [
+                f"  {r['benchmark']} {r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g}"
+                for r in report['regressions']
+            ]
+            raise CommandError(
+                f"{len(lines)} regression(s) beyond {options['threshold']:.0%} of the baseline:\n" + '\n'.join(lines)
+            )
+
+    def run_benchmarks(self, benchmarks, scales, workdir, options):
+        results = {}
+        for rows in scales:
+            self.stderr.write(f'Generating {rows} rows')
+            context = {
+                'rows': rows,
+                'path': os.path.join(workdir, f'{rows}.csv'),
+                'invalid_path': os.path.join(workdir, f'{rows}-invalid.csv'),
+            }
+            write_synthetic_csv(context['path'], rows, options['seed'], options['types'])
+            write_synthetic_csv(context['invalid_path'], rows, options['seed'], options['types'], options['invalid'])
+            accumulator = SummaryAccumulator()
+            context['summary'] = process_csv(context['path'], accumulator=accumulator)
+            context['sketches'] = accumulator.to_sketches()
+            if any(needs_db for _, _, needs_db, _ in benchmarks):
+                context['user'] = User.objects.create_user(username=f'benchmark-{rows}')
+
+            for name, function, needs_db, max_rows in benchmarks:
+                if max_rows is not None and rows > max_rows:
+                    continue
+                if name in ('append_csv', 'accumulate_records') and 'dataset' not in context:
+                    context['dataset'] = ingest_csv(context['user'], context['path'], 'benchmark.csv')
+                # Every append grows the dataset; one timed run is enough
+                repeat = 1 if name == 'append_csv' else options['repeat']
+                result = measure(function, context, repeat)
+                result['rows'] = rows
+                result['rows_per_second'] = rows / result['seconds'] if result['seconds'] else None
+                results[f'{name}@{rows}'] = result
+                self.stderr.write(
+                    f"  {name:<32} {result['seconds'] * 1000:>10.1f} ms"
+                    f"  {result['peak_bytes'] / 1024 / 1024:>8.1f} MiB"
+                )
+
+            if 'user' in context:
+                Dataset.objects.filter(user=context['user']).delete()
+        return results
@@ -0,0 +1,30 @@
+"""
+Writes a reproducible synthetic equipment CSV.
+
+    python manage.py generate_csv equipment-1m.csv --rows 1e6 --types 25 --invalid 0.001
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from equipment.synthetic import write_synthetic_csv, EQUIPMENT_TYPES
+
+
+class Command(BaseCommand):
+    help = 'Write a synthetic equipment CSV (same arguments, same file)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file')
+        parser.add_argument('--rows', default='1e3', help='Number of rows, e.g. 1e3 to 1e7')
+        parser.add_argument('--types', type=int, default=len(EQUIPMENT_TYPES), help='Distinct equipment types')
+        parser.add_argument('--invalid', type=float, default=0.0, help='Share of rows with a non-numeric reading')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            rows = int(float(options['rows']))
+        except ValueError:
+            raise CommandError("'--rows' must be a number")
+        if rows < 0 or options['types'] < 1 or not 0 <= options['invalid'] <= 1:
+            raise CommandError("'--rows' must be at least 0, '--types' at least 1 and '--invalid' within 0..1")
+
+        write_synthetic_csv(options['path'], rows, options['seed'], options['types'], options['invalid'])
+        self.stdout.write(f"Wrote {rows} rows to {options['path']}")
@@ -0,0 +1,390 @@
+"""
+HTTP load test of the API with concurrent clients.
+
+    python manage.py loadtest --clients 8 --duration 30 --rows 1000,50000 --output run.json
+
+Unless ``--url`` points at a running server, a development server (or,
+with ``--server uvicorn``, the ASGI application under uvicorn) is
+started on a throwaway database. Every client registers its own user,
+uploads a seed dataset and then sends a weighted mix of upload, summary,
+history, dataset and report requests. Latency percentiles, requests per
+second and error rates are printed as JSON so runs can be compared
+across commits.
+"""
+import http.client
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from equipment.synthetic import synthetic_csv
+
+
+OPERATIONS = ('upload', 'summary', 'history', 'dataset', 'report')
+
+DEFAULT_MIX = 'upload=1,summary=4,history=3,dataset=2,report=1'
+
+PERCENTILES = (50, 95, 99)
+
+# Seconds to wait for the development server to accept requests
+SERVER_START_TIMEOUT = 30
+
+# Commands serving the API on a port, run from the backend directory
+SERVERS = {
+    'runserver': lambda port: [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload'],
+    'uvicorn': lambda port: [
+        sys.executable, '-m', 'uvicorn', 'backend.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--no-access-log',
+    ],
+}
+
+# Datasets kept per user by the server, and so per client
+RETAINED_DATASETS = 5
+
+
+class HTTPClient:
+    """
+    Keep-alive HTTP connection with its own cookies, standing in for one
+    logged-in browser or desktop session.
+    """
+
+    def __init__(self, host, port, prefix='', timeout=60):
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.timeout = timeout
+        self.cookies = {}
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Sends a request and reads the whole response.
+
+        Returns:
+            tuple: (status code, response body)
+        """
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if 'csrftoken' in self.cookies:
+            headers['X-CSRFToken'] = self.cookies['csrftoken']
+
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, self.prefix + path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed the kept-alive connection; reconnect once
+                self.close()
+                if attempt:
+                    raise
+            except (OSError, http.client.HTTPException):
+                self.close()
+                raise
+
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.will_close:
+            self.close()
+        return response.status, data
+
+    def post_json(self, path, payload):
+        return self.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+
+    def post_file(self, path, file_name, content):
+        boundary = uuid.uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode('utf-8'),
+            content,
+            f'\r\n--{boundary}--\r\n'.encode('utf-8'),
+        ])
+        return self.request('POST', path, body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class LoadClient:
+    """
+    One simulated user: registers, seeds a dataset, then sends requests
+    picked at random from the workload mix.
+    """
+
+    def __init__(self, index, http_client, files, mix, seed, run_id):
+        self.index = index
+        self.http = http_client
+        self.files = files
+        self.operations = list(mix)
+        self.weights = [mix[operation] for operation in self.operations]
+        self.random = random.Random(seed * 1000 + index)
+        self.username = f'loadtest-{run_id}-{index}'
+        self.dataset_ids = []
+        self.uploads = 0
+        self.samples = []  # (operation, seconds, status); status 0 for a failed connection
+
+    def setup(self):
+        status, body = self.http.post_json('/api/register/', {
+            'username': self.username, 'password': uuid.uuid4().hex,
+        })
+        if status != 201:
+            raise CommandError(f'Could not register {self.username}: {status} {body[:200]!r}')
+        status, body = self.upload()
+        if status != 201:
+            raise CommandError(f'Could not upload a seed dataset: {status} {body[:200]!r}')
+
+    def upload(self):
+        # A unique last row keeps uploads from being recognized as repeats
+        self.uploads += 1
+        content = self.random.choice(self.files) + f'LoadTest-{self.index}-{self.uploads},Pump,1,1,1\n'.encode('utf-8')
+        status, body = self.http.post_file('/api/upload/?summary_only=true', 'loadtest.csv', content)
+        if status == 201:
+            self.dataset_ids = (self.dataset_ids + [json.loads(body)['id']])[-RETAINED_DATASETS:]
+        return status, body
+
+    def send(self, operation):
+        if operation == 'upload':
+            return self.upload()
+        if operation == 'summary':
+            return self.http.request('GET', '/api/summary/?summary_only=true')
+        if operation == 'history':
+            return self.http.request('GET', '/api/history/')
+        dataset_id = self.random.choice(self.dataset_ids)
+        if operation == 'dataset':
+            return self.http.request('GET', f'/api/dataset/{dataset_id}/')
+        return self.http.request('GET', f'/api/report/{dataset_id}/')
+
+    def run(self, start, duration=None, requests=None):
+        """
+        Sends requests until ``requests`` have been sent or ``duration``
+        seconds have passed since all clients were released by ``start``.
+        """
+        start.wait()
+        deadline = None if duration is None else time.monotonic() + duration
+        while (requests is None or len(self.samples) < requests) and (deadline is None or time.monotonic() < deadline):
+            operation = self.random.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status, _ = self.send(operation)
+            except (OSError, http.client.HTTPException):
+                status = 0
+            self.samples.append((operation, time.perf_counter() - started, status))
+        self.http.close()
+
+
+def summarize(samples, elapsed):
+    """
+    Request count, throughput, error rate, status codes and latency
+    percentiles (milliseconds) of a list of samples.
+    """
+    if not samples:
+        return {'requests': 0}
+    latencies = np.array([seconds for _, seconds, _ in samples]) * 1000
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, _, status in samples if not 200 <= status < 400)
+    latency = {f'p{p}': float(value) for p, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))}
+    latency.update(mean=float(latencies.mean()), max=float(latencies.max()))
+    return {
+        'requests': len(samples),
+        'requests_per_second': len(samples) / elapsed if elapsed else None,
+        'errors': errors,
+        'error_rate': errors / len(samples),
+        'status_codes': statuses,
+        'latency_ms': latency,
+    }
+
+
+def parse_mix(value):
+    """
+    Parses ``upload=1,summary=4,...`` into operation weights.
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation '{name}'; choose from {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}'")
+    if not any(weight > 0 for weight in mix.values()):
+        raise CommandError('At least one operation needs a positive weight')
+    return mix
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Load-test the API with concurrent clients and report latency percentiles as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Test a running server instead of starting one on a temporary database')
+        parser.add_argument('--server', choices=sorted(SERVERS), default='runserver',
+                            help='Server to start: the WSGI development server or uvicorn (ASGI)')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients, each with its own user')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run the workload')
+        parser.add_argument('--requests', type=int, help='Requests per client (instead of --duration)')
+        parser.add_argument('--rows', default='1000,20000', help='Comma-separated row counts of uploaded CSVs')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for generated data and request order')
+        parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        try:
+            rows = [int(value) for value in options['rows'].split(',')]
+        except ValueError:
+            raise CommandError("'--rows' must be comma-separated integers")
+        if options['clients'] < 1:
+            raise CommandError("'--clients' must be at least 1")
+
+        workdir = None
+        server = None
+        try:
+            if options['url']:
+                url = urlsplit(options['url'])
+                host, port, prefix = url.hostname, url.port or 80, url.path.rstrip('/')
+            else:
+                workdir = tempfile.mkdtemp(prefix='loadtest-')
+                host, port, prefix = '127.0.0.1', free_port(), ''
+                server = self.start_server(workdir, port, options['server'])
+            results = self.run_workload(host, port, prefix, rows, mix, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            if workdir is not None:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def start_server(self, workdir, port, server_name):
+        """
+        Migrates a fresh SQLite database in ``workdir`` and starts a
+        server on it.
+        """
+        if server_name == 'uvicorn' and importlib.util.find_spec('uvicorn') is None:
+            raise CommandError("'--server uvicorn' needs uvicorn: pip install uvicorn")
+        env = dict(
+            os.environ,
+            EQUIPMENT_DB_PATH=os.path.join(workdir, 'db.sqlite3'),
+            EQUIPMENT_SPOOL_DIR=os.path.join(workdir, 'spool'),
+            EQUIPMENT_REPORT_CACHE_DIR=os.path.join(workdir, 'report_cache'),
+            EQUIPMENT_CACHE_DIR=os.path.join(workdir, 'cache'),
+        )
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+        for command in (['migrate', '--noinput'], ['createcachetable']):
+            subprocess.run(manage + command, env=env, check=True, capture_output=True)
+
+        self.stderr.write(f'Starting {server_name} on 127.0.0.1:{port}')
+        log = open(os.path.join(workdir, 'server.log'), 'wb')
+        server = subprocess.Popen(
+            SERVERS[server_name](port),
+            cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        log.close()
+
+        client = HTTPClient('127.0.0.1', port, timeout=5)
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                break
+            try:
+                if client.request('GET', '/api/check-auth/')[0] == 200:
+                    client.close()
+                    return server
+            except (OSError, http.client.HTTPException):
+                time.sleep(0.2)
+        server.terminate()
+        with open(os.path.join(workdir, 'server.log'), 'rb') as f:
+            raise CommandError('Server did not start:\n' + f.read().decode('utf-8', 'replace')[-2000:])
+
+    def run_workload(self, host, port, prefix, rows, mix, options):
+        seed = options['seed']
+        self.stderr.write(f"Generating CSVs of {', '.join(map(str, rows))} rows")
+        files = [synthetic_csv(count, seed=seed + i) for i, count in enumerate(rows)]
+
+        run_id = uuid.uuid4().hex[:8]
+        clients = [
+            LoadClient(i, HTTPClient(host, port, prefix, options['timeout']), files, mix, seed, run_id)
+            for i in range(options['clients'])
+        ]
+        self.stderr.write(f'Setting up {len(clients)} clients')
+        for client in clients:
+            client.setup()
+
+        start = threading.Barrier(len(clients) + 1)
+        duration = None if options['requests'] else options['duration']
+        threads = [
+            threading.Thread(target=client.run, args=(start, duration, options['requests']))
+            for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        self.stderr.write('Running workload')
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        samples = [sample for client in clients for sample in client.samples]
+        return {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'config': {
+                'url': options['url'], 'server': None if options['url'] else options['server'], 'clients': len(clients), 'duration': options['duration'],
+                'requests_per_client': options['requests'], 'rows': rows, 'mix': mix, 'seed': seed,
+            },
+            'elapsed_seconds': elapsed,
+            'total': summarize(samples, elapsed),
+            'operations': {
+                operation: summarize([sample for sample in samples if sample[0] == operation], elapsed)
+                for operation in mix
+            },
+        }
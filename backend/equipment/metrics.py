@@ -0,0 +1,225 @@
+"""
+In-process metrics: counters, gauges and latency histograms, optionally
+split by labels, exported in the Prometheus text format.
+"""
+import threading
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric created, in creation order, for exposition()
+REGISTRY = []
+
+
+class Counter:
+    """
+    Monotonically increasing count.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, help_text, register=True):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, labels=None):
+        return [('', labels or {}, self.value)]
+
+
+class Gauge:
+    """
+    Value that goes up and down, such as work in flight.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, help_text, register=True):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def samples(self, labels=None):
+        return [('', labels or {}, self.value)]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram of observed durations.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS, register=True):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+    def snapshot(self):
+        """
+        Returns (cumulative bucket counts, count, sum).
+        """
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def samples(self, labels=None):
+        labels = labels or {}
+        counts, count, total = self.snapshot()
+        samples = [
+            ('_bucket', {**labels, 'le': format_value(bound)}, bucket_count)
+            for bound, bucket_count in zip(self.buckets, counts)
+        ]
+        samples.append(('_bucket', {**labels, 'le': '+Inf'}, count))
+        samples.append(('_sum', labels, total))
+        samples.append(('_count', labels, count))
+        return samples
+
+
+class Family:
+    """
+    A metric split by label values, e.g. request latency per view.
+    ``labels(view='get_summary')`` returns the child metric for one
+    combination of values, creating it on first use.
+    """
+
+    def __init__(self, metric_class, name, help_text, labelnames, **kwargs):
+        self.metric_class = metric_class
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.type = metric_class.type
+        self._kwargs = kwargs
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self.metric_class(self.name, self.help_text, register=False, **self._kwargs)
+                self._children[key] = child
+            return child
+
+    def samples(self, labels=None):
+        with self._lock:
+            children = list(self._children.items())
+        samples = []
+        for key, child in sorted(children):
+            samples.extend(child.samples({**(labels or {}), **dict(zip(self.labelnames, key))}))
+        return samples
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def exposition(registry=None):
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    lines = []
+    for metric in REGISTRY if registry is None else registry:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for suffix, labels, value in metric.samples():
+            label_text = ','.join(f'{name}="{_escape(label)}"' for name, label in labels.items())
+            lines.append(f"{metric.name}{suffix}{{{label_text}}} {format_value(value)}" if label_text
+                         else f"{metric.name}{suffix} {format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# PDF report rendering
+REPORT_QUEUE_WAIT = Histogram(
+    'equipment_report_queue_wait_seconds', 'Time report renders spent waiting for a worker process'
+)
+REPORT_RENDER_TIME = Histogram(
+    'equipment_report_render_seconds', 'Time spent building a PDF report'
+)
+REPORT_REJECTED = Counter(
+    'equipment_report_rejected_total', 'Report renders refused because the render queue was full'
+)
+REPORT_IN_FLIGHT = Gauge(
+    'equipment_report_renders_in_flight', 'Report renders running or queued'
+)
+
+# Per-user dashboard response cache
+CACHE_HITS = Counter(
+    'equipment_cache_hits_total', 'Dashboard responses served from the cache'
+)
+CACHE_MISSES = Counter(
+    'equipment_cache_misses_total', 'Dashboard responses computed because they were not cached'
+)
+
+# HTTP requests, recorded by RequestTimingMiddleware
+REQUEST_LATENCY = Family(
+    Histogram, 'equipment_request_seconds', 'Time to produce a response, per view', ['view']
+)
+REQUESTS = Family(
+    Counter, 'equipment_requests_total', 'Responses sent, per view and status code', ['view', 'status']
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'equipment_requests_in_flight', 'Requests being handled'
+)
+SQL_QUERIES = Family(
+    Counter, 'equipment_sql_queries_total', 'SQL queries run while handling requests, per view', ['view']
+)
+SQL_TIME = Family(
+    Counter, 'equipment_sql_seconds_total', 'Time spent in SQL queries while handling requests, per view', ['view']
+)
+SPAN_TIME = Family(
+    Histogram, 'equipment_span_seconds', 'Time per request spent in a named stage (parse, analyze, store, ...)', ['span']
+)
+REPORT_CACHE_HITS = Counter(
+    'equipment_report_cache_hits_total', 'Report downloads served from the report cache'
+)
+REPORT_CACHE_MISSES = Counter(
+    'equipment_report_cache_misses_total', 'Report downloads that needed a render'
+)
+
+# Server-sent event streams (/api/events/)
+EVENT_STREAMS = Gauge(
+    'equipment_event_streams', 'Open event streams'
+)
@@ -0,0 +1,124 @@
+"""
+Request instrumentation middleware.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+from .metrics import REQUEST_LATENCY, REQUESTS, REQUESTS_IN_FLIGHT, SQL_QUERIES, SQL_TIME, SPAN_TIME
+from .profiling import requested_kind, profile_call, save_profile
+from .timing import RequestTimings, activate, deactivate
+
+
+class RequestTimingMiddleware:
+    """
+    Times every request, counts its SQL queries and collects its named
+    spans. They are reported in a ``Server-Timing`` response header and
+    in the per-view metrics served at ``/api/metrics/``.
+
+    Streamed responses are timed until their headers are ready.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(token)
+        return self.finish(request, response, timings, started)
+
+    def start(self):
+        timings = RequestTimings()
+        token = activate(timings)
+        REQUESTS_IN_FLIGHT.inc()
+        return timings, token, time.perf_counter()
+
+    def stop(self, token):
+        REQUESTS_IN_FLIGHT.dec()
+        deactivate(token)
+
+    def finish(self, request, response, timings, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        REQUEST_LATENCY.labels(view=view).observe(elapsed)
+        REQUESTS.labels(view=view, status=response.status_code).inc()
+        SQL_QUERIES.labels(view=view).inc(timings.queries)
+        SQL_TIME.labels(view=view).inc(timings.query_seconds)
+        for name, seconds in timings.spans.items():
+            SPAN_TIME.labels(span=name).observe(seconds)
+
+        response['Server-Timing'] = timings.server_timing(elapsed)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests of staff users that ask for it with ``?profile=``
+    or an ``X-Profile`` header (see equipment/profiling.py). The stored
+    profile's id is returned in an ``X-Profile-Id`` header.
+
+    Must come after AuthenticationMiddleware. Under ASGI requests are
+    not profiled: their work is split between the event loop and executor
+    threads, and a profile of one thread would miss most of it. For the
+    same reason asking to profile an async view under WSGI is a 400.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        kind = requested_kind(request)
+        user = getattr(request, 'user', None)
+        if kind is None or user is None or not user.is_staff:
+            return self.get_response(request)
+        if self._is_async_view(request):
+            return JsonResponse({'error': 'Async views cannot be profiled: they run on an event loop thread'},
+                                status=400)
+
+        started = time.perf_counter()
+        response, data = profile_call(kind, self.get_response, request)
+        match = getattr(request, 'resolver_match', None)
+        profile_id = save_profile(kind, data, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.url_name if match is not None else None,
+            'user': user.username,
+            'status': response.status_code,
+            'duration': time.perf_counter() - started,
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    @staticmethod
+    def _is_async_view(request):
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        return iscoroutinefunction(match.func)
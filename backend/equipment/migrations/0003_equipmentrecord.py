@@ -0,0 +1,129 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:35
+
+import math
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 2000
+NUMERIC_FIELDS = {'flowrate': 'Flowrate', 'pressure': 'Pressure', 'temperature': 'Temperature'}
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _number(value):
+    """
+    A stored numeric value as a float, or None when it is missing or not
+    a finite number.
+    """
+    if _is_missing(value) or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def backfill_records(apps, schema_editor):
+    """
+    Copies the rows of Dataset.raw_data into EquipmentRecord, normalized
+    as EquipmentRecord.from_row() does: a blank Type is stored as ''.
+    Rows with a missing or non-numeric number would not pass upload
+    validation and are left out rather than stored as 0.
+    """
+    Dataset = apps.get_model('equipment', 'Dataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+
+    for dataset in Dataset.objects.iterator():
+        batch = []
+        row_index = 0
+        for row in dataset.raw_data or []:
+            numbers = {field: _number(row.get(column)) for field, column in NUMERIC_FIELDS.items()}
+            if None in numbers.values():
+                continue
+            equipment_type = row.get('Type')
+            batch.append(EquipmentRecord(
+                dataset=dataset,
+                row_index=row_index,
+                name=str(row.get('Equipment Name', '')),
+                type='' if _is_missing(equipment_type) else str(equipment_type),
+                **numbers,
+            ))
+            row_index += 1
+            if len(batch) >= BATCH_SIZE:
+                EquipmentRecord.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            EquipmentRecord.objects.bulk_create(batch)
+
+
+def restore_raw_data(apps, schema_editor):
+    """
+    Rebuilds Dataset.raw_data from EquipmentRecord rows.
+    """
+    Dataset = apps.get_model('equipment', 'Dataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+
+    for dataset in Dataset.objects.iterator():
+        records = EquipmentRecord.objects.filter(dataset=dataset).order_by('row_index')
+        dataset.raw_data = [
+            {
+                'Equipment Name': name,
+                'Type': equipment_type,
+                'Flowrate': flowrate,
+                'Pressure': pressure,
+                'Temperature': temperature,
+            }
+            for name, equipment_type, flowrate, pressure, temperature in records.values_list(
+                'name', 'type', 'flowrate', 'pressure', 'temperature'
+            )
+        ]
+        dataset.save(update_fields=['raw_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0002_dataset_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_index', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=100)),
+                ('flowrate', models.FloatField()),
+                ('pressure', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='equipment.dataset')),
+            ],
+            options={
+                'verbose_name': 'Equipment Record',
+                'verbose_name_plural': 'Equipment Records',
+                'ordering': ['dataset', 'row_index'],
+                'indexes': [models.Index(fields=['dataset', 'type'], name='record_dataset_type_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='equipmentrecord',
+            constraint=models.UniqueConstraint(fields=('dataset', 'row_index'), name='unique_record_row_index'),
+        ),
+        migrations.RunPython(backfill_records, restore_raw_data),
+        # Give raw_data a default so the removal can be reversed on populated tables
+        migrations.AlterField(
+            model_name='dataset',
+            name='raw_data',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RemoveField(
+            model_name='dataset',
+            name='raw_data',
+        ),
+    ]
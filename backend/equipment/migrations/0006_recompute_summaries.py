@@ -0,0 +1,463 @@
+"""
+Rebuilds every stored summary from its records so existing datasets gain
+the distribution, histogram and per-Type statistics.
+
+The statistics are a frozen copy of equipment/stats.py and
+SummaryAccumulator as of this migration, so that later changes to the app
+cannot change what it computes. Migrations 0007 and 0011 reuse them.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+from django.db import migrations
+
+
+BATCH_SIZE = 50000
+FIELDS = ['name', 'type', 'flowrate', 'pressure', 'temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+
+# Percentiles reported for every numeric column
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Upper bound on t-digest centroids; higher is more accurate
+DIGEST_COMPRESSION = 200
+
+# Maximum number of histogram bins
+HISTOGRAM_BINS = 32
+
+
+class Moments:
+    """
+    Count, mean, sum of squared deviations (M2), min and max.
+    Chunks are combined with Chan et al.'s parallel update, so the result
+    does not depend on how the data was split.
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=None, maximum=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = minimum
+        self.max = maximum
+
+    @classmethod
+    def of(cls, values):
+        """
+        Moments of a 1-D array.
+        """
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return cls()
+        mean = float(values.mean())
+        return cls(
+            int(values.size), mean, float(np.square(values - mean).sum()),
+            float(values.min()), float(values.max())
+        )
+
+    def update(self, values):
+        return self.merge(Moments.of(values))
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """
+        Sample variance (ddof=1, as pandas computes it); 0 below two values.
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['count'], data['mean'], data['m2'], data['min'], data['max'])
+
+
+class Grouping:
+    """
+    Row positions grouped by key, computed once per chunk and shared by
+    every column aggregated over the same keys.
+    """
+
+    def __init__(self, keys):
+        codes, self.groups = pd.factorize(np.asarray(keys), sort=True)
+        self.order = np.argsort(codes, kind='stable')
+        self.codes = codes[self.order]
+        self.counts = np.bincount(codes, minlength=len(self.groups))
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+
+
+def grouped_moments(grouping, values):
+    """
+    Moments of ``values`` per group, computed without a Python-level loop
+    over rows.
+
+    Returns:
+        dict: key -> Moments
+    """
+    if not grouping.codes.size:
+        return {}
+    values = np.asarray(values, dtype=float)[grouping.order]
+    codes, counts = grouping.codes, grouping.counts
+
+    means = np.bincount(codes, weights=values, minlength=len(counts)) / counts
+    m2 = np.bincount(codes, weights=np.square(values - means[codes]), minlength=len(counts))
+    mins = np.minimum.reduceat(values, grouping.starts)
+    maxs = np.maximum.reduceat(values, grouping.starts)
+
+    return {
+        group: Moments(int(counts[i]), float(means[i]), float(m2[i]), float(mins[i]), float(maxs[i]))
+        for i, group in enumerate(grouping.groups)
+    }
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles in bounded memory.
+    Values are kept as weighted centroids, which are small near the tails
+    and large near the median (k1 scale function). Compression is done
+    in one vectorized pass by grouping sorted centroids by scale index.
+    Quantiles are exact while no two values have been merged.
+    """
+
+    def __init__(self, compression=DIGEST_COMPRESSION, means=None, weights=None, minimum=None, maximum=None):
+        self.compression = compression
+        self.means = np.asarray(means if means is not None else [], dtype=float)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=float)
+        self.min = minimum
+        self.max = maximum
+
+    @property
+    def count(self):
+        return int(self.weights.sum())
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return self
+        return self._absorb(values, np.ones(values.size), float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        if not other.weights.size:
+            return self
+        return self._absorb(other.means, other.weights, other.min, other.max)
+
+    def _absorb(self, means, weights, minimum, maximum):
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+        self.means, self.weights = self._compress(
+            np.concatenate((self.means, means)),
+            np.concatenate((self.weights, weights))
+        )
+        return self
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = np.floor(self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        starts = np.flatnonzero(np.concatenate(([True], k[1:] != k[:-1])))
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        return merged_means, merged_weights
+
+    def quantiles(self, qs):
+        """
+        Estimates several quantiles (0..1) at once.
+
+        Returns:
+            list: one float per requested quantile, or None when empty
+        """
+        if not self.weights.size:
+            return [None] * len(qs)
+        qs = np.asarray(qs, dtype=float)
+        if self.weights.max() == 1:
+            # Nothing merged yet: centroids are the raw values
+            return [float(v) for v in np.quantile(self.means, qs)]
+        total = self.weights.sum()
+        centres = np.cumsum(self.weights) - self.weights / 2
+        ranks = np.concatenate(([0.0], centres, [total]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        return [float(v) for v in np.interp(qs * total, ranks, values)]
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def to_dict(self):
+        return {
+            'compression': self.compression,
+            'means': self.means.tolist(),
+            'weights': self.weights.tolist(),
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['compression'], data['means'], data['weights'], data['min'], data['max'])
+
+
+class Histogram:
+    """
+    Histogram with at most ``bins`` bins of a power-of-two width.
+    Bin edges are multiples of the width, so two histograms always line
+    up once their widths match. When new values fall outside the current
+    range, the width doubles (adjacent bins merge) until they fit.
+    """
+
+    def __init__(self, bins=HISTOGRAM_BINS, width=None, first=0, counts=None):
+        self.bins = bins
+        self.width = width
+        self.first = first
+        self.counts = np.asarray(counts if counts is not None else [], dtype=np.int64)
+
+    def _initial_width(self, low, high):
+        span = high - low
+        if span > 0:
+            return 2.0 ** math.ceil(math.log2(span / self.bins))
+        if low:
+            return 2.0 ** math.floor(math.log2(abs(low)))
+        return 1.0
+
+    def _double(self):
+        self.width *= 2
+        if self.counts.size:
+            index = np.arange(self.first, self.first + self.counts.size) // 2
+            self.first = int(index[0])
+            self.counts = np.bincount(index - self.first, weights=self.counts).astype(np.int64)
+
+    def _span(self, first, last):
+        if self.counts.size:
+            first = min(first, self.first)
+            last = max(last, self.first + self.counts.size - 1)
+        return first, last
+
+    def _add_counts(self, first, counts):
+        """
+        Adds ``counts`` starting at bin index ``first`` (same width).
+        """
+        low, high = self._span(first, first + counts.size - 1)
+        combined = np.zeros(high - low + 1, dtype=np.int64)
+        if self.counts.size:
+            combined[self.first - low:self.first - low + self.counts.size] += self.counts
+        combined[first - low:first - low + counts.size] += counts
+        self.first, self.counts = low, combined
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return self
+        low, high = float(values.min()), float(values.max())
+        if self.width is None:
+            self.width = self._initial_width(low, high)
+        while True:
+            first, last = self._span(math.floor(low / self.width), math.floor(high / self.width))
+            if last - first < self.bins:
+                break
+            self._double()
+
+        index = np.floor(values / self.width).astype(np.int64)
+        start = int(index.min())
+        self._add_counts(start, np.bincount(index - start))
+        return self
+
+    def merge(self, other):
+        if not other.counts.size:
+            return self
+        other = Histogram(other.bins, other.width, other.first, other.counts.copy())
+        if self.width is None:
+            self.width = other.width
+        while self.width < other.width:
+            self._double()
+        while other.width < self.width:
+            other._double()
+        while True:
+            first, last = self._span(other.first, other.first + other.counts.size - 1)
+            if last - first < self.bins:
+                break
+            self._double()
+            other._double()
+        self._add_counts(other.first, other.counts)
+        return self
+
+    def to_dict(self):
+        """
+        Bins as ``start`` (left edge of the first bin), ``bin_width`` and
+        ``counts``; bin i covers [start + i * bin_width, start + (i + 1) * bin_width).
+        """
+        return {
+            'start': self.first * self.width if self.width else 0.0,
+            'bin_width': self.width,
+            'counts': self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data, bins=HISTOGRAM_BINS):
+        width = data['bin_width']
+        first = int(round(data['start'] / width)) if width else 0
+        return cls(bins, width, first, data['counts'])
+
+
+def describe(moments, digest):
+    """
+    Summary statistics for one column from its moments and digest.
+    """
+    percentiles = digest.quantiles([p / 100 for p in PERCENTILES])
+    described = {
+        'count': moments.count,
+        'mean': moments.mean,
+        'std': moments.std,
+        'variance': moments.variance,
+        'min': moments.min,
+        'max': moments.max,
+        'median': percentiles[PERCENTILES.index(50)],
+    }
+    for p, value in zip(PERCENTILES, percentiles):
+        if p != 50:
+            described[f'p{p}'] = value
+    return described
+
+
+class Summary:
+    """
+    Running summary statistics of a dataset's records, one vectorized
+    pass per batch (SummaryAccumulator).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.moments = {col: Moments() for col in NUMERIC_COLUMNS}
+        self.digests = {col: TDigest() for col in NUMERIC_COLUMNS}
+        self.histograms = {col: Histogram() for col in NUMERIC_COLUMNS}
+        self.type_moments = {}
+
+    def update(self, batch):
+        """
+        Folds a DataFrame of records (see read_batches()) into the statistics.
+        """
+        self.count += len(batch)
+        # Rows with a blank Type count towards the totals but towards no Type
+        typed = batch['Type'].notna().to_numpy()
+        types = Grouping(batch['Type'][typed].astype(str))
+        for col in NUMERIC_COLUMNS:
+            values = batch[col].to_numpy(dtype=float)
+            self.moments[col].update(values)
+            self.digests[col].update(values)
+            self.histograms[col].update(values)
+            for equipment_type, moments in grouped_moments(types, values[typed]).items():
+                type_columns = self.type_moments.setdefault(
+                    equipment_type, {c: Moments() for c in NUMERIC_COLUMNS}
+                )
+                type_columns[col].merge(moments)
+
+    def to_summary(self):
+        type_counts = {
+            equipment_type: columns[NUMERIC_COLUMNS[0]].count
+            for equipment_type, columns in self.type_moments.items()
+        }
+        moments = self.moments
+        return {
+            "total_equipment": int(self.count),
+            "average_flowrate": moments['Flowrate'].mean,
+            "average_pressure": moments['Pressure'].mean,
+            "average_temperature": moments['Temperature'].mean,
+            "type_distribution": dict(sorted(type_counts.items(), key=lambda item: -item[1])),
+            "min_flowrate": moments['Flowrate'].min,
+            "max_flowrate": moments['Flowrate'].max,
+            "min_pressure": moments['Pressure'].min,
+            "max_pressure": moments['Pressure'].max,
+            "min_temperature": moments['Temperature'].min,
+            "max_temperature": moments['Temperature'].max,
+            "statistics": {
+                col: describe(moments[col], self.digests[col]) for col in NUMERIC_COLUMNS
+            },
+            "histograms": {
+                col: self.histograms[col].to_dict() for col in NUMERIC_COLUMNS
+            },
+            "type_statistics": {
+                equipment_type: {
+                    "count": type_counts[equipment_type],
+                    **{
+                        col: {
+                            "mean": columns[col].mean,
+                            "std": columns[col].std,
+                            "min": columns[col].min,
+                            "max": columns[col].max,
+                        }
+                        for col in NUMERIC_COLUMNS
+                    },
+                }
+                for equipment_type, columns in self.type_moments.items()
+            },
+        }
+
+
+def read_batches(records, batch_size=BATCH_SIZE):
+    """
+    Yields a dataset's records in row order as DataFrames of at most
+    ``batch_size`` rows, with a None Type for blank Types.
+    """
+    batch = []
+    rows = records.order_by('row_index').values_list(*FIELDS)
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield _frame(batch)
+            batch = []
+    if batch:
+        yield _frame(batch)
+
+
+def _frame(batch):
+    frame = pd.DataFrame(batch, columns=['Equipment Name', 'Type'] + NUMERIC_COLUMNS)
+    frame['Type'] = frame['Type'].replace('', None)
+    return frame
+
+
+def recompute_summaries(apps, schema_editor):
+    """
+    Rebuilds the summaries of existing datasets from their records.
+    """
+    Dataset = apps.get_model('equipment', 'Dataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+
+    for dataset in Dataset.objects.all().iterator():
+        summary = Summary()
+        for batch in read_batches(EquipmentRecord.objects.filter(dataset_id=dataset.pk)):
+            summary.update(batch)
+        if summary.count:
+            dataset.summary = summary.to_summary()
+            dataset.save(update_fields=['summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0005_ingestjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_summaries, migrations.RunPython.noop),
+    ]
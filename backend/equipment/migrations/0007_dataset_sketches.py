@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:55
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+# Layout of the sketches written here; SummaryAccumulator.from_sketches()
+# reads it (version 1 has no per-Type digests)
+SKETCH_VERSION = 1
+
+# Frozen statistics of migration 0006
+summaries = import_module('equipment.migrations.0006_recompute_summaries')
+
+
+def to_sketches(summary):
+    """
+    Mergeable state of a summary in the version 1 layout of
+    SummaryAccumulator.to_sketches().
+    """
+    return {
+        'version': SKETCH_VERSION,
+        'count': summary.count,
+        'columns': {
+            col: {
+                'moments': summary.moments[col].to_dict(),
+                'digest': summary.digests[col].to_dict(),
+                'histogram': summary.histograms[col].to_dict(),
+            }
+            for col in summaries.NUMERIC_COLUMNS
+        },
+        'types': {
+            equipment_type: {col: columns[col].to_dict() for col in summaries.NUMERIC_COLUMNS}
+            for equipment_type, columns in summary.type_moments.items()
+        },
+    }
+
+
+def backfill_sketches(apps, schema_editor):
+    """
+    Computes the mergeable sketches of existing datasets from their records.
+    """
+    Dataset = apps.get_model('equipment', 'Dataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+
+    for dataset in Dataset.objects.iterator():
+        summary = summaries.Summary()
+        for batch in summaries.read_batches(EquipmentRecord.objects.filter(dataset_id=dataset.pk)):
+            summary.update(batch)
+        if summary.count:
+            dataset.sketches = to_sketches(summary)
+            dataset.save(update_fields=['sketches'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0006_recompute_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='sketches',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(backfill_sketches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,227 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:49
+
+from importlib import import_module
+
+import numpy as np
+import pandas as pd
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Layout of the sketches written here: version 1 plus per-Type digests
+SKETCH_VERSION = 2
+
+# Thresholds and scale factors of equipment/anomalies.py as of this migration
+Z_THRESHOLD = 3.0
+IQR_FACTOR = 1.5
+MAD_THRESHOLD = 3.5
+MAD_SCALE = 0.6745
+MEANAD_SCALE = 1.253314
+IQR_PER_STD = 1.349
+
+BATCH_SIZE = 50000
+ANOMALY_BATCH_SIZE = 2000
+
+# Frozen statistics of migrations 0006 and 0007
+summaries = import_module('equipment.migrations.0006_recompute_summaries')
+sketches_v1 = import_module('equipment.migrations.0007_dataset_sketches')
+NUMERIC_COLUMNS = summaries.NUMERIC_COLUMNS
+
+
+class TypedSummary(summaries.Summary):
+    """
+    Summary that also keeps a digest per Type and column.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.type_digests = {}
+
+    def update(self, batch):
+        super().update(batch)
+        typed = batch['Type'].notna().to_numpy()
+        types = summaries.Grouping(batch['Type'][typed].astype(str))
+        for col in NUMERIC_COLUMNS:
+            grouped_values = batch[col].to_numpy(dtype=float)[typed][types.order]
+            for i, equipment_type in enumerate(types.groups):
+                type_digests = self.type_digests.setdefault(
+                    equipment_type, {c: summaries.TDigest() for c in NUMERIC_COLUMNS}
+                )
+                start = types.starts[i]
+                type_digests[col].update(grouped_values[start:start + types.counts[i]])
+
+
+def to_sketches(summary):
+    sketches = sketches_v1.to_sketches(summary)
+    sketches['version'] = SKETCH_VERSION
+    sketches['type_digests'] = {
+        equipment_type: {col: digests[col].to_dict() for col in NUMERIC_COLUMNS}
+        for equipment_type, digests in summary.type_digests.items()
+    }
+    return sketches
+
+
+def median_absolute_deviation(digest):
+    median = digest.quantile(0.5)
+    deviations = np.abs(digest.means - median)
+    if digest.weights.max() == 1:
+        return median, float(np.median(deviations))
+    order = np.argsort(deviations, kind='stable')
+    deviations, weights = deviations[order], digest.weights[order]
+    centres = np.cumsum(weights) - weights / 2
+    return median, float(np.interp(weights.sum() / 2, centres, deviations))
+
+
+def mean_absolute_deviation(digest, centre):
+    return float(np.average(np.abs(digest.means - centre), weights=digest.weights))
+
+
+def anomaly_thresholds(summary):
+    """
+    Per column the mean, standard deviation, quartiles and IQR, and per
+    Type the median and robust scale of the modified z-score.
+    """
+    thresholds = {}
+    for col in NUMERIC_COLUMNS:
+        digest = summary.digests[col]
+        q1, median, q3 = digest.quantiles([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        if not iqr > 0:
+            iqr = IQR_PER_STD * MEANAD_SCALE * mean_absolute_deviation(digest, median)
+        types = {}
+        for equipment_type, digests in summary.type_digests.items():
+            type_median, mad = median_absolute_deviation(digests[col])
+            if mad > 0:
+                scale = mad / MAD_SCALE
+            else:
+                scale = MEANAD_SCALE * mean_absolute_deviation(digests[col], type_median)
+            types[equipment_type] = {'median': type_median, 'scale': scale}
+        thresholds[col] = {
+            'mean': summary.moments[col].mean,
+            'std': summary.moments[col].std,
+            'q1': q1,
+            'q3': q3,
+            'iqr': iqr,
+            'types': types,
+        }
+    return thresholds
+
+
+def _ratio(numerator, denominator):
+    denominator = np.broadcast_to(np.asarray(denominator, dtype=float), numerator.shape)
+    valid = np.isfinite(denominator) & (denominator > 0)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=valid)
+
+
+def detect_anomalies(batch, thresholds):
+    """
+    Yields (row_index, column, value, z_score, iqr_score, mad_score) for
+    every flagged value of a batch of records.
+    """
+    values = batch[NUMERIC_COLUMNS].to_numpy(dtype=float)
+
+    def stat(name):
+        return np.array([thresholds[col][name] for col in NUMERIC_COLUMNS], dtype=float)
+
+    def type_stat(name):
+        return np.column_stack([
+            batch['Type'].map({t: stats[name] for t, stats in thresholds[col]['types'].items()})
+            .to_numpy(dtype=float, na_value=np.nan)
+            for col in NUMERIC_COLUMNS
+        ])
+
+    q1, q3 = stat('q1'), stat('q3')
+    z_scores = _ratio(values - stat('mean'), stat('std'))
+    outside = np.where(values < q1, values - q1, np.where(values > q3, values - q3, 0.0))
+    iqr_scores = _ratio(outside, stat('iqr'))
+    mad_scores = _ratio(values - type_stat('median'), type_stat('scale'))
+
+    flagged = ((np.abs(z_scores) > Z_THRESHOLD)
+               | (np.abs(iqr_scores) > IQR_FACTOR)
+               | (np.abs(mad_scores) > MAD_THRESHOLD))
+    row_indexes = batch['row_index'].to_numpy()
+    rows, cols = np.nonzero(flagged)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        yield (int(row_indexes[row]), NUMERIC_COLUMNS[col], float(values[row, col]),
+               float(z_scores[row, col]), float(iqr_scores[row, col]), float(mad_scores[row, col]))
+
+
+def read_batches(records):
+    """
+    Yields a dataset's records in row order as DataFrames, with their
+    row_index and a None Type for blank Types.
+    """
+    rows = records.order_by('row_index').values_list('row_index', 'type', 'flowrate', 'pressure', 'temperature')
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield _frame(batch)
+            batch = []
+    if batch:
+        yield _frame(batch)
+
+
+def _frame(batch):
+    frame = pd.DataFrame(batch, columns=['row_index', 'Type'] + NUMERIC_COLUMNS)
+    frame['Type'] = frame['Type'].replace('', None)
+    return frame
+
+
+def detect_existing_anomalies(apps, schema_editor):
+    """
+    Rebuilds the sketches of existing datasets (now with per-Type
+    digests) and flags their anomalies: one pass over the records for
+    the statistics, one to score them.
+    """
+    Dataset = apps.get_model('equipment', 'Dataset')
+    EquipmentRecord = apps.get_model('equipment', 'EquipmentRecord')
+    Anomaly = apps.get_model('equipment', 'Anomaly')
+
+    for dataset in Dataset.objects.iterator():
+        records = EquipmentRecord.objects.filter(dataset_id=dataset.pk)
+        summary = TypedSummary()
+        for batch in read_batches(records):
+            summary.update(batch)
+        if not summary.count:
+            continue
+        dataset.sketches = to_sketches(summary)
+        dataset.save(update_fields=['sketches'])
+
+        thresholds = anomaly_thresholds(summary)
+        for batch in read_batches(records):
+            Anomaly.objects.bulk_create([
+                Anomaly(dataset_id=dataset.pk, row_index=row_index, column=column, value=value,
+                        z_score=z_score, iqr_score=iqr_score, mad_score=mad_score)
+                for row_index, column, value, z_score, iqr_score, mad_score in detect_anomalies(batch, thresholds)
+            ], batch_size=ANOMALY_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0010_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_index', models.PositiveIntegerField()),
+                ('column', models.CharField(max_length=20)),
+                ('value', models.FloatField()),
+                ('z_score', models.FloatField()),
+                ('iqr_score', models.FloatField()),
+                ('mad_score', models.FloatField()),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='equipment.dataset')),
+            ],
+            options={
+                'verbose_name': 'Anomaly',
+                'verbose_name_plural': 'Anomalies',
+                'ordering': ['dataset', 'row_index', 'column'],
+                'indexes': [models.Index(fields=['dataset', 'row_index'], name='anomaly_dataset_row_idx')],
+            },
+        ),
+        migrations.RunPython(detect_existing_anomalies, migrations.RunPython.noop),
+    ]
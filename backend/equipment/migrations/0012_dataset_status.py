@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:11
+
+from django.db import migrations, models
+import django.db.models.manager
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0011_anomaly'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='dataset',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('appending', 'Appending')], default='ready', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def clear_duplicate_hashes(apps, schema_editor):
+    """
+    Keeps the content hash of each user's newest copy of a file only, so
+    the unique constraint can be added to databases that raced before.
+    """
+    Dataset = apps.get_model('equipment', 'Dataset')
+    duplicates = (
+        Dataset._default_manager.exclude(content_hash=None)
+        .values('user_id', 'content_hash').annotate(copies=Count('id')).filter(copies__gt=1)
+    )
+    for duplicate in duplicates:
+        copies = Dataset._default_manager.filter(user_id=duplicate['user_id'], content_hash=duplicate['content_hash'])
+        newest = copies.order_by('-uploaded_at', '-id').values_list('id', flat=True).first()
+        copies.exclude(id=newest).update(content_hash=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0012_dataset_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_hashes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='dataset',
+            name='dataset_user_hash_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='dataset',
+            constraint=models.UniqueConstraint(fields=('user', 'content_hash'), name='unique_dataset_user_hash'),
+        ),
+    ]
@@ -1,24 +1,249 @@
+import uuid
+
+import pandas as pd
 from django.db import models
+from django.utils import timezone
+
+
+class VisibleDatasetManager(models.Manager):
+    """
+    Datasets clients may see: all but uploads still being written.
+    """
+    def get_queryset(self):
+        return super().get_queryset().exclude(status=Dataset.STATUS_PROCESSING)
 
 
 class Dataset(models.Model):
     """
     Model to store uploaded equipment CSV datasets.
     Keeps only the last 5 uploads.
+
+    Rows are committed chunk by chunk while a file is ingested, so a
+    dataset is created ``processing`` and only becomes ``ready`` (and
+    visible through ``Dataset.objects``) once its summary is stored.
+    While rows are appended it is ``appending``.
     """
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_APPENDING = 'appending'
+    STATUS_CHOICES = [
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_APPENDING, 'Appending'),
+    ]
+
     uploaded_at = models.DateTimeField(auto_now_add=True)
     file_name = models.CharField(max_length=255)
     summary = models.JSONField()  # Stores analytics: averages, counts, distributions
-    uploaded_at = models.DateTimeField(auto_now_add=True)
-    file_name = models.CharField(max_length=255)
-    summary = models.JSONField()  # Stores analytics: averages, counts, distributions
-    raw_data = models.JSONField()  # Stores the actual equipment records
+    sketches = models.JSONField(default=dict, blank=True)  # Mergeable state behind summary, see SummaryAccumulator
+    content_hash = models.CharField(max_length=64, null=True, blank=True)  # SHA-256 of the uploaded file
+    revision = models.PositiveIntegerField(default=0)  # Bumped whenever rows are appended
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='datasets', null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_READY)
+    status_changed_at = models.DateTimeField(default=timezone.now)
+    
+    all_objects = models.Manager()
+    objects = VisibleDatasetManager()
     
     class Meta:
         ordering = ['-uploaded_at']
+        constraints = [
+            # Also the index for duplicate lookups; NULL hashes never collide
+            models.UniqueConstraint(fields=['user', 'content_hash'], name='unique_dataset_user_hash'),
+        ]
         verbose_name = 'Equipment Dataset'
         verbose_name_plural = 'Equipment Datasets'
     
     def __str__(self):
         return f"{self.file_name} - {self.uploaded_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class EquipmentRecord(models.Model):
+    """
+    A single equipment row of an uploaded dataset.
+    Rows are stored normalized so reads only touch the rows they need.
+    """
+    # CSV column name -> model field, in CSV column order
+    CSV_FIELDS = {
+        'Equipment Name': 'name',
+        'Type': 'type',
+        'Flowrate': 'flowrate',
+        'Pressure': 'pressure',
+        'Temperature': 'temperature',
+    }
+
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='records')
+    row_index = models.PositiveIntegerField()  # Position of the row in the uploaded CSV
+    name = models.CharField(max_length=255)
+    type = models.CharField(max_length=100)
+    flowrate = models.FloatField()
+    pressure = models.FloatField()
+    temperature = models.FloatField()
+    
+    class Meta:
+        ordering = ['dataset', 'row_index']
+        verbose_name = 'Equipment Record'
+        verbose_name_plural = 'Equipment Records'
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'row_index'], name='unique_record_row_index'),
+        ]
+        indexes = [
+            models.Index(fields=['dataset', 'type'], name='record_dataset_type_idx'),
+            models.Index(fields=['dataset', 'name'], name='record_dataset_name_idx'),
+            models.Index(fields=['dataset', 'flowrate'], name='record_dataset_flowrate_idx'),
+            models.Index(fields=['dataset', 'pressure'], name='record_dataset_pressure_idx'),
+            models.Index(fields=['dataset', 'temperature'], name='record_dataset_temp_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.type})"
+    
+    @classmethod
+    def from_row(cls, dataset, row_index, row):
+        """
+        Builds an unsaved record from a CSV row dict.
+        """
+        return cls(
+            dataset=dataset,
+            row_index=row_index,
+            name=str(row['Equipment Name']),
+            type=str(row['Type']) if pd.notna(row['Type']) else '',
+            flowrate=float(row['Flowrate']),
+            pressure=float(row['Pressure']),
+            temperature=float(row['Temperature']),
+        )
+    
+    @classmethod
+    def rows(cls, queryset):
+        """
+        Yields CSV-style row dicts for a record queryset without
+        instantiating model objects.
+        """
+        columns = list(cls.CSV_FIELDS.keys())
+        for values in queryset.values_list(*cls.CSV_FIELDS.values()):
+            yield dict(zip(columns, values))
+
+
+class Anomaly(models.Model):
+    """
+    A value of a dataset row flagged by anomaly detection, with its
+    z-score, IQR-fence score and per-Type robust (MAD) score; see
+    equipment/anomalies.py.
+    """
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='anomalies')
+    row_index = models.PositiveIntegerField()  # EquipmentRecord.row_index of the row
+    column = models.CharField(max_length=20)  # 'Flowrate', 'Pressure' or 'Temperature'
+    value = models.FloatField()
+    z_score = models.FloatField()
+    iqr_score = models.FloatField()  # Distance outside the quartiles, in IQRs (negative below)
+    mad_score = models.FloatField()  # Modified z-score within the row's Type
+    
+    class Meta:
+        ordering = ['dataset', 'row_index', 'column']
+        verbose_name = 'Anomaly'
+        verbose_name_plural = 'Anomalies'
+        indexes = [
+            models.Index(fields=['dataset', 'row_index'], name='anomaly_dataset_row_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.column} of row {self.row_index} ({self.value})"
+
+
+class IngestJob(models.Model):
+    """
+    Background analysis of an uploaded CSV.
+    Clients poll it for progress until the dataset is ready.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='ingest_jobs')
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    stage = models.CharField(max_length=50, default=STATUS_QUEUED)
+    progress = models.FloatField(default=0.0)  # Fraction of the file consumed, 0..1
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    timings = models.JSONField(default=dict)  # Seconds spent per stage
+    dataset = models.ForeignKey(Dataset, on_delete=models.SET_NULL, related_name='ingest_jobs', null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Ingest Job'
+        verbose_name_plural = 'Ingest Jobs'
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload, sent as numbered chunks and assembled in a
+    spool file on local disk before it is analyzed.
+    """
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Open'),
+        (STATUS_COMPLETED, 'Completed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='upload_sessions')
+    file_name = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    job = models.ForeignKey(IngestJob, on_delete=models.SET_NULL, related_name='upload_sessions', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+    
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+    
+    def chunk_length(self, index):
+        """
+        Expected size in bytes of chunk ``index`` (the last may be shorter).
+        """
+        return min(self.chunk_size, self.total_size - index * self.chunk_size)
+
+
+class UploadChunk(models.Model):
+    """
+    A chunk of an UploadSession that has been received and verified.
+    """
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64)  # SHA-256 hex digest
+    received_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['session', 'index']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'index'], name='unique_upload_chunk_index'),
+        ]
+    
+    def __str__(self):
+        return f"{self.session_id} #{self.index}"
@@ -0,0 +1,129 @@
+"""
+Pagination classes for dataset rows and anomalies.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def _flip(term):
+    return term[1:] if term.startswith('-') else f'-{term}'
+
+
+def _after(ordering, position):
+    """
+    Q object selecting the rows that sort after ``position`` (the values
+    of the ``ordering`` columns of one row). This is the row-value
+    comparison ``(a, b, c) > (x, y, z)`` written out per column, so that
+    every column can have its own direction:
+    ``a >= x AND (a > x OR (b >= y AND (b > y OR c > z)))``.
+    The leading ``>=`` lets the database range-scan an index on ``a``.
+    """
+    *rest, last = ordering
+    field = last.lstrip('-')
+    condition = Q(**{f"{field}__{'lt' if last.startswith('-') else 'gt'}": position[-1]})
+    for term, value in zip(reversed(rest), reversed(position[:-1])):
+        field = term.lstrip('-')
+        strict, loose = ('lt', 'lte') if term.startswith('-') else ('gt', 'gte')
+        condition = Q(**{f'{field}__{loose}': value}) & (Q(**{f'{field}__{strict}': value}) | condition)
+    return condition
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination over a composite sort key.
+
+    DRF's CursorPagination positions its cursor on the first ordering
+    column only and skips ties with an offset, which breaks once more
+    than ``offset_cutoff`` rows share a value. Here the cursor holds the
+    values of every ordering column of the last (or first) row of the
+    page, and the next page is the rows that sort after it. ``ordering``
+    must end in columns that are unique together, e.g. ``row_index``.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = (self.ordering,) if isinstance(self.ordering, str) else tuple(self.ordering)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor['reverse']
+
+        ordering = tuple(_flip(term) for term in self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(_after(ordering, self.cursor['position']))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def _position(self, row):
+        return [getattr(row, term.lstrip('-')) for term in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Paged back past the start; the cursor still marks where to resume
+            return self.encode_cursor({'position': self.cursor['position'], 'reverse': False})
+        return self.encode_cursor({'position': self._position(self.page[-1]), 'reverse': False})
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor({'position': self.cursor['position'], 'reverse': True})
+        return self.encode_cursor({'position': self._position(self.page[0]), 'reverse': True})
+
+    def encode_cursor(self, cursor):
+        payload = json.dumps([cursor['position'], int(cursor['reverse'])], separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return {'position': position, 'reverse': bool(reverse)}
+
+
+class RecordCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over a dataset's rows, in upload order or in the
+    order of ``?ordering=`` (which always ends in ``row_index``).
+    Each page costs the same regardless of how deep into the dataset it is.
+    """
+    ordering = 'row_index'
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+
+
+class AnomalyCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over a dataset's anomalies in row order.
+    """
+    ordering = ('row_index', 'column')
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
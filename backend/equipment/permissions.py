@@ -0,0 +1,24 @@
+"""
+Custom permission classes for the equipment API.
+"""
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class MetricsAccess(BasePermission):
+    """
+    Allows staff users, and unauthenticated scrapers (e.g. a Prometheus
+    server) that send the bearer token ``EQUIPMENT_METRICS_TOKEN`` or
+    connect from an address in ``EQUIPMENT_METRICS_ALLOWED_IPS``.
+    Nothing else is allowed by default.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = settings.EQUIPMENT_METRICS_TOKEN
+        if token and hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            return True
+        return request.META.get('REMOTE_ADDR') in settings.EQUIPMENT_METRICS_ALLOWED_IPS
@@ -0,0 +1,198 @@
+"""
+On-demand profiling of single requests for staff users.
+A request with ``?profile=1`` (or an ``X-Profile`` header) runs under
+cProfile; ``profile=sample`` uses a sampling profiler instead and keeps
+collapsed stacks ready for flamegraph.pl or speedscope. Profiles are
+stored in EQUIPMENT_PROFILE_DIR next to a small JSON description and
+served by the ``/api/profiles/`` endpoints.
+"""
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+
+# Profile kinds and the file extension of their data
+PROFILE_KINDS = {
+    'cprofile': '.prof',
+    'sample': '.collapsed',
+}
+
+# Values of ?profile= / X-Profile that select each kind
+PROFILE_ALIASES = {
+    '1': 'cprofile', 'true': 'cprofile', 'yes': 'cprofile', 'cprofile': 'cprofile',
+    'sample': 'sample', 'sampling': 'sample',
+}
+
+# Seconds between stack samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+
+
+def requested_kind(request):
+    """
+    Profile kind a request asks for, or None.
+    """
+    value = request.GET.get('profile') or request.META.get('HTTP_X_PROFILE')
+    if not value:
+        return None
+    return PROFILE_ALIASES.get(value.lower())
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread at a fixed interval from a
+    background thread, counting identical stacks.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """
+        Stacks in the collapsed format: ``outer;inner;leaf count`` per line.
+        """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def profile_call(kind, function, *args):
+    """
+    Calls ``function(*args)`` under the profiler of ``kind``.
+
+    Returns:
+        tuple: (result, profile data as bytes)
+    """
+    if kind == 'sample':
+        sampler = SamplingProfiler(threading.get_ident())
+        sampler.start()
+        try:
+            result = function(*args)
+        finally:
+            sampler.stop()
+        return result, sampler.collapsed().encode('utf-8')
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args)
+    profiler.create_stats()
+    # Same format as Profile.dump_stats(), readable by pstats and snakeviz
+    return result, marshal.dumps(profiler.stats)
+
+
+def _paths(profile_id, kind):
+    base = os.path.join(settings.EQUIPMENT_PROFILE_DIR, profile_id)
+    return base + PROFILE_KINDS[kind], base + '.json'
+
+
+def save_profile(kind, data, details):
+    """
+    Stores profile data with its description and prunes the oldest
+    profiles beyond EQUIPMENT_PROFILE_KEEP.
+
+    Returns:
+        str: the profile id
+    """
+    os.makedirs(settings.EQUIPMENT_PROFILE_DIR, exist_ok=True)
+    created_at = datetime.now(timezone.utc)
+    # Ids sort in creation order, so pruning needs only the file names
+    profile_id = f"{created_at:%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}"
+    data_path, meta_path = _paths(profile_id, kind)
+    with open(data_path, 'wb') as f:
+        f.write(data)
+    with open(meta_path, 'w') as f:
+        json.dump({
+            'id': profile_id,
+            'kind': kind,
+            'created_at': created_at.isoformat(),
+            'size': len(data),
+            **details,
+        }, f)
+    prune_profiles()
+    return profile_id
+
+
+def list_profiles():
+    """
+    Descriptions of the stored profiles, newest first.
+    """
+    profiles = []
+    try:
+        names = os.listdir(settings.EQUIPMENT_PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.EQUIPMENT_PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda profile: profile['created_at'], reverse=True)
+
+
+def get_profile(profile_id):
+    """
+    Description and data path of a stored profile, or (None, None).
+    """
+    for kind in PROFILE_KINDS:
+        data_path, meta_path = _paths(profile_id, kind)
+        if os.path.exists(data_path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                return json.load(f), data_path
+    return None, None
+
+
+def profile_text(data_path, limit=60):
+    """
+    Human-readable top functions of a cProfile profile, by cumulative time.
+    """
+    out = io.StringIO()
+    stats = pstats.Stats(data_path, stream=out)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def prune_profiles():
+    """
+    Deletes the oldest profiles beyond EQUIPMENT_PROFILE_KEEP, going by
+    their ids rather than reading every description.
+    """
+    ids = sorted((name[:-len('.json')] for name in os.listdir(settings.EQUIPMENT_PROFILE_DIR)
+                  if name.endswith('.json')), reverse=True)
+    for profile_id in ids[settings.EQUIPMENT_PROFILE_KEEP:]:
+        paths = {path for kind in PROFILE_KINDS for path in _paths(profile_id, kind)}
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
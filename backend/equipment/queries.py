@@ -0,0 +1,111 @@
+"""
+Server-side filtering and sorting of dataset rows.
+Every filter maps onto an indexed column of EquipmentRecord.
+"""
+
+
+# Numeric columns that accept ``<column>_min`` / ``<column>_max`` bounds
+RANGE_FIELDS = ['flowrate', 'pressure', 'temperature']
+
+# Columns accepted by ``?ordering=``
+SORTABLE_FIELDS = ['row_index', 'name', 'type', 'flowrate', 'pressure', 'temperature']
+
+
+class QueryError(ValueError):
+    """
+    Raised for malformed filter or ordering parameters.
+    """
+    pass
+
+
+def _parse_float(params, key):
+    value = params.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise QueryError(f"'{key}' must be a number")
+
+
+def _prefix_upper_bound(prefix):
+    """
+    Smallest string greater than every string starting with ``prefix``.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def filter_records(queryset, params):
+    """
+    Applies query-string filters to an EquipmentRecord queryset.
+
+    Supported parameters:
+        type: equipment type; repeat or comma-separate for several
+        <column>_min / <column>_max: inclusive bounds on flowrate,
+            pressure and temperature
+        name_prefix: case-sensitive prefix of the equipment name
+
+    Raises:
+        QueryError: if a parameter is malformed
+    """
+    types = [t for value in params.getlist('type') for t in value.split(',') if t]
+    if types:
+        queryset = queryset.filter(type__in=types)
+
+    for field in RANGE_FIELDS:
+        low = _parse_float(params, f'{field}_min')
+        high = _parse_float(params, f'{field}_max')
+        if low is not None:
+            queryset = queryset.filter(**{f'{field}__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{f'{field}__lte': high})
+
+    # A range scan instead of LIKE, so the (dataset, name) index is used
+    prefix = params.get('name_prefix')
+    if prefix:
+        queryset = queryset.filter(name__gte=prefix, name__lt=_prefix_upper_bound(prefix))
+
+    return queryset
+
+
+def parse_ordering(value):
+    """
+    Parses ``?ordering=-pressure,name`` into an ORM ordering tuple.
+    ``row_index`` is always appended as a tie-breaker so pages are stable.
+
+    Raises:
+        QueryError: if an unknown column is requested
+    """
+    ordering = []
+    for term in (value or '').split(','):
+        term = term.strip()
+        if not term:
+            continue
+        field = term.lstrip('-')
+        if field not in SORTABLE_FIELDS:
+            raise QueryError(f"Cannot sort by '{field}'. Choose from: {', '.join(SORTABLE_FIELDS)}")
+        ordering.append(term)
+
+    if not any(term.lstrip('-') == 'row_index' for term in ordering):
+        ordering.append('row_index')
+    return tuple(ordering)
+
+
+def parse_id_list(values, key='datasets'):
+    """
+    Parses ``?datasets=1,2`` (comma-separated and/or repeated) into a
+    sorted list of unique ids; None when the parameter is absent.
+
+    Raises:
+        QueryError: if an id is not a positive integer
+    """
+    terms = [term.strip() for value in values for term in value.split(',') if term.strip()]
+    if not terms:
+        return None
+    try:
+        ids = sorted({int(term) for term in terms})
+    except ValueError:
+        raise QueryError(f"'{key}' must be a comma-separated list of ids")
+    if ids[0] < 1:
+        raise QueryError(f"'{key}' must be a comma-separated list of ids")
+    return ids
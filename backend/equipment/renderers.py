@@ -0,0 +1,112 @@
+"""
+Additional response renderers for the equipment API.
+"""
+import datetime
+import decimal
+import uuid
+
+import msgpack
+import orjson
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .timing import span
+
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+_json_encoder = JSONEncoder()
+
+
+def orjson_dumps(data):
+    """
+    Serializes data to JSON bytes with orjson.
+    Types orjson does not know (Decimal, lazy strings, querysets, ...)
+    are converted the same way DRF's encoder converts them.
+    """
+    return orjson.dumps(data, default=_json_encoder.default, option=ORJSON_OPTIONS)
+
+
+def _msgpack_default(obj):
+    """
+    Converts types msgpack cannot pack natively, mirroring DRF's JSON encoder.
+    """
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'Cannot serialize {type(obj).__name__} to msgpack')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson, which encodes straight to bytes and is
+    much faster than the standard library on large row lists.
+    Pretty-printed output (e.g. for the browsable API) is left to DRF's
+    renderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with span('render'):
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+            return orjson_dumps(data)
+
+
+class MsgpackRenderer(BaseRenderer):
+    """
+    Renders responses as MessagePack.
+    Dataset endpoints return rows column-wise in this format; see
+    equipment/columnar.py.
+    """
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with span('render'):
+            return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets the events endpoint accept ``Accept: text/event-stream`` (sent by
+    EventSource). Events are streamed by the view; only errors, sent as
+    a single ``error`` event, go through this renderer.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b'event: error\ndata: ' + orjson_dumps(data) + b'\n\n'
+
+
+class PlainTextRenderer(BaseRenderer):
+    """
+    Renders text as is (error details as plain text).
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = data.get('detail', data.get('error', data))
+        return str(data).encode(self.charset)
+
+
+class PrometheusTextRenderer(PlainTextRenderer):
+    """
+    Renders the metrics endpoint's text exposition.
+    """
@@ -0,0 +1,568 @@
+"""
+PDF report rendering and the on-disk report cache.
+Datasets never change after upload, so a rendered report is reused until
+the summary or the report template changes.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from django.conf import settings
+
+from .metrics import (REPORT_QUEUE_WAIT, REPORT_RENDER_TIME, REPORT_REJECTED, REPORT_IN_FLIGHT,
+                      REPORT_CACHE_HITS, REPORT_CACHE_MISSES)
+from .timing import span, record
+
+# PDF generation imports
+from reportlab.lib.pagesizes import letter, A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, KeepTogether
+from reportlab.lib import colors
+from reportlab.graphics.shapes import Drawing, Polygon, Circle
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.charts.legends import Legend
+
+
+# Bump whenever build_report_pdf changes its output, so cached reports
+# rendered from the old template are not served again
+REPORT_TEMPLATE_VERSION = 2
+
+
+def report_context(dataset):
+    """
+    Plain-data inputs needed to render a dataset's report.
+    """
+    return {
+        'id': dataset.id,
+        'file_name': dataset.file_name,
+        'uploaded_at': dataset.uploaded_at,
+        'summary': dataset.summary,
+        'revision': dataset.revision,
+    }
+
+
+def build_report_pdf(context):
+    """
+    Renders the PDF report for a dataset.
+
+    Args:
+        context: dict from report_context()
+
+    Returns:
+        bytes: the PDF document
+    """
+    # Create PDF buffer
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+    styles = getSampleStyleSheet()
+
+    # --- Logo ---
+    logo_drawing = Drawing(40, 40)
+    points = [20, 40, 37, 30, 37, 10, 20, 0, 3, 10, 3, 30]
+    hexagon = Polygon(points)
+    hexagon.fillColor = colors.HexColor('#1a5490')
+    hexagon.strokeColor = colors.HexColor('#1a5490')
+    logo_drawing.add(hexagon)
+
+    circle = Circle(20, 20, 10)
+    circle.fillColor = colors.white
+    circle.strokeColor = colors.white
+    logo_drawing.add(circle)
+
+    story.append(logo_drawing)
+    story.append(Spacer(1, 0.1*inch))
+
+    # --- Title ---
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1a5490'),
+        spaceAfter=20,
+        alignment=1  # Center
+    )
+    story.append(Paragraph("Chemical Equipment Parameter Report", title_style))
+    story.append(Spacer(1, 0.2*inch))
+
+    # --- Metadata ---
+    info_style = ParagraphStyle(
+        'InfoStyle',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.HexColor('#555555')
+    )
+    story.append(Paragraph(f"<b>Dataset:</b> {context['file_name']}", info_style))
+    story.append(Paragraph(f"<b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", info_style))
+    story.append(Paragraph(f"<b>Uploaded:</b> {context['uploaded_at'].strftime('%Y-%m-%d %H:%M:%S')}", info_style))
+    story.append(Spacer(1, 0.3*inch))
+
+    # --- Summary Statistics Table ---
+    story.append(Paragraph("<b>Summary Statistics</b>", styles['Heading2']))
+    story.append(Spacer(1, 0.1*inch))
+
+    summary = context['summary']
+
+    # Helper to safely get value
+    def get_val(key, fmt="{:.2f}"):
+        val = summary.get(key)
+        if val is None:
+            return "N/A"
+        return fmt.format(val)
+
+    summary_data = [
+        ['Metric', 'Value', 'Min', 'Max'],
+        ['Total Equipment', str(summary.get('total_equipment', 0)), '-', '-'],
+        ['Flowrate', get_val('average_flowrate'), get_val('min_flowrate'), get_val('max_flowrate')],
+        ['Pressure', get_val('average_pressure'), get_val('min_pressure'), get_val('max_pressure')],
+        ['Temperature', get_val('average_temperature'), get_val('min_temperature'), get_val('max_temperature')],
+    ]
+
+    summary_table = Table(summary_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a5490')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'), # Left align first column
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f1f2f6')]),
+    ]))
+    story.append(summary_table)
+    story.append(Spacer(1, 0.2*inch))
+
+    # --- Distribution and per-Type tables (precomputed at upload) ---
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a5490')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f1f2f6')]),
+    ])
+
+    statistics = summary.get('statistics')
+    if statistics:
+        distribution_data = [['Parameter', 'Std Dev', 'P5', 'P25', 'Median', 'P75', 'P95']]
+        for col, described in statistics.items():
+            distribution_data.append([col] + [
+                "{:.2f}".format(described[key]) for key in ('std', 'p5', 'p25', 'median', 'p75', 'p95')
+            ])
+        distribution_table = Table(distribution_data, colWidths=[1.5*inch] + [0.9*inch] * 6)
+        distribution_table.setStyle(table_style)
+        story.append(KeepTogether([
+            Paragraph("<b>Distribution</b>", styles['Heading2']),
+            Spacer(1, 0.1*inch),
+            distribution_table,
+        ]))
+        story.append(Spacer(1, 0.2*inch))
+
+    type_statistics = summary.get('type_statistics')
+    if type_statistics:
+        type_data = [['Type', 'Count', 'Avg Flowrate', 'Avg Pressure', 'Avg Temperature']]
+        for equipment_type in summary['type_distribution']:
+            row = type_statistics[equipment_type]
+            type_data.append([equipment_type, str(row['count'])] + [
+                "{:.2f} ± {:.2f}".format(row[col]['mean'], row[col]['std'])
+                for col in ('Flowrate', 'Pressure', 'Temperature')
+            ])
+        type_table = Table(type_data, colWidths=[1.9*inch, 0.8*inch] + [1.4*inch] * 3, repeatRows=1)
+        type_table.setStyle(table_style)
+        story.append(Paragraph("<b>By Equipment Type</b>", styles['Heading2']))
+        story.append(Spacer(1, 0.1*inch))
+        story.append(type_table)
+        story.append(Spacer(1, 0.2*inch))
+
+    # --- Bar Chart ---
+    bar_elements = []
+    bar_elements.append(Paragraph("<b>Average Parameters</b>", styles['Heading2']))
+    bar_elements.append(Spacer(1, 0.1*inch))
+
+    drawing = Drawing(450, 200)
+    bar_chart = VerticalBarChart()
+    bar_chart.x = 50
+    bar_chart.y = 50
+    bar_chart.height = 150
+    bar_chart.width = 350
+    bar_chart.data = [[
+        summary.get('average_flowrate', 0),
+        summary.get('average_pressure', 0),
+        summary.get('average_temperature', 0)
+    ]]
+    bar_chart.categoryAxis.categoryNames = ['Flowrate', 'Pressure', 'Temperature']
+    bar_chart.bars[0].fillColor = colors.HexColor('#1a5490')
+    bar_chart.valueAxis.valueMin = 0
+    drawing.add(bar_chart)
+    bar_elements.append(drawing)
+
+    story.append(KeepTogether(bar_elements))
+    story.append(Spacer(1, 0.2*inch))
+
+    # --- Pie Chart ---
+    pie_elements = []
+    pie_elements.append(Paragraph("<b>Equipment Type Distribution</b>", styles['Heading2']))
+    pie_elements.append(Spacer(1, 0.1*inch))
+
+    pie_drawing = Drawing(450, 250)
+    pie = Pie()
+    pie.x = 20
+    pie.y = 60
+    pie.width = 150
+    pie.height = 150
+
+    # Data
+    labels = list(summary['type_distribution'].keys())
+    data = list(summary['type_distribution'].values())
+
+    pie.data = data
+    pie.labels = None # Disable direct labels to avoid overlap
+
+    # Colors
+    pie_colors = [
+        colors.HexColor('#1a5490'), colors.HexColor('#4a69bd'),
+        colors.HexColor('#6a89cc'), colors.HexColor('#82ccdd'),
+        colors.HexColor('#b8e994'), colors.HexColor('#f8c291'),
+        colors.HexColor('#e55039')
+    ]
+
+    for i, val in enumerate(pie.data):
+         pie.slices[i].fillColor = pie_colors[i % len(pie_colors)]
+         pie.slices[i].strokeColor = colors.white
+         pie.slices[i].strokeWidth = 1
+
+    pie_drawing.add(pie)
+
+    # Legend
+    legend = Legend()
+    legend.x = 220
+    legend.y = 160
+    legend.boxAnchor = 'w'
+    legend.columnMaximum = 10
+    legend.fontName = 'Helvetica'
+    legend.fontSize = 10
+
+    # Create color/name pairs for legend
+    legend_data = []
+    for i, label in enumerate(labels):
+        color = pie_colors[i % len(pie_colors)]
+        # Add count to label
+        label_text = f"{label} ({data[i]})"
+        legend_data.append((color, label_text))
+
+    legend.colorNamePairs = legend_data
+    pie_drawing.add(legend)
+
+    pie_elements.append(pie_drawing)
+    story.append(KeepTogether(pie_elements))
+
+    # --- Build PDF ---
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_report_timed(context):
+    """
+    Worker-process entry point.
+
+    Returns:
+        tuple: (pdf bytes, wall-clock start time, render seconds)
+    """
+    started_at = time.time()
+    started = time.perf_counter()
+    pdf = build_report_pdf(context)
+    return pdf, started_at, time.perf_counter() - started
+
+
+class ReportQueueFull(Exception):
+    """
+    Raised when every render slot is taken; clients should retry later.
+    """
+    pass
+
+
+class ReportRenderer:
+    """
+    Renders reports in a bounded process pool so CPU-bound ReportLab work
+    does not hold the GIL of the web worker.
+
+    At most ``workers`` renders run at once and ``queue_depth`` more may
+    wait; beyond that ``render`` raises ReportQueueFull. Concurrent
+    requests for the same report share one render. With ``workers=0``
+    reports are rendered inline in the calling thread.
+    """
+
+    def __init__(self, workers, queue_depth):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_depth)
+        self._lock = threading.RLock()
+        self._pool = None
+        self._inflight = {}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawned rather than forked: forking a multi-threaded web
+                # worker can deadlock the child
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def render(self, key, context):
+        """
+        Renders a report, sharing the result with concurrent callers
+        asking for the same key.
+
+        Returns:
+            bytes: the PDF document
+
+        Raises:
+            ReportQueueFull: if the render queue is full
+        """
+        if not self.workers:
+            return self._render_inline(context)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                self._acquire()
+                submitted_at = time.time()
+                try:
+                    future = self._get_pool().submit(render_report_timed, context)
+                except Exception:
+                    self._release()
+                    raise
+                self._inflight[key] = future
+
+        if not owner:
+            return future.result()[0]
+
+        # The submitting request does the bookkeeping for everyone sharing it
+        try:
+            pdf, started_at, render_seconds = future.result()
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for later renders
+            with self._lock:
+                self._pool = None
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            self._release()
+
+        queue_wait = max(started_at - submitted_at, 0.0)
+        REPORT_QUEUE_WAIT.observe(queue_wait)
+        REPORT_RENDER_TIME.observe(render_seconds)
+        record('report_queue', queue_wait)
+        record('reportlab', render_seconds)
+        return pdf
+
+    def _render_inline(self, context):
+        self._acquire()
+        try:
+            pdf, _, render_seconds = render_report_timed(context)
+        finally:
+            self._release()
+        REPORT_QUEUE_WAIT.observe(0.0)
+        REPORT_RENDER_TIME.observe(render_seconds)
+        record('reportlab', render_seconds)
+        return pdf
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            REPORT_REJECTED.inc()
+            raise ReportQueueFull('Report rendering is busy, try again shortly')
+        REPORT_IN_FLIGHT.inc()
+
+    def _release(self):
+        REPORT_IN_FLIGHT.dec()
+        self._slots.release()
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_report_renderer():
+    """
+    Shared renderer configured from settings; rebuilt if they change.
+    """
+    global _renderer
+    workers = settings.EQUIPMENT_REPORT_WORKERS
+    queue_depth = settings.EQUIPMENT_REPORT_QUEUE_DEPTH
+    with _renderer_lock:
+        if _renderer is None or (_renderer.workers, _renderer.queue_depth) != (workers, queue_depth):
+            _renderer = ReportRenderer(workers, queue_depth)
+        return _renderer
+
+
+def report_cache_key(context):
+    """
+    Cache file name for a report: dataset id plus a hash of everything
+    the report shows (file name, upload time, summary), the dataset's
+    revision and the template version.
+    """
+    payload = json.dumps(
+        {
+            'file_name': context['file_name'],
+            'uploaded_at': context['uploaded_at'],
+            'summary': context['summary'],
+            'revision': context['revision'],
+            'template': REPORT_TEMPLATE_VERSION,
+        },
+        sort_keys=True, default=str
+    )
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+    return f"{context['id']}-{digest}.pdf"
+
+
+class ReportCache:
+    """
+    Rendered reports on local disk with size-bounded LRU eviction.
+    A file's mtime is its last use; hits refresh it.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        Returns the path of a cached report, or None on a miss.
+        """
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, pdf_bytes):
+        """
+        Stores a report atomically and evicts least recently used
+        reports beyond the size limit.
+
+        Returns:
+            str: path of the cached report
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(fd, 'wb') as out:
+            out.write(pdf_bytes)
+        path = self.path_for(key)
+        os.replace(tmp_path, path)
+        self.evict(keep=key)
+        return path
+
+    def invalidate(self, dataset_id):
+        """
+        Removes every cached report of a dataset.
+        """
+        prefix = f"{dataset_id}-"
+        for entry in self._entries():
+            if entry.name.startswith(prefix):
+                self._remove(entry.path)
+
+    def evict(self, keep=None):
+        """
+        Deletes least recently used reports until the cache fits max_bytes.
+        """
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            self._remove(entry.path)
+            total -= size
+
+    def _entries(self):
+        try:
+            with os.scandir(self.directory) as it:
+                return [entry for entry in it if entry.is_file() and entry.name.endswith('.pdf')]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def get_report_cache():
+    """
+    Report cache configured from settings.
+    """
+    return ReportCache(
+        directory=settings.EQUIPMENT_REPORT_CACHE_DIR,
+        max_bytes=settings.EQUIPMENT_REPORT_CACHE_MAX_BYTES
+    )
+
+
+def get_report_path(dataset):
+    """
+    Returns the path of the dataset's rendered report, rendering and
+    caching it first if needed.
+
+    Raises:
+        ReportQueueFull: if the report must be rendered and the render
+            queue is full
+    """
+    cache = get_report_cache()
+    context = report_context(dataset)
+    key = report_cache_key(context)
+
+    with span('report_cache'):
+        path = cache.get(key)
+    if path is not None:
+        REPORT_CACHE_HITS.inc()
+        return path
+
+    REPORT_CACHE_MISSES.inc()
+    pdf = get_report_renderer().render(key, context)
+    with span('report_cache'):
+        return cache.put(key, pdf)
+
+
+def prerender_report(dataset_id):
+    """
+    Renders a freshly uploaded dataset's report into the cache so the
+    first download is a file read.
+    """
+    from .models import Dataset
+
+    try:
+        dataset = Dataset.objects.get(id=dataset_id)
+    except Dataset.DoesNotExist:
+        return
+    get_report_path(dataset)
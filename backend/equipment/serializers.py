@@ -1,16 +1,24 @@
 from rest_framework import serializers
-from .models import Dataset
+from rest_framework.reverse import reverse
+from .anomalies import flagged_methods
+from .models import Dataset, EquipmentRecord, IngestJob, UploadSession
 
 
 class DatasetSerializer(serializers.ModelSerializer):
     """
     Serializer for Dataset model.
+    Rows are read from EquipmentRecord in upload order.
     """
+    raw_data = serializers.SerializerMethodField()
+
     class Meta:
         model = Dataset
         fields = ['id', 'uploaded_at', 'file_name', 'summary', 'raw_data']
         read_only_fields = ['id', 'uploaded_at']
 
+    def get_raw_data(self, obj):
+        return list(EquipmentRecord.rows(obj.records.order_by('row_index')))
+
 
 class DatasetSummarySerializer(serializers.ModelSerializer):
     """
@@ -22,6 +30,98 @@ class DatasetSummarySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'uploaded_at']
 
 
+class UploadedDatasetSerializer(DatasetSummarySerializer):
+    """
+    Dataset summary for upload and append responses, with a link to the
+    paginated rows instead of the rows themselves.
+    """
+    rows = serializers.SerializerMethodField()
+
+    class Meta(DatasetSummarySerializer.Meta):
+        fields = DatasetSummarySerializer.Meta.fields + ['rows']
+
+    def get_rows(self, obj):
+        return reverse('get_dataset_rows', kwargs={'dataset_id': obj.pk}, request=self.context.get('request'))
+
+
+class EquipmentRecordSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer rendering a record as a CSV-style row.
+    """
+    def to_representation(self, instance):
+        return {
+            'row_index': instance.row_index,
+            'Equipment Name': instance.name,
+            'Type': instance.type,
+            'Flowrate': instance.flowrate,
+            'Pressure': instance.pressure,
+            'Temperature': instance.temperature,
+        }
+
+
+class AnomalySerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer for a flagged value and the row it belongs to.
+    Expects the rows' (name, type) by row index in context['records'].
+    """
+    def to_representation(self, instance):
+        name, equipment_type = self.context['records'].get(instance.row_index, (None, None))
+        return {
+            'row_index': instance.row_index,
+            'Equipment Name': name,
+            'Type': equipment_type,
+            'column': instance.column,
+            'value': instance.value,
+            'z_score': instance.z_score,
+            'iqr_score': instance.iqr_score,
+            'mad_score': instance.mad_score,
+            'methods': flagged_methods(instance),
+        }
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for background ingestion job status.
+    """
+    class Meta:
+        model = IngestJob
+        fields = ['id', 'file_name', 'status', 'stage', 'progress', 'rows_processed',
+                  'timings', 'dataset', 'error', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        from .jobs import get_live_progress
+
+        data = super().to_representation(instance)
+        live = get_live_progress(instance.pk)
+        if live is not None and instance.status == IngestJob.STATUS_RUNNING:
+            data['rows_processed'], data['progress'] = live
+        return data
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a chunked upload, including which bytes have arrived.
+    """
+    chunk_count = serializers.IntegerField(read_only=True)
+    received_ranges = serializers.SerializerMethodField()
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'file_name', 'total_size', 'chunk_size', 'chunk_count', 'status',
+                  'received_ranges', 'missing_chunks', 'job', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+    def get_received_ranges(self, obj):
+        from .chunked import received_ranges
+        return received_ranges(obj)
+
+    def get_missing_chunks(self, obj):
+        from .chunked import missing_chunks
+        return missing_chunks(obj)
+
+
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
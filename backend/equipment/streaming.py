@@ -0,0 +1,211 @@
+"""
+Streaming HTTP responses for reports, exports and dataset rows.
+Files and rows are sent in fixed-size blocks instead of being buffered whole.
+"""
+import csv
+import os
+import re
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+from .async_api import is_asgi
+from .models import EquipmentRecord
+from .renderers import orjson_dumps
+
+
+# Bytes read per block when streaming a byte range
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Rows fetched per database round trip when exporting
+EXPORT_FETCH_SIZE = 2000
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range_header(header, size):
+    """
+    Parses a single-range ``Range`` header against a file size.
+
+    Returns:
+        tuple: (start, end) inclusive byte offsets, None to send the whole
+        file (no header, or a form we do not serve such as multiple
+        ranges), or False if the range cannot be satisfied
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _iter_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+async def aiter_sync(iterator, batch_size=1):
+    """
+    A synchronous iterator as an async iterator, for streaming under
+    ASGI (which buffers synchronous iterators whole). Items are taken
+    ``batch_size`` at a time in an executor thread and each batch is
+    yielded joined into one chunk.
+    """
+    while True:
+        parts = await sync_to_async(list)(islice(iterator, batch_size))
+        if not parts:
+            break
+        yield parts[0][:0].join(parts)
+
+
+def if_range_matches(request, etag):
+    """
+    True unless an ``If-Range`` header names another version than
+    ``etag``. Only strong ETags are compared (RFC 9110); a date, or any
+    value when the file has no ETag, never matches.
+    """
+    header = request.META.get('HTTP_IF_RANGE')
+    if not header:
+        return True
+    return etag is not None and header.strip() == etag
+
+
+def ranged_file_response(request, path, filename, content_type, etag=None):
+    """
+    Streams a file as an attachment, honouring a single-range ``Range``
+    header with ``206 Partial Content``.
+    When an ``If-Range`` header does not match ``etag``, the client's
+    partial copy is of another version and the whole file is sent.
+    Under ASGI the file is read block by block in an executor thread.
+    """
+    size = os.path.getsize(path)
+    byte_range = None
+    if if_range_matches(request, etag):
+        byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None and not is_asgi(request):
+        response = FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type
+        )
+        response.block_size = STREAM_BLOCK_SIZE
+    else:
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+        blocks = _iter_file_range(path, start, length)
+        response = StreamingHttpResponse(
+            aiter_sync(blocks) if is_asgi(request) else blocks,
+            status=206 if byte_range else 200,
+            content_type=content_type
+        )
+        response['Content-Length'] = str(length)
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    response['Accept-Ranges'] = 'bytes'
+    if etag is not None:
+        response['ETag'] = etag
+    return response
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the value straight back, so
+    csv.writer can produce lines for a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_records_csv(queryset):
+    """
+    Yields a CSV export of an EquipmentRecord queryset line by line,
+    fetching rows from a server-side cursor.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(list(EquipmentRecord.CSV_FIELDS.keys()))
+    rows = queryset.values_list(*EquipmentRecord.CSV_FIELDS.values()).iterator(chunk_size=EXPORT_FETCH_SIZE)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _dataset_json_head(head):
+    return orjson_dumps(head)[:-1] + (b',"raw_data":[' if head else b'"raw_data":[')
+
+
+def iter_dataset_json(head, queryset, batch_size=EXPORT_FETCH_SIZE):
+    """
+    Yields a dataset as a JSON object: the ``head`` fields followed by a
+    ``raw_data`` array of the queryset's rows. Rows are fetched from a
+    server-side cursor and encoded ``batch_size`` at a time, so memory
+    use does not grow with the dataset and the head is sent at once.
+    """
+    yield _dataset_json_head(head)
+    keys = list(EquipmentRecord.CSV_FIELDS.keys())
+    rows = queryset.values_list(*EquipmentRecord.CSV_FIELDS.values()).iterator(chunk_size=batch_size)
+    batch = []
+    separator = b''
+    for row in rows:
+        batch.append(dict(zip(keys, row)))
+        if len(batch) >= batch_size:
+            yield separator + orjson_dumps(batch)[1:-1]
+            separator = b','
+            batch = []
+    if batch:
+        yield separator + orjson_dumps(batch)[1:-1]
+    yield b']}'
+
+
+def _encode_next_rows(rows, keys, count):
+    batch = [dict(zip(keys, row)) for row in islice(rows, count)]
+    return orjson_dumps(batch)[1:-1] if batch else None
+
+
+async def aiter_dataset_json(head, queryset, batch_size=EXPORT_FETCH_SIZE):
+    """
+    iter_dataset_json() as an async iterator, for streaming under ASGI
+    (which buffers synchronous iterators whole). Each batch is fetched
+    and encoded in an executor thread. Not built on QuerySet.aiterator(),
+    which runs values_list() queries on the event loop in Django 4.2.
+    """
+    yield _dataset_json_head(head)
+    keys = list(EquipmentRecord.CSV_FIELDS.keys())
+    rows = queryset.values_list(*EquipmentRecord.CSV_FIELDS.values()).iterator(chunk_size=batch_size)
+    separator = b''
+    while True:
+        encoded = await sync_to_async(_encode_next_rows)(rows, keys, batch_size)
+        if encoded is None:
+            break
+        yield separator + encoded
+        separator = b','
+    yield b']}'
@@ -0,0 +1,98 @@
+"""
+Reproducible synthetic equipment CSVs for benchmarks.
+The same arguments always produce the same bytes, from a thousand rows
+up to tens of millions (written to disk in blocks of bounded size).
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+
+EQUIPMENT_TYPES = ('Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser')
+
+# Rows generated and written per block by write_synthetic_csv
+BLOCK_ROWS = 500000
+
+# Non-numeric values injected into invalid rows
+INVALID_VALUES = ('n/a', 'ERR', '', '--')
+
+
+def type_names(count):
+    """
+    ``count`` equipment type names; the real ones first, then numbered
+    variants (``Pump-2``, ...) for higher cardinalities.
+    """
+    names = list(EQUIPMENT_TYPES[:count])
+    variant = 2
+    while len(names) < count:
+        names.extend(f'{name}-{variant}' for name in EQUIPMENT_TYPES[:count - len(names)])
+        variant += 1
+    return names
+
+
+def _block(rng, start, rows, types, invalid_fraction):
+    kinds = np.array(types, dtype=object)[rng.integers(0, len(types), rows)]
+    frame = pd.DataFrame({
+        'Equipment Name': kinds + '-' + np.arange(start + 1, start + rows + 1).astype(str).astype(object),
+        'Type': kinds,
+        'Flowrate': rng.normal(120, 30, rows).round(1),
+        'Pressure': rng.normal(6, 1.5, rows).round(2),
+        'Temperature': rng.normal(115, 20, rows).round(1),
+    })
+    if invalid_fraction:
+        invalid = np.flatnonzero(rng.random(rows) < invalid_fraction)
+        if invalid.size:
+            columns = np.array(['Flowrate', 'Pressure', 'Temperature'])[rng.integers(0, 3, invalid.size)]
+            values = np.array(INVALID_VALUES, dtype=object)[rng.integers(0, len(INVALID_VALUES), invalid.size)]
+            for column in ('Flowrate', 'Pressure', 'Temperature'):
+                frame[column] = frame[column].astype(object)
+                hit = columns == column
+                frame.loc[invalid[hit], column] = values[hit]
+    return frame
+
+
+def iter_synthetic_frames(rows, seed=0, types=len(EQUIPMENT_TYPES), invalid_fraction=0.0, block_rows=BLOCK_ROWS):
+    """
+    Yields DataFrames of at most ``block_rows`` synthetic equipment
+    readings in the upload column layout, ``rows`` in total.
+
+    Args:
+        types: number of distinct equipment types
+        invalid_fraction: share of rows given a non-numeric reading
+    """
+    rng = np.random.default_rng(seed)
+    names = type_names(types)
+    # An empty file still gets one (empty) block, for its header
+    for start in range(0, max(rows, 1), block_rows):
+        yield _block(rng, start, min(block_rows, rows - start), names, invalid_fraction)
+
+
+def synthetic_frame(rows, seed=0, types=len(EQUIPMENT_TYPES), invalid_fraction=0.0):
+    """
+    DataFrame of ``rows`` synthetic equipment readings.
+    """
+    return pd.concat(iter_synthetic_frames(rows, seed, types, invalid_fraction), ignore_index=True)
+
+
+def write_synthetic_csv(file, rows, seed=0, types=len(EQUIPMENT_TYPES), invalid_fraction=0.0):
+    """
+    Writes a synthetic CSV to a path or text file object block by block,
+    so memory use does not grow with ``rows``.
+    """
+    if isinstance(file, str):
+        with open(file, 'w', newline='') as f:
+            return write_synthetic_csv(f, rows, seed, types, invalid_fraction)
+    header = True
+    for frame in iter_synthetic_frames(rows, seed, types, invalid_fraction):
+        frame.to_csv(file, header=header, index=False)
+        header = False
+
+
+def synthetic_csv(rows, seed=0, types=len(EQUIPMENT_TYPES), invalid_fraction=0.0):
+    """
+    Encoded CSV file of ``rows`` synthetic equipment readings.
+    """
+    buffer = io.StringIO()
+    write_synthetic_csv(buffer, rows, seed, types, invalid_fraction)
+    return buffer.getvalue().encode('utf-8')
@@ -1,8 +1,40 @@
-from django.test import TestCase
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework.test import APIClient
-from .models import Dataset
+from rest_framework.throttling import BaseThrottle
+from .models import Dataset, EquipmentRecord
+from .utils import process_csv, accumulate_records, CSVValidationError, SummaryAccumulator
+from .stats import Moments, TDigest, Histogram, Grouping, grouped_moments, median_absolute_deviation
+from .renderers import ORJSONRenderer
+from .streaming import iter_dataset_json
+from .cache import get_cache, invalidate_user_cache
+from .apps import enable_sqlite_wal
+from .anomalies import AnomalySpool, anomaly_thresholds, detect_anomalies
+from .ingest import ingest_csv
+from .synthetic import synthetic_csv, type_names
+from .downsampling import downsample
+from .management.commands.loadtest import summarize, parse_mix
+from .management.commands.benchanalytics import compare, parse_scales
+from . import events, metrics, reports, views
+import asyncio
+import datetime
+import hashlib
 import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+import msgpack
+import numpy as np
+import pandas as pd
 
 
 class EquipmentAPITestCase(TestCase):
@@ -20,3 +52,1589 @@ class EquipmentAPITestCase(TestCase):
     def test_upload_requires_auth(self):
         response = self.client.post('/api/upload/')
         self.assertEqual(response.status_code, 403)
+
+
+SAMPLE_CSV = (
+    "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+    "Pump-1,Pump,120,5.2,110\n"
+    "Compressor-1,Compressor,95,8.4,95\n"
+    "Valve-1,Valve,60,4.1,105\n"
+    "Pump-2,Pump,132.5,5.6,118\n"
+    "HeatExchanger-1,HeatExchanger,150,6.2,130\n"
+)
+
+
+def make_csv(content=SAMPLE_CSV, name='equipment.csv'):
+    csv_file = io.BytesIO(content.encode('utf-8'))
+    csv_file.name = name
+    return csv_file
+
+
+def read_json(response):
+    """
+    Decodes a JSON response, streamed or not.
+    """
+    if response.streaming:
+        return json.loads(b''.join(response.streaming_content))
+    return response.json()
+
+
+class CSVPipelineTestCase(TestCase):
+    def test_chunked_summary_matches_whole_file(self):
+        whole = process_csv(make_csv(), chunksize=1000)
+        chunked = process_csv(make_csv(), chunksize=2)
+        # Merged moments may differ from a single pass in the last bit
+        for col, described in whole.pop('statistics').items():
+            for key, value in described.items():
+                self.assertAlmostEqual(value, chunked['statistics'][col][key])
+        chunked.pop('statistics')
+        self.assertEqual(whole, chunked)
+        self.assertEqual(whole['total_equipment'], 5)
+        self.assertAlmostEqual(whole['average_flowrate'], 111.5)
+        self.assertEqual(whole['max_temperature'], 130.0)
+        self.assertEqual(list(whole['type_distribution'].items())[0], ('Pump', 2))
+
+    def test_records_emitted_per_chunk(self):
+        batches = []
+        process_csv(make_csv(), on_records=batches.append, chunksize=2)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[0][0]['Equipment Name'], 'Pump-1')
+
+    def test_missing_columns_rejected(self):
+        with self.assertRaisesMessage(CSVValidationError, 'Missing required columns: Temperature'):
+            process_csv(make_csv("Equipment Name,Type,Flowrate,Pressure\nP,Pump,1,2\n"))
+
+    def test_non_numeric_values_rejected_in_later_chunk(self):
+        content = SAMPLE_CSV + "Bad-1,Pump,fast,5.0,100\n"
+        with self.assertRaisesMessage(CSVValidationError, "Column 'Flowrate' must contain only numeric values"):
+            process_csv(make_csv(content), chunksize=2)
+
+    def test_infinite_values_rejected(self):
+        for value in ('inf', '-inf'):
+            with self.assertRaisesMessage(CSVValidationError, "Column 'Pressure' must contain only finite numeric values"):
+                process_csv(make_csv(SAMPLE_CSV + f"Bad-1,Pump,10,{value},100\n"), chunksize=2)
+
+    def test_huge_values_rejected(self):
+        # Finite, but their spread and squares overflow
+        content = SAMPLE_CSV + "Big-1,Pump,1e308,5.0,100\nBig-2,Pump,-1e308,5.0,100\n"
+        with self.assertRaisesMessage(CSVValidationError, "Column 'Flowrate' must contain values between -1e+100 and 1e+100"):
+            process_csv(make_csv(content))
+        self.assertEqual(process_csv(make_csv(SAMPLE_CSV + "Big-1,Pump,1e100,5.0,100\n"))['max_flowrate'], 1e100)
+
+    def test_blank_types_match_baseline_summary(self):
+        content = SAMPLE_CSV + "Spare-1,,100,5.0,90\nSpare-2,,110,6.0,95\n"
+        # What the original whole-file analyze_csv() reported
+        df = pd.read_csv(make_csv(content))
+        summary = process_csv(make_csv(content), chunksize=3)
+        self.assertEqual(summary['total_equipment'], 7)
+        self.assertEqual(summary['type_distribution'], df['Type'].value_counts().to_dict())
+        self.assertNotIn('nan', summary['type_statistics'])
+        for col in ('Flowrate', 'Pressure', 'Temperature'):
+            self.assertAlmostEqual(summary[f'average_{col.lower()}'], float(df[col].mean()))
+            self.assertEqual(summary[f'max_{col.lower()}'], float(df[col].max()))
+
+        user = User.objects.create_user(username='blanktypes', password='testpass123')
+        dataset = ingest_csv(user, make_csv(content), 'blank.csv')
+        self.assertEqual(dataset.records.filter(type='').count(), 2)
+        # Rebuilding from the stored rows gives the same Types
+        rebuilt = accumulate_records(dataset.records.all()).to_summary()
+        self.assertEqual(rebuilt['type_distribution'], summary['type_distribution'])
+
+    def test_header_only_file_rejected(self):
+        with self.assertRaises(CSVValidationError):
+            process_csv(make_csv("Equipment Name,Type,Flowrate,Pressure,Temperature\n"))
+
+
+class StatisticsTestCase(TestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(7).normal(100, 15, 20000)
+
+    def test_summary_statistics(self):
+        summary = process_csv(make_csv(), chunksize=2)
+        flowrate = summary['statistics']['Flowrate']
+        self.assertAlmostEqual(flowrate['std'], np.std([120, 95, 60, 132.5, 150], ddof=1))
+        self.assertEqual(flowrate['median'], 120.0)
+        self.assertEqual(flowrate['p25'], 95.0)
+        pump = summary['type_statistics']['Pump']
+        self.assertEqual(pump['count'], 2)
+        self.assertAlmostEqual(pump['Flowrate']['mean'], 126.25)
+        self.assertEqual(pump['Temperature']['max'], 118.0)
+        self.assertEqual(sum(summary['histograms']['Pressure']['counts']), 5)
+
+    def test_moments_merge_matches_numpy(self):
+        moments = Moments()
+        for chunk in np.array_split(self.values, 7):
+            moments.merge(Moments.of(chunk))
+        self.assertEqual(moments.count, 20000)
+        self.assertAlmostEqual(moments.mean, self.values.mean())
+        self.assertAlmostEqual(moments.variance, self.values.var(ddof=1), places=6)
+
+    def test_grouped_moments(self):
+        groups = grouped_moments(Grouping(['b', 'a', 'b', 'a', 'b']), np.array([1.0, 10.0, 3.0, 20.0, 5.0]))
+        self.assertEqual((groups['a'].count, groups['a'].mean, groups['a'].max), (2, 15.0, 20.0))
+        self.assertEqual((groups['b'].count, groups['b'].min, groups['b'].variance), (3, 1.0, 4.0))
+
+    def test_digest_quantiles_are_close(self):
+        digest = TDigest()
+        for chunk in np.array_split(self.values, 10):
+            digest.update(chunk)
+        self.assertLessEqual(digest.means.size, 201)
+        self.assertEqual(digest.count, 20000)
+        expected = np.quantile(self.values, [0.05, 0.5, 0.95])
+        for estimate, exact in zip(digest.quantiles([0.05, 0.5, 0.95]), expected):
+            self.assertAlmostEqual(estimate, exact, delta=0.5)
+
+        restored = TDigest.from_dict(json.loads(json.dumps(digest.to_dict())))
+        self.assertEqual(restored.quantile(0.5), digest.quantile(0.5))
+
+    def test_digest_mad_is_close(self):
+        digest = TDigest()
+        for chunk in np.array_split(self.values, 10):
+            digest.update(chunk)
+        median, mad = median_absolute_deviation(digest)
+        exact = np.median(np.abs(self.values - np.median(self.values)))
+        self.assertAlmostEqual(mad, exact, delta=0.3)
+        self.assertEqual(median_absolute_deviation(TDigest().update([1.0, 2.0, 4.0, 10.0])), (3.0, 1.5))
+        self.assertEqual(median_absolute_deviation(TDigest()), (None, None))
+
+    def test_histogram_doubles_and_merges(self):
+        histogram = Histogram()
+        for chunk in np.array_split(np.sort(self.values), 4):
+            histogram.update(chunk)
+        self.assertLessEqual(len(histogram.counts), 32)
+        self.assertEqual(histogram.counts.sum(), 20000)
+        data = histogram.to_dict()
+        self.assertLessEqual(data['start'], self.values.min())
+        self.assertGreater(data['start'] + data['bin_width'] * len(data['counts']), self.values.max())
+
+        left, right = Histogram().update(self.values[:10000]), Histogram().update(self.values[10000:] + 500)
+        left.merge(right)
+        self.assertEqual(left.counts.sum(), 20000)
+        self.assertLessEqual(len(left.counts), 32)
+        self.assertEqual(Histogram.from_dict(left.to_dict()).to_dict(), left.to_dict())
+
+
+OTHER_CSV = (
+    "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+    "Reactor-1,Reactor,80,12.5,180\n"
+    "Pump-3,Pump,110,5.0,100\n"
+    "Valve-2,Valve,55,3.9,98\n"
+)
+
+
+class AggregateTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='aggregate', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.first = self.upload(SAMPLE_CSV)
+        self.second = self.upload(OTHER_CSV)
+
+    def upload(self, content):
+        response = self.client.post('/api/upload/', {'file': make_csv(content)}, format='multipart')
+        return response.data['id']
+
+    def test_sketches_reproduce_summary(self):
+        dataset = Dataset.objects.get(id=self.first)
+        self.assertEqual(dataset.sketches['count'], 5)
+        summary = SummaryAccumulator.from_sketches(dataset.sketches).to_summary()
+        self.assertEqual(summary, dataset.summary)
+
+    def test_aggregate_matches_combined_file(self):
+        response = self.client.get('/api/aggregate/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['datasets'], [self.first, self.second])
+        combined = process_csv(make_csv(SAMPLE_CSV + OTHER_CSV.split('\n', 1)[1]))
+        summary = response.data['summary']
+        self.assertEqual(summary['total_equipment'], 8)
+        self.assertEqual(summary['type_distribution'], combined['type_distribution'])
+        self.assertEqual(summary['type_statistics']['Pump']['count'], 3)
+        self.assertEqual(summary['histograms'], combined['histograms'])
+        for key in ('mean', 'std', 'min', 'max', 'median', 'p25'):
+            self.assertAlmostEqual(summary['statistics']['Pressure'][key], combined['statistics']['Pressure'][key])
+
+    def test_aggregate_selected_datasets(self):
+        response = self.client.get(f'/api/aggregate/?datasets={self.second}')
+        self.assertEqual(response.data['summary']['total_equipment'], 3)
+        etag = response['ETag']
+        response = self.client.get(f'/api/aggregate/?datasets={self.second}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get('/api/aggregate/?datasets=abc').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/aggregate/?datasets={self.first},999').status_code, 404)
+        other = User.objects.create_user(username='outsider', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f'/api/aggregate/?datasets={self.first}').status_code, 404)
+        self.assertEqual(self.client.get('/api/aggregate/').status_code, 404)
+
+
+class UploadTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='uploader', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_upload_creates_dataset(self):
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary']['total_equipment'], 5)
+        self.assertNotIn('raw_data', response.data)
+        self.assertEqual(response.data['rows'], f"http://testserver/api/dataset/{response.data['id']}/rows/")
+        self.assertEqual(len(self.client.get(response.data['rows']).data['results']), 5)
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 1)
+
+    def test_upload_invalid_csv_returns_400(self):
+        response = self.client.post(
+            '/api/upload/',
+            {'file': make_csv("Name,Type\nA,Pump\n")},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Missing required columns', response.data['error'])
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_upload_infinite_value_returns_400(self):
+        response = self.client.post(
+            '/api/upload/', {'file': make_csv(SAMPLE_CSV + "Bad-1,Pump,inf,5.0,100\n")}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('finite', response.data['error'])
+        self.assertFalse(Dataset.all_objects.exists())
+
+    def test_upload_huge_values_return_400(self):
+        content = SAMPLE_CSV + "Big-1,Pump,1e308,5.0,100\nBig-2,Pump,-1e308,5.0,100\n"
+        response = self.client.post('/api/upload/', {'file': make_csv(content)}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('between', response.data['error'])
+        self.assertFalse(Dataset.all_objects.exists())
+
+    def test_failed_upload_leaves_nothing_behind(self):
+        with mock.patch('equipment.ingest.store_anomalies', side_effect=RuntimeError('disk full')):
+            response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Dataset.all_objects.exists())
+        self.assertFalse(EquipmentRecord.objects.exists())
+
+    def test_dataset_is_hidden_until_processed(self):
+        seen = []
+        with mock.patch('equipment.ingest.store_anomalies',
+                        side_effect=lambda *args: seen.append((Dataset.objects.exists(), Dataset.all_objects.exists()))):
+            self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.assertEqual(seen, [(False, True)])
+        self.assertEqual(Dataset.objects.get().status, Dataset.STATUS_READY)
+
+    def test_interrupted_upload_is_removed(self):
+        stale = Dataset.all_objects.create(
+            user=self.user, file_name='crashed.csv', summary={}, status=Dataset.STATUS_PROCESSING,
+            status_changed_at=timezone.now() - datetime.timedelta(days=1)
+        )
+        EquipmentRecord.objects.create(dataset=stale, row_index=0, name='A', type='Pump',
+                                       flowrate=1, pressure=1, temperature=1)
+        self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.assertEqual(list(Dataset.all_objects.values_list('file_name', flat=True)), ['equipment.csv'])
+        self.assertEqual(EquipmentRecord.objects.count(), 5)
+
+    def test_sqlite_wal_is_opt_in(self):
+        connection = mock.MagicMock(vendor='sqlite')
+        enable_sqlite_wal(None, connection)
+        connection.cursor.assert_not_called()
+        with override_settings(EQUIPMENT_SQLITE_WAL=True):
+            enable_sqlite_wal(None, connection)
+        connection.cursor.return_value.__enter__.return_value.execute.assert_called_once_with('PRAGMA journal_mode=WAL;')
+
+
+class EquipmentRecordTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='records', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, content=SAMPLE_CSV):
+        return self.client.post('/api/upload/', {'file': make_csv(content)}, format='multipart')
+
+    def test_upload_stores_normalized_records(self):
+        dataset_id = self.upload().data['id']
+        records = EquipmentRecord.objects.filter(dataset_id=dataset_id)
+        self.assertEqual(list(records.values_list('row_index', flat=True)), [0, 1, 2, 3, 4])
+        pump = records.get(row_index=3)
+        self.assertEqual((pump.name, pump.type, pump.flowrate), ('Pump-2', 'Pump', 132.5))
+
+    def test_dataset_endpoint_reads_records(self):
+        dataset_id = self.upload().data['id']
+        response = self.client.get(f'/api/dataset/{dataset_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_json(response)['raw_data'][0], {
+            'Equipment Name': 'Pump-1', 'Type': 'Pump',
+            'Flowrate': 120.0, 'Pressure': 5.2, 'Temperature': 110.0,
+        })
+
+    def test_failed_upload_leaves_no_records(self):
+        response = self.upload(SAMPLE_CSV + "Bad-1,Pump,x,1,1\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(EquipmentRecord.objects.exists())
+
+    def test_retention_removes_old_records(self):
+        for i in range(6):
+            self.upload(SAMPLE_CSV.replace('Pump-1,', f'Pump-{i + 10},'))
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(EquipmentRecord.objects.count(), 25)
+
+
+class DatasetRowsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='rows', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.dataset_id = response.data['id']
+
+    def test_rows_are_cursor_paginated_in_row_order(self):
+        url = f'/api/dataset/{self.dataset_id}/rows/?page_size=2'
+        names = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            names.extend(row['Equipment Name'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(names, ['Pump-1', 'Compressor-1', 'Valve-1', 'Pump-2', 'HeatExchanger-1'])
+
+    def test_rows_of_other_users_dataset_not_found(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(f'/api/dataset/{self.dataset_id}/rows/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_summary_only(self):
+        response = self.client.get('/api/summary/?summary_only=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('raw_data', response.data)
+        self.assertEqual(response.data['summary']['total_equipment'], 5)
+
+        response = self.client.get(f'/api/dataset/{self.dataset_id}/?summary_only=1')
+        self.assertNotIn('raw_data', response.data)
+
+        response = self.client.get(f'/api/dataset/{self.dataset_id}/')
+        self.assertEqual(len(read_json(response)['raw_data']), 5)
+
+
+class DatasetQueryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='query', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.url = f"/api/dataset/{response.data['id']}/rows/"
+
+    def names(self, query):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return [row['Equipment Name'] for row in response.data['results']]
+
+    def test_filter_by_type(self):
+        self.assertEqual(self.names('?type=Pump'), ['Pump-1', 'Pump-2'])
+        self.assertEqual(self.names('?type=Pump,Valve'), ['Pump-1', 'Valve-1', 'Pump-2'])
+
+    def test_filter_by_numeric_range(self):
+        self.assertEqual(self.names('?flowrate_min=100&temperature_max=120'), ['Pump-1', 'Pump-2'])
+
+    def test_filter_by_name_prefix(self):
+        self.assertEqual(self.names('?name_prefix=Pump-'), ['Pump-1', 'Pump-2'])
+        self.assertEqual(self.names('?name_prefix=pump'), [])
+
+    def test_multi_column_sort_is_paginated(self):
+        url = self.url + '?ordering=type,-flowrate&page_size=2'
+        names = []
+        while url:
+            response = self.client.get(url)
+            names.extend(row['Equipment Name'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(names, ['Compressor-1', 'HeatExchanger-1', 'Pump-2', 'Pump-1', 'Valve-1'])
+
+    def test_sort_with_many_ties_returns_every_row_once(self):
+        rows = ["Equipment Name,Type,Flowrate,Pressure,Temperature"]
+        rows += [f"Unit-{i},{'Pump' if i % 2 else 'Valve'},{i % 3},5,100" for i in range(5000)]
+        dataset_id = self.client.post('/api/upload/', {'file': make_csv("\n".join(rows) + "\n")},
+                                      format='multipart').data['id']
+        url = f'/api/dataset/{dataset_id}/rows/?ordering=-type,flowrate&page_size=300'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data['next']
+        names = [row['Equipment Name'] for page in pages for row in page['results']]
+        self.assertEqual(len(pages), 17)
+        self.assertEqual(len(names), 5000)
+        self.assertEqual(len(set(names)), 5000)
+        keys = [(row['Type'], row['Flowrate']) for page in pages for row in page['results']]
+        self.assertEqual(keys, sorted(keys, key=lambda key: (-ord(key[0][0]), key[1])))
+
+        # previous walks back to the same page
+        previous = self.client.get(pages[9]['previous']).data
+        self.assertEqual(previous['results'], pages[8]['results'])
+        self.assertEqual(self.client.get(f'/api/dataset/{dataset_id}/rows/?cursor=bm9wZQ').status_code, 404)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url + '?ordering=color').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?pressure_min=high').status_code, 400)
+
+
+@override_settings(EQUIPMENT_JOBS_SYNC=True, EQUIPMENT_SPOOL_DIR=tempfile.gettempdir())
+class IngestJobTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='jobs', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_async_upload_returns_job(self):
+        response = self.client.post('/api/upload/?async=true', {'file': make_csv()}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['progress'], 1.0)
+        self.assertEqual(job['rows_processed'], 5)
+        self.assertTrue({'spool', 'queue_wait', 'analyze', 'store', 'retention', 'total'} <= set(job['timings']))
+        dataset = Dataset.objects.get(id=job['dataset'])
+        self.assertEqual(dataset.records.count(), 5)
+
+    def test_failed_job_reports_error(self):
+        response = self.client.post(
+            '/api/upload/?async=true',
+            {'file': make_csv("Name,Type\nA,Pump\n")},
+            format='multipart'
+        )
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('Missing required columns', job['error'])
+        self.assertIsNone(job['dataset'])
+
+    def test_job_of_other_user_not_found(self):
+        response = self.client.post('/api/upload/?async=true', {'file': make_csv()}, format='multipart')
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f"/api/jobs/{response.data['id']}/").status_code, 404)
+
+
+class ReportCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.settings_override = override_settings(
+            EQUIPMENT_REPORT_CACHE_DIR=self.cache_dir,
+            EQUIPMENT_REPORT_WORKERS=0,
+            EQUIPMENT_REPORT_QUEUE_DEPTH=0
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='reports', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.dataset_id = response.data['id']
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_report_rendered_once_and_served_from_cache(self):
+        with mock.patch('equipment.reports.build_report_pdf', wraps=reports.build_report_pdf) as build:
+            first = self.download(f'/api/report/{self.dataset_id}/')
+            second = self.download('/api/report/')
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(b'%PDF'))
+
+    def test_cache_key_tracks_report_inputs_and_template(self):
+        context = reports.report_context(Dataset.objects.get(id=self.dataset_id))
+        key = reports.report_cache_key(context)
+        self.assertTrue(key.startswith(f'{self.dataset_id}-'))
+        self.assertEqual(reports.report_cache_key(dict(context)), key)
+        for changed in (
+            dict(context, summary=dict(context['summary'], total_equipment=6)),
+            dict(context, file_name='renamed.csv'),
+            dict(context, uploaded_at=context['uploaded_at'] + datetime.timedelta(seconds=1)),
+            dict(context, revision=context['revision'] + 1),
+        ):
+            self.assertNotEqual(reports.report_cache_key(changed), key)
+        with mock.patch('equipment.reports.REPORT_TEMPLATE_VERSION', 999):
+            self.assertNotEqual(reports.report_cache_key(context), key)
+
+    def test_lru_eviction_by_size(self):
+        cache = reports.ReportCache(self.cache_dir, max_bytes=250)
+        cache.put('1-a.pdf', b'x' * 100)
+        cache.put('2-b.pdf', b'x' * 100)
+        os.utime(cache.path_for('1-a.pdf'), (0, 0))
+        os.utime(cache.path_for('2-b.pdf'), (1, 1))
+        cache.get('1-a.pdf')  # Refreshes 1-a, leaving 2-b least recently used
+        cache.put('3-c.pdf', b'x' * 100)
+        self.assertIsNotNone(cache.get('1-a.pdf'))
+        self.assertIsNone(cache.get('2-b.pdf'))
+        self.assertIsNotNone(cache.get('3-c.pdf'))
+
+    def test_retention_invalidates_cached_reports(self):
+        self.download(f'/api/report/{self.dataset_id}/')
+        self.assertTrue(any(name.startswith(f'{self.dataset_id}-') for name in os.listdir(self.cache_dir)))
+        for i in range(5):
+            self.client.post('/api/upload/', {'file': make_csv(OTHER_CSV + f"Extra-{i},Pump,1,1,1\n")}, format='multipart')
+        self.assertFalse(any(name.startswith(f'{self.dataset_id}-') for name in os.listdir(self.cache_dir)))
+
+    @override_settings(EQUIPMENT_REPORT_PRERENDER=True, EQUIPMENT_JOBS_SYNC=True)
+    def test_report_prerendered_after_upload(self):
+        response = self.client.post('/api/upload/', {'file': make_csv(OTHER_CSV)}, format='multipart')
+        dataset_id = response.data['id']
+        self.assertTrue(any(name.startswith(f'{dataset_id}-') for name in os.listdir(self.cache_dir)))
+
+    def test_full_render_queue_returns_503(self):
+        renderer = reports.get_report_renderer()
+        renderer._acquire()  # Occupy the only render slot
+        try:
+            rejected = metrics.REPORT_REJECTED.value
+            response = self.client.get(f'/api/report/{self.dataset_id}/')
+        finally:
+            renderer._release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(metrics.REPORT_REJECTED.value, rejected + 1)
+        self.assertEqual(self.client.get(f'/api/report/{self.dataset_id}/').status_code, 200)
+
+    def test_process_pool_render(self):
+        renderer = reports.ReportRenderer(workers=1, queue_depth=0)
+        self.addCleanup(lambda: renderer._pool and renderer._pool.shutdown())
+        context = reports.report_context(Dataset.objects.get(id=self.dataset_id))
+        renders = metrics.REPORT_RENDER_TIME.snapshot()[1]
+
+        pdf = renderer.render('key', context)
+
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(metrics.REPORT_RENDER_TIME.snapshot()[1], renders + 1)
+        self.assertEqual(metrics.REPORT_IN_FLIGHT.value, 0)
+
+    def test_report_streamed_with_content_length(self):
+        response = self.client.get(f'/api/report/{self.dataset_id}/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(body))
+
+    def test_report_range_requests(self):
+        full = self.download(f'/api/report/{self.dataset_id}/')
+        url = f'/api/report/{self.dataset_id}/'
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[10:20])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), full[-5:])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range_resumes_only_the_same_version(self):
+        url = f'/api/report/{self.dataset_id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_RANGE='bytes=10-', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        # The dataset grew since the partial download: send the whole new report
+        self.client.post(f'/api/dataset/{self.dataset_id}/append/', {'file': make_csv(OTHER_CSV)}, format='multipart')
+        response = self.client.get(url, HTTP_RANGE='bytes=10-', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='export', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.url = f"/api/dataset/{response.data['id']}/export/"
+
+    def test_export_streams_csv(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Equipment Name,Type,Flowrate,Pressure,Temperature')
+        self.assertEqual(lines[1], 'Pump-1,Pump,120.0,5.2,110.0')
+        self.assertEqual(len(lines), 6)
+
+    def test_export_applies_filters(self):
+        response = self.client.get(self.url + '?type=Pump&ordering=-flowrate')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['Pump-2', 'Pump-1'])
+
+
+@override_settings(EQUIPMENT_REPORT_WORKERS=0)
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='etags', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.dataset_id = response.data['id']
+
+    def assert_revalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+        return etag
+
+    def test_endpoints_answer_304(self):
+        self.assert_revalidates('/api/summary/')
+        self.assert_revalidates('/api/summary/?summary_only=true')
+        self.assert_revalidates('/api/history/')
+        self.assert_revalidates(f'/api/dataset/{self.dataset_id}/')
+        with self.settings(EQUIPMENT_REPORT_CACHE_DIR=self.cache_dir):
+            self.assert_revalidates(f'/api/report/{self.dataset_id}/')
+
+    def test_representations_have_distinct_etags(self):
+        full = self.client.get('/api/summary/')['ETag']
+        summary_only = self.client.get('/api/summary/?summary_only=true')['ETag']
+        self.assertNotEqual(full, summary_only)
+
+    def test_new_upload_changes_etags(self):
+        summary_etag = self.assert_revalidates('/api/summary/')
+        history_etag = self.assert_revalidates('/api/history/')
+        self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+
+        self.assertEqual(self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=summary_etag).status_code, 200)
+        self.assertEqual(self.client.get('/api/history/', HTTP_IF_NONE_MATCH=history_etag).status_code, 200)
+
+
+def decode_column(column):
+    """
+    Mirror of the desktop client's decoder, for assertions.
+    """
+    if column['dtype'] == 'str':
+        return column['values']
+    if column['dtype'] == 'category':
+        codes = np.frombuffer(column['codes']['data'], dtype=column['codes']['dtype'])
+        return [column['categories'][code] for code in codes]
+    return np.frombuffer(column['data'], dtype=column['dtype']).tolist()
+
+
+class ColumnarFormatTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='columnar', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.dataset_id = response.data['id']
+
+    def get_msgpack(self, url):
+        response = self.client.get(url, HTTP_ACCEPT='application/x-msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+        return msgpack.unpackb(response.content, raw=False)
+
+    def test_dataset_columns(self):
+        data = self.get_msgpack(f'/api/dataset/{self.dataset_id}/')
+        self.assertNotIn('raw_data', data)
+        self.assertEqual(data['length'], 5)
+        self.assertEqual(data['summary']['total_equipment'], 5)
+        columns = data['columns']
+        self.assertEqual(decode_column(columns['Flowrate']), [120.0, 95.0, 60.0, 132.5, 150.0])
+        self.assertEqual(decode_column(columns['Type']), ['Pump', 'Compressor', 'Valve', 'Pump', 'HeatExchanger'])
+        self.assertEqual(decode_column(columns['Equipment Name'])[0], 'Pump-1')
+
+    def test_column_projection(self):
+        data = self.get_msgpack('/api/summary/?columns=Pressure,Temperature')
+        self.assertEqual(set(data['columns']), {'Pressure', 'Temperature'})
+        response = self.client.get('/api/summary/?columns=Colour', HTTP_ACCEPT='application/x-msgpack')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rows_page_columns(self):
+        data = self.get_msgpack(f'/api/dataset/{self.dataset_id}/rows/?page_size=2&type=Pump,Valve')
+        self.assertEqual(data['results']['length'], 2)
+        self.assertEqual(decode_column(data['results']['columns']['row_index']), [0, 2])
+        self.assertIsNotNone(data['next'])
+
+    def test_json_remains_default(self):
+        response = self.client.get(f'/api/dataset/{self.dataset_id}/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('raw_data', read_json(response))
+        msgpack_etag = self.client.get(f'/api/dataset/{self.dataset_id}/', HTTP_ACCEPT='application/x-msgpack')['ETag']
+        self.assertNotEqual(response['ETag'], msgpack_etag)
+
+
+@override_settings(EQUIPMENT_JOBS_SYNC=True, EQUIPMENT_SPOOL_DIR=tempfile.gettempdir())
+class DeduplicationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='dedup', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, content=SAMPLE_CSV, query=''):
+        return self.client.post(f'/api/upload/{query}', {'file': make_csv(content)}, format='multipart')
+
+    def test_hash_is_computed_during_upload(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        dataset = Dataset.objects.get(id=response.data['id'])
+        self.assertEqual(dataset.content_hash, hashlib.sha256(SAMPLE_CSV.encode('utf-8')).hexdigest())
+
+    def test_repeated_upload_returns_existing_dataset(self):
+        first = self.upload().data['id']
+        self.upload(OTHER_CSV)
+        with mock.patch('equipment.ingest.process_csv') as process:
+            response = self.upload()
+        process.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], first)
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(EquipmentRecord.objects.filter(dataset_id=first).count(), 5)
+        # The re-uploaded dataset becomes the latest again
+        self.assertEqual(self.client.get('/api/summary/?summary_only=true').data['id'], first)
+
+    def test_repeated_upload_keeps_retention_window(self):
+        first = self.upload().data['id']
+        for i in range(4):
+            self.upload(SAMPLE_CSV + f"Extra-{i},Pump,1,1,1\n")
+        self.upload()
+        self.upload(OTHER_CSV)
+        self.assertTrue(Dataset.objects.filter(id=first).exists())
+        self.assertEqual(Dataset.objects.filter(user=self.user).count(), 5)
+
+    def test_repeated_upload_is_announced_as_updated(self):
+        first = self.upload().data['id']
+        with mock.patch('equipment.ingest.publish') as publish:
+            self.upload()
+        publish.assert_called_once_with(self.user.pk, events.DATASET_UPDATED, mock.ANY)
+        self.assertEqual(publish.call_args.args[2]['id'], first)
+
+    def test_concurrent_uploads_of_one_file_keep_one_dataset(self):
+        content_hash = hashlib.sha256(SAMPLE_CSV.encode('utf-8')).hexdigest()
+        winner = []
+
+        def finish_other_upload(*args):
+            # The other copy passed the duplicate check too, and finishes first
+            if not winner:
+                winner.append(None)
+                winner[0] = ingest_csv(self.user, make_csv(), 'other.csv', content_hash=content_hash)
+
+        with mock.patch('equipment.views.find_duplicate', return_value=None), \
+                mock.patch('equipment.ingest.store_anomalies', side_effect=finish_other_upload):
+            response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], winner[0].id)
+        self.assertEqual(list(Dataset.all_objects.values_list('id', flat=True)), [winner[0].id])
+        self.assertEqual(EquipmentRecord.objects.count(), 5)
+
+    def test_async_duplicate_returns_finished_job(self):
+        first = self.upload().data['id']
+        response = self.upload(query='?async=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'succeeded')
+        self.assertEqual(response.data['dataset'], first)
+
+    def test_same_content_from_other_user_is_analyzed(self):
+        first = self.upload().data['id']
+        other = User.objects.create_user(username='dedup2', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data['id'], first)
+
+
+class AppendTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='append', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.dataset_id = response.data['id']
+        self.url = f'/api/dataset/{self.dataset_id}/append/'
+
+    def append(self, content=OTHER_CSV):
+        return self.client.post(self.url, {'file': make_csv(content)}, format='multipart')
+
+    def test_append_updates_summary_incrementally(self):
+        etag = self.client.get(f'/api/dataset/{self.dataset_id}/?summary_only=true')['ETag']
+        with mock.patch('equipment.ingest.accumulate_records') as rescan, \
+                mock.patch('equipment.ingest.get_report_cache') as report_cache:
+            response = self.append()
+        rescan.assert_not_called()
+        report_cache.return_value.invalidate.assert_called_once_with(self.dataset_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rows_appended'], 3)
+        self.assertTrue(response.data['rows'].endswith(f'/api/dataset/{self.dataset_id}/rows/'))
+
+        combined = process_csv(make_csv(SAMPLE_CSV + OTHER_CSV.split('\n', 1)[1]))
+        summary = response.data['summary']
+        self.assertEqual(summary['total_equipment'], 8)
+        self.assertEqual(summary['type_distribution'], combined['type_distribution'])
+        self.assertEqual(summary['histograms'], combined['histograms'])
+        self.assertEqual(summary['max_pressure'], 12.5)
+        for key in ('mean', 'std', 'median', 'p75'):
+            self.assertAlmostEqual(summary['statistics']['Temperature'][key], combined['statistics']['Temperature'][key])
+
+        dataset = Dataset.objects.get(id=self.dataset_id)
+        self.assertEqual((dataset.revision, dataset.content_hash), (1, None))
+        self.assertEqual(dataset.sketches['count'], 8)
+        self.assertEqual(
+            list(dataset.records.order_by('row_index').values_list('row_index', 'name'))[4:6],
+            [(4, 'HeatExchanger-1'), (5, 'Reactor-1')]
+        )
+        response = self.client.get(f'/api/dataset/{self.dataset_id}/?summary_only=true', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_append_changes_nothing(self):
+        response = self.append(OTHER_CSV + "Bad-1,Pump,x,1,1\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.append("Equipment Name,Type,Flowrate,Pressure,Temperature\n").status_code, 400)
+        dataset = Dataset.objects.get(id=self.dataset_id)
+        self.assertEqual(dataset.revision, 0)
+        self.assertEqual(dataset.summary['total_equipment'], 5)
+        self.assertEqual(dataset.records.count(), 5)
+
+    def test_append_while_appending_conflicts(self):
+        Dataset.objects.filter(id=self.dataset_id).update(status=Dataset.STATUS_APPENDING)
+        response = self.append()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Dataset.objects.get(id=self.dataset_id).records.count(), 5)
+
+    def test_failed_append_removes_its_rows(self):
+        with mock.patch('equipment.ingest.store_anomalies', side_effect=RuntimeError('disk full')):
+            self.assertEqual(self.append().status_code, 500)
+        dataset = Dataset.objects.get(id=self.dataset_id)
+        self.assertEqual((dataset.status, dataset.revision), (Dataset.STATUS_READY, 0))
+        self.assertEqual(dataset.records.count(), 5)
+        self.assertEqual(self.append().status_code, 200)
+
+    def test_interrupted_append_is_rolled_back(self):
+        dataset = Dataset.objects.get(id=self.dataset_id)
+        EquipmentRecord.objects.create(dataset=dataset, row_index=5, name='Partial-1', type='Pump',
+                                       flowrate=1, pressure=1, temperature=1)
+        Dataset.objects.filter(id=self.dataset_id).update(
+            status=Dataset.STATUS_APPENDING, status_changed_at=timezone.now() - datetime.timedelta(days=1)
+        )
+        response = self.append()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary']['total_equipment'], 8)
+        self.assertFalse(dataset.records.filter(name='Partial-1').exists())
+        self.assertEqual(dataset.records.count(), 8)
+
+    def test_append_to_other_users_dataset_not_found(self):
+        other = User.objects.create_user(username='append2', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.append().status_code, 404)
+
+    def test_appended_dataset_is_not_a_duplicate(self):
+        self.append()
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data['id'], self.dataset_id)
+
+
+def anomaly_csv():
+    """
+    Pumps and compressors with a steady spread, one pump whose pressure
+    is only unusual for a pump, and one valve far off every scale.
+    """
+    rows = ["Equipment Name,Type,Flowrate,Pressure,Temperature"]
+    rows += [f"Pump-{i},Pump,{120 + i % 5},{5.0 + 0.1 * (i % 5):.1f},110" for i in range(20)]
+    rows += [f"Compressor-{i},Compressor,{95 + i % 3},{8.0 + 0.1 * (i % 3):.1f},{95 + i % 4}" for i in range(20)]
+    rows += ["Pump-odd,Pump,121,8.1,110", "Valve-far,Valve,900,4.1,105"]
+    return "\n".join(rows) + "\n"
+
+
+class AnomalyTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='anomalies', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv(anomaly_csv())}, format='multipart')
+        self.dataset_id = response.data['id']
+        self.url = f'/api/dataset/{self.dataset_id}/anomalies/'
+
+    def test_anomalies_are_flagged_at_upload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        flagged = {(item['Equipment Name'], item['column']): item for item in response.data['results']}
+        self.assertEqual(set(flagged), {('Pump-odd', 'Pressure'), ('Valve-far', 'Flowrate')})
+
+        # 8.1 bar is ordinary for a compressor, so only the per-Type score sees it
+        self.assertEqual(flagged[('Pump-odd', 'Pressure')]['methods'], ['mad'])
+        self.assertEqual(flagged[('Valve-far', 'Flowrate')]['methods'], ['zscore', 'iqr'])
+        self.assertEqual(flagged[('Valve-far', 'Flowrate')]['row_index'], 41)
+        self.assertEqual(flagged[('Valve-far', 'Flowrate')]['Type'], 'Valve')
+
+        self.assertEqual(response.data['counts']['Pressure'], {'zscore': 0, 'iqr': 0, 'mad': 1})
+        pump = response.data['thresholds']['Pressure']['types']['Pump']
+        self.assertAlmostEqual(pump['median'], 5.2)
+        self.assertGreater(response.data['thresholds']['Flowrate']['upper_fence'], 130)
+
+    def test_filters_and_errors(self):
+        response = self.client.get(self.url, {'method': 'mad'})
+        self.assertEqual([item['Equipment Name'] for item in response.data['results']], ['Pump-odd'])
+        response = self.client.get(self.url, {'column': 'Flowrate,Temperature'})
+        self.assertEqual([item['Equipment Name'] for item in response.data['results']], ['Valve-far'])
+        self.assertEqual(self.client.get(self.url, {'method': 'median'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'column': 'Type'}).status_code, 400)
+
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user(username='other', password='testpass123'))
+        self.assertEqual(other.get(self.url).status_code, 404)
+
+    def test_detection_does_not_depend_on_chunking(self):
+        accumulator = SummaryAccumulator()
+        with AnomalySpool() as small, AnomalySpool() as whole:
+            process_csv(make_csv(anomaly_csv()), chunksize=5, accumulator=accumulator, on_chunk=small.add)
+            process_csv(make_csv(anomaly_csv()), on_chunk=whole.add)
+            thresholds = anomaly_thresholds(accumulator)
+            self.assertEqual(list(detect_anomalies(small, thresholds)), list(detect_anomalies(whole, thresholds)))
+        stored = list(Dataset.objects.get(pk=self.dataset_id).anomalies.values_list('row_index', 'column'))
+        self.assertEqual(stored, [(40, 'Pressure'), (41, 'Flowrate')])
+
+    def test_missing_spool_dir_is_created(self):
+        spool_dir = os.path.join(tempfile.mkdtemp(), 'spool')
+        self.addCleanup(shutil.rmtree, os.path.dirname(spool_dir), ignore_errors=True)
+        with override_settings(EQUIPMENT_SPOOL_DIR=spool_dir):
+            response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(os.path.isdir(spool_dir))
+
+    def test_zero_mad_and_iqr_fall_back_to_mean_deviation(self):
+        rows = ["Equipment Name,Type,Flowrate,Pressure,Temperature"]
+        rows += [f"Valve-{i},Valve,{50 if i < 8 else 51},5.0,100" for i in range(11)]
+        rows += ["Valve-stuck,Valve,90,9.0,100"]
+        accumulator = SummaryAccumulator()
+        with AnomalySpool() as spool:
+            process_csv(make_csv("\n".join(rows) + "\n"), accumulator=accumulator, on_chunk=spool.add)
+            thresholds = anomaly_thresholds(accumulator)
+            flagged = {(row, column): (iqr, mad) for row, column, _, _, iqr, mad in detect_anomalies(spool, thresholds)}
+        self.assertEqual(thresholds['Flowrate']['types']['Valve']['mad'], 0)
+        self.assertEqual(thresholds['Pressure']['q1'], thresholds['Pressure']['q3'])
+        # Mean absolute deviation of Flowrate from 50: (3 * 1 + 40) / 12
+        self.assertAlmostEqual(thresholds['Flowrate']['types']['Valve']['scale'], 1.253314 * 43 / 12)
+        self.assertEqual(sorted(flagged), [(11, 'Flowrate'), (11, 'Pressure')])
+        self.assertAlmostEqual(flagged[(11, 'Flowrate')][1], 40 / (1.253314 * 43 / 12))
+        self.assertGreater(flagged[(11, 'Pressure')][0], 1.5)
+
+    def test_appended_rows_are_checked(self):
+        response = self.client.post(f'/api/dataset/{self.dataset_id}/append/',
+                                    {'file': make_csv(SAMPLE_CSV + 'Pump-hot,Pump,122,5.1,400\n')}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        results = self.client.get(self.url, {'column': 'Temperature'}).data['results']
+        flagged = {item['Equipment Name']: item['row_index'] for item in results}
+        self.assertEqual(flagged['Pump-hot'], 47)
+        self.assertTrue(all(row_index >= 42 for row_index in flagged.values()))
+        self.assertEqual(self.client.get(self.url, {'column': 'Pressure'}).data['results'][0]['row_index'], 40)
+
+
+def trend_csv(rows=2000, spike=1234):
+    """
+    A smooth Flowrate wave with one spike, over ``rows`` rows.
+    """
+    lines = ["Equipment Name,Type,Flowrate,Pressure,Temperature"]
+    for i in range(rows):
+        flowrate = 900 if i == spike else 100 + 10 * np.sin(i / 50)
+        lines.append(f"Pump-{i},Pump,{flowrate:.3f},{5 + i % 7 / 10:.1f},{110 + i % 11}")
+    return "\n".join(lines) + "\n"
+
+
+class TrendsTestCase(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='trends', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.dataset_id = self.client.post('/api/upload/', {'file': make_csv(trend_csv())}, format='multipart').data['id']
+        self.url = f'/api/dataset/{self.dataset_id}/trends/'
+
+    def test_downsampling_keeps_spikes(self):
+        for method in ('lttb', 'minmax'):
+            data = self.client.get(self.url, {'points': 100, 'method': method}).data
+            row_index = list(data['columns']['row_index'])
+            self.assertEqual((data['rows'], data['start'], data['end']), (2000, 0, 2000))
+            # Union of the points kept for the three series
+            self.assertLessEqual(data['length'], 100)
+            self.assertEqual(len(row_index), data['length'])
+            self.assertEqual(row_index, sorted(set(row_index)))
+            self.assertEqual(data['columns']['Flowrate'][row_index.index(1234)], 900)
+            if method == 'lttb':
+                self.assertEqual((row_index[0], row_index[-1]), (0, 1999))
+
+    def test_points_bound_the_response(self):
+        values = np.random.default_rng(7).normal(size=(5000, 3)).cumsum(axis=0)
+        row_index = np.arange(5000)
+        for method in ('lttb', 'minmax'):
+            for points in (9, 10, 500, 4999):
+                kept = downsample(row_index, values, points, method)
+                self.assertLessEqual(len(kept), points, (method, points))
+                self.assertGreater(len(kept), points // 3, (method, points))
+        data = self.client.get(self.url, {'points': 9}).data
+        self.assertLessEqual(data['length'], 9)
+        data = self.client.get(self.url, {'points': 3, 'columns': 'Flowrate'}).data
+        self.assertEqual(list(data['columns']['row_index']), [0, 1234, 1999])
+
+    def test_small_windows_are_returned_whole(self):
+        data = self.client.get(self.url, {'start': 1230, 'end': 1240, 'columns': 'Flowrate'}).data
+        self.assertEqual(list(data['columns']), ['row_index', 'Flowrate'])
+        self.assertEqual(list(data['columns']['row_index']), list(range(1230, 1240)))
+        self.assertEqual(data['rows'], 10)
+
+        data = self.client.get(self.url, {'start': 1000, 'points': 50}).data
+        self.assertEqual((data['rows'], data['end']), (1000, 2000))
+        self.assertGreaterEqual(min(data['columns']['row_index']), 1000)
+
+    def test_results_are_cached_per_dataset_version(self):
+        response = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).content, response.content)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.client.post(f'/api/dataset/{self.dataset_id}/append/', {'file': make_csv()}, format='multipart')
+        self.assertEqual(self.client.get(self.url).data['rows'], 2005)
+
+    def test_binary_format_and_errors(self):
+        response = self.client.get(self.url, {'points': 10}, HTTP_ACCEPT='application/x-msgpack')
+        columns = msgpack.unpackb(response.content, raw=False)['columns']
+        self.assertEqual(columns['row_index']['dtype'], '<i8')
+        self.assertIn(900, np.frombuffer(columns['Flowrate']['data'], dtype='<f8'))
+
+        for params in ({'points': 2}, {'points': 8}, {'points': 'many'}, {'method': 'mean'}, {'columns': 'Type'},
+                       {'start': 10, 'end': 5}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user(username='other', password='testpass123'))
+        self.assertEqual(other.get(self.url).status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardCacheTestCase(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cached', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.dataset_id = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart').data['id']
+
+    def test_repeat_requests_skip_database(self):
+        first = self.client.get('/api/history/')
+        summary = self.client.get('/api/summary/?summary_only=true')
+        hits, misses = metrics.CACHE_HITS.value, metrics.CACHE_MISSES.value
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/history/').data, first.data)
+            self.assertEqual(self.client.get('/api/summary/?summary_only=true').data, summary.data)
+            response = self.client.get('/api/history/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(metrics.CACHE_HITS.value, hits + 4)
+        self.assertEqual(metrics.CACHE_MISSES.value, misses)
+
+    def test_upload_and_retention_invalidate(self):
+        self.client.get('/api/history/')
+        for i in range(5):
+            self.client.post('/api/upload/', {'file': make_csv(SAMPLE_CSV + f"Extra-{i},Pump,1,1,1\n")}, format='multipart')
+        history = self.client.get('/api/history/').data
+        self.assertEqual(len(history), 5)
+        self.assertNotIn(self.dataset_id, [item['id'] for item in history])
+        self.assertEqual(self.client.get('/api/summary/?summary_only=true').data['id'], history[0]['id'])
+
+    def test_append_invalidates(self):
+        self.client.get('/api/summary/?summary_only=true')
+        self.client.post(f'/api/dataset/{self.dataset_id}/append/', {'file': make_csv(OTHER_CSV)}, format='multipart')
+        summary = self.client.get('/api/summary/?summary_only=true').data
+        self.assertEqual(summary['summary']['total_equipment'], 8)
+        self.assertEqual(self.client.get('/api/history/').data[0]['summary']['total_equipment'], 8)
+
+    def test_entries_are_per_user(self):
+        self.client.get('/api/history/')
+        other = User.objects.create_user(username='cached2', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get('/api/history/').data, [])
+        self.assertEqual(self.client.get('/api/summary/?summary_only=true').status_code, 404)
+
+    def test_invalidation_survives_evicted_generation(self):
+        self.client.get('/api/history/')
+        get_cache().delete(f'equipment:user:{self.user.pk}:generation')
+        invalidate_user_cache(self.user.pk)
+        Dataset.objects.filter(id=self.dataset_id).update(file_name='renamed.csv')
+        self.assertEqual(self.client.get('/api/history/').data[0]['file_name'], 'renamed.csv')
+
+
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='timed', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def server_timing(self, response):
+        entries = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            entries[name] = dict(param.split('=', 1) for param in params)
+        return entries
+
+    def test_upload_reports_stage_timings(self):
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        timings = self.server_timing(response)
+        self.assertTrue({'total', 'db', 'hash', 'parse', 'analyze', 'convert', 'store', 'retention', 'render'} <= set(timings))
+        self.assertGreater(int(timings['db']['desc'].strip('"').split()[0]), 0)
+
+    def test_query_count_matches_database_work(self):
+        dataset_id = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart').data['id']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/dataset/{dataset_id}/rows/')
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(self.server_timing(response)['db']['desc'], f'"{len(queries)} queries"')
+
+    @override_settings(EQUIPMENT_METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_endpoint(self):
+        self.client.get('/api/history/')
+        self.client.get('/api/history/')
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode('utf-8')
+        self.assertIn('# TYPE equipment_request_seconds histogram', text)
+        self.assertIn('equipment_request_seconds_bucket{view="get_history",le="+Inf"}', text)
+        self.assertIn('equipment_requests_total{view="get_history",status="200"}', text)
+        self.assertIn('equipment_requests_in_flight 1', text)
+        self.assertIn('equipment_cache_hits_total', text)
+        self.assertIn('equipment_report_cache_misses_total', text)
+
+    def test_metrics_are_closed_by_default(self):
+        # The test client connects from 127.0.0.1, like a reverse proxy would
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.assertEqual(APIClient().get('/api/metrics/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+    @override_settings(EQUIPMENT_METRICS_TOKEN='s3cret')
+    def test_metrics_token(self):
+        scraper = APIClient()
+        self.assertEqual(scraper.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(scraper.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(scraper.get('/api/metrics/').status_code, 403)
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        self.settings_override = override_settings(EQUIPMENT_PROFILE_DIR=self.profile_dir, EQUIPMENT_PROFILE_KEEP=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        # Session login: the middleware sees Django's request.user, not DRF's
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='profiled', password='testpass123', is_staff=True)
+        self.client.login(username='profiled', password='testpass123')
+
+    def test_staff_request_is_profiled(self):
+        response = self.client.post('/api/upload/?profile=1', {'file': make_csv()}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        profile_id = response['X-Profile-Id']
+
+        profiles = self.client.get('/api/profiles/').data['profiles']
+        self.assertEqual([p['id'] for p in profiles], [profile_id])
+        self.assertEqual(profiles[0]['kind'], 'cprofile')
+        self.assertEqual(profiles[0]['view'], 'upload_csv')
+        self.assertEqual(profiles[0]['status'], 201)
+
+        response = self.client.get(f'/api/profiles/{profile_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(b''.join(response.streaming_content)), 0)
+
+        response = self.client.get(f'/api/profiles/{profile_id}/?format=txt')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('process_csv', response.content.decode('utf-8'))
+        response = self.client.get('/api/profiles/missing/?format=txt')
+        self.assertEqual((response.status_code, response.content), (404, b'Profile not found'))
+
+    def test_sampled_profile_and_pruning(self):
+        ids = [self.client.get('/api/aggregate/', HTTP_X_PROFILE='sample')['X-Profile-Id'] for _ in range(3)]
+        profiles = self.client.get('/api/profiles/').data['profiles']
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual({p['kind'] for p in profiles}, {'sample'})
+        self.assertEqual(self.client.get(f'/api/profiles/{ids[0]}/').status_code, 404)
+
+        response = self.client.get(f"/api/profiles/{profiles[0]['id']}/?format=txt")
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_view_profile_rejected(self):
+        response = self.client.get('/api/history/?profile=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Async views', response.json()['error'])
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_non_staff_not_profiled(self):
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get('/api/history/?profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+        self.assertEqual(self.client.get('/api/profiles/').status_code, 403)
+
+
+@override_settings(EQUIPMENT_JOBS_SYNC=True, EQUIPMENT_SPOOL_DIR=tempfile.gettempdir())
+class ChunkedUploadTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='chunked', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.content = SAMPLE_CSV.encode('utf-8')
+        self.chunk_size = 64
+        response = self.client.post('/api/uploads/', {
+            'file_name': 'equipment.csv', 'total_size': len(self.content), 'chunk_size': self.chunk_size,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.session = response.data
+        self.url = f"/api/uploads/{self.session['id']}/"
+
+    def chunk(self, index):
+        return self.content[index * self.chunk_size:(index + 1) * self.chunk_size]
+
+    def put(self, index, data=None, checksum=None):
+        data = self.chunk(index) if data is None else data
+        return self.client.put(
+            f'{self.url}chunks/{index}/', data=data, content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM=checksum or hashlib.sha256(data).hexdigest()
+        )
+
+    def test_out_of_order_chunks_assemble_dataset(self):
+        count = self.session['chunk_count']
+        self.assertEqual(count, -(-len(self.content) // self.chunk_size))
+        for index in reversed(range(1, count)):
+            self.assertEqual(self.put(index).status_code, 200)
+
+        session = self.client.get(self.url).data
+        self.assertEqual(session['missing_chunks'], [0])
+        self.assertEqual(session['received_ranges'], [[self.chunk_size, len(self.content) - 1]])
+        response = self.client.post(f'{self.url}complete/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['missing_chunks'], [0])
+
+        self.put(0)
+        response = self.client.post(f'{self.url}complete/')
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'succeeded')
+        dataset = Dataset.objects.get(id=job['dataset'])
+        self.assertEqual(dataset.records.count(), 5)
+        self.assertEqual(dataset.content_hash, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, 409)
+        self.assertEqual(self.put(0).status_code, 400)
+
+    def test_invalid_chunks_are_rejected(self):
+        self.assertEqual(self.put(0, checksum='0' * 64).status_code, 400)
+        self.assertEqual(self.put(0, data=self.chunk(0)[:-1]).status_code, 400)
+        self.assertEqual(self.put(0, data=self.chunk(0) + b'x').status_code, 400)
+        self.assertEqual(self.put(self.session['chunk_count']).status_code, 400)
+        self.assertEqual(self.client.get(self.url).data['received_ranges'], [])
+        # Retrying with the right bytes succeeds
+        self.assertEqual(self.put(0).status_code, 200)
+        self.assertEqual(self.client.get(self.url).data['received_ranges'], [[0, self.chunk_size - 1]])
+
+    def test_invalid_session_rejected(self):
+        response = self.client.post('/api/uploads/', {'file_name': 'data.txt', 'total_size': 10}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/uploads/', {'file_name': 'data.csv', 'total_size': 0}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_session_of_other_user_not_found(self):
+        other = User.objects.create_user(username='chunked2', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.put(0).status_code, 404)
+
+
+class JSONStreamingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='jsonstream', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.dataset_id = response.data['id']
+
+    def test_full_dataset_is_streamed(self):
+        response = self.client.get(f'/api/dataset/{self.dataset_id}/')
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.has_header('ETag'))
+        data = read_json(response)
+        self.assertEqual(list(data), ['id', 'uploaded_at', 'file_name', 'summary', 'raw_data'])
+        self.assertEqual(data['summary']['total_equipment'], 5)
+        self.assertEqual(
+            [row['Equipment Name'] for row in data['raw_data']],
+            ['Pump-1', 'Compressor-1', 'Valve-1', 'Pump-2', 'HeatExchanger-1']
+        )
+
+    def test_rows_are_encoded_in_batches(self):
+        dataset = Dataset.objects.get(pk=self.dataset_id)
+        chunks = list(iter_dataset_json({'id': dataset.id}, dataset.records.order_by('row_index'), batch_size=2))
+        self.assertEqual(len(chunks), 5)
+        data = json.loads(b''.join(chunks))
+        self.assertEqual(len(data['raw_data']), 5)
+        self.assertEqual(data['raw_data'][4]['Flowrate'], 150.0)
+        self.assertEqual(json.loads(b''.join(iter_dataset_json({}, dataset.records.none()))), {'raw_data': []})
+
+    def test_summary_only_is_not_streamed(self):
+        response = self.client.get('/api/summary/?summary_only=true')
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.json()['summary']['total_equipment'], 5)
+
+    def test_orjson_renderer_matches_drf_types(self):
+        renderer = ORJSONRenderer()
+        data = {'amount': Decimal('1.5'), 'id': uuid.UUID(int=1), 'when': datetime.date(2024, 1, 2)}
+        self.assertEqual(json.loads(renderer.render(data)), {
+            'amount': 1.5, 'id': '00000000-0000-0000-0000-000000000001', 'when': '2024-01-02',
+        })
+        pretty = renderer.render({'a': 1}, 'application/json; indent=4')
+        self.assertEqual(pretty, b'{\n    "a": 1\n}')
+
+
+class AsyncViewTestCase(TestCase):
+    """
+    The dashboard endpoints are async views; AsyncClient serves them the
+    way an ASGI server does.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='asyncviews', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        self.dataset_id = response.data['id']
+        self.async_client = AsyncClient()
+        self.async_client.force_login(self.user)
+
+    async def test_full_dataset_is_streamed_asynchronously(self):
+        response = await self.async_client.get(f'/api/dataset/{self.dataset_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        data = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(len(data['raw_data']), 5)
+        self.assertEqual(data['raw_data'][0]['Equipment Name'], 'Pump-1')
+
+    async def test_summary_history_and_etags(self):
+        response = await self.async_client.get('/api/summary/', {'summary_only': 'true'})
+        self.assertEqual(response.json()['summary']['total_equipment'], 5)
+        self.assertIn('Accept', response['Vary'])
+        response = await self.async_client.get(
+            '/api/summary/', {'summary_only': 'true'}, headers={'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get('/api/history/')
+        self.assertEqual([item['id'] for item in response.json()], [self.dataset_id])
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        response = await self.async_client.get(
+            f'/api/dataset/{self.dataset_id}/', headers={'Accept': 'application/x-msgpack'}
+        )
+        self.assertEqual(len(msgpack.unpackb(response.content)['columns']['Flowrate']['data']), 5 * 8)
+
+    async def test_authentication_and_errors(self):
+        response = await self.async_client.get('/api/check-auth/')
+        self.assertEqual(response.json(), {'authenticated': True, 'username': 'asyncviews'})
+
+        anonymous = AsyncClient()
+        self.assertEqual((await anonymous.get('/api/check-auth/')).json(), {'authenticated': False})
+        response = await anonymous.get('/api/summary/')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('detail', response.json())
+
+        self.assertEqual((await self.async_client.get('/api/dataset/999999/')).status_code, 404)
+        self.assertEqual((await self.async_client.post('/api/history/')).status_code, 405)
+        self.assertEqual((await self.async_client.get('/api/history/', headers={'Accept': 'text/csv'})).status_code, 406)
+
+    async def test_api_view_policies_apply(self):
+        response = await self.async_client.get('/api/history/', headers={'Accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Get History')
+        response = await self.async_client.head('/api/history/')
+        self.assertEqual((response.status_code, response.content), (200, b''))
+
+        class Closed(BaseThrottle):
+            def allow_request(self, request, view):
+                return False
+
+            def wait(self):
+                return 7
+
+        with mock.patch.object(views.get_history.cls, 'throttle_classes', [Closed]):
+            response = await self.async_client.get('/api/history/')
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '7'))
+
+    async def test_files_are_streamed_asynchronously(self):
+        response = await self.async_client.get(f'/api/dataset/{self.dataset_id}/export/')
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].startswith('Pump-1,'))
+
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as report:
+            report.write(b'%PDF-' + b'x' * 100)
+            report.flush()
+            with mock.patch('equipment.views.get_report_path', return_value=report.name):
+                whole = await self.async_client.get(f'/api/report/{self.dataset_id}/')
+                part = await self.async_client.get(f'/api/report/{self.dataset_id}/', headers={'Range': 'bytes=5-'})
+            self.assertTrue(whole.is_async)
+            self.assertEqual(whole['Content-Length'], '105')
+            self.assertEqual(b''.join([chunk async for chunk in whole.streaming_content]), b'%PDF-' + b'x' * 100)
+            self.assertEqual(part.status_code, 206)
+            self.assertEqual(b''.join([chunk async for chunk in part.streaming_content]), b'x' * 100)
+
+
+def parse_events(chunks):
+    """
+    (event type, data) pairs of server-sent event chunks, skipping
+    comments and the retry hint.
+    """
+    parsed = []
+    for message in b''.join(chunks).decode('utf-8').split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if line and not line.startswith(':'))
+        if 'event' in fields:
+            parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+@override_settings(EQUIPMENT_EVENTS_KEEPALIVE=0.05, EQUIPMENT_JOBS_SYNC=True,
+                   EQUIPMENT_SPOOL_DIR=tempfile.gettempdir())
+class EventStreamTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='subscriber', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.async_client = AsyncClient()
+        self.async_client.force_login(self.user)
+        # Events of earlier tests stay in memory; only read newer ones
+        self.start_id = events.last_event_id()
+
+    def open_stream(self, last_event_id):
+        response = self.client.get('/api/events/', HTTP_LAST_EVENT_ID=str(last_event_id),
+                                   HTTP_ACCEPT='text/event-stream')
+        self.addCleanup(response.close)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+        return chunks
+
+    def test_missed_events_are_replayed(self):
+        self.client.post('/api/upload/', {'file': make_csv()}, format='multipart')
+        response = self.client.post('/api/upload/?async=true', {'file': make_csv(SAMPLE_CSV + 'Pump-9,Pump,1,2,3\n')},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 202)
+
+        received = parse_events([next(self.open_stream(self.start_id))])
+        types = [event_type for event_type, _ in received]
+        self.assertEqual(types[0], 'dataset.created')
+        self.assertEqual(received[0][1]['summary']['total_equipment'], 5)
+        self.assertIn('job.progress', types)
+        self.assertEqual(types[-1], 'job.progress')
+        job = received[-1][1]
+        self.assertEqual((job['id'], job['status'], job['progress']), (response.data['id'], 'succeeded', 1.0))
+        self.assertEqual(job['dataset'], received[-2][1]['id'])
+
+    def test_new_events_wake_the_stream(self):
+        chunks = self.open_stream(self.start_id)
+        self.assertEqual(next(chunks), b': keepalive\n\n')
+
+        other = User.objects.create_user(username='other', password='testpass123')
+        events.publish(other.pk, events.DATASET_CREATED, {'id': 1})
+        timer = threading.Timer(0.01, events.publish, (self.user.pk, events.RETENTION_DELETED, {'ids': [1, 2]}))
+        timer.start()
+        self.addCleanup(timer.join)
+        received = []
+        while not received:
+            received = parse_events([next(chunks)])
+        self.assertEqual(received, [('retention.deleted', {'ids': [1, 2]})])
+        self.assertEqual(metrics.EVENT_STREAMS.value, 1)
+
+    def test_retention_deletes_are_published(self):
+        for i in range(6):
+            self.client.post('/api/upload/', {'file': make_csv(SAMPLE_CSV + f'Extra-{i},Pump,1,2,3\n')},
+                             format='multipart')
+        received = parse_events([next(self.open_stream(self.start_id))])
+        deleted = [data for event_type, data in received if event_type == 'retention.deleted']
+        self.assertEqual(len(deleted), 1)
+        self.assertFalse(Dataset.objects.filter(id__in=deleted[0]['ids']).exists())
+
+    @override_settings(EQUIPMENT_EVENTS_MAX_AGE=0.1)
+    def test_stream_ends_after_max_age(self):
+        chunks = list(self.open_stream(self.start_id))
+        self.assertTrue(all(chunk == b': keepalive\n\n' for chunk in chunks))
+        self.assertEqual(metrics.EVENT_STREAMS.value, 0)
+
+    def test_stale_event_id_asks_for_resync(self):
+        received = parse_events([next(self.open_stream(1))])
+        self.assertEqual(received, [('resync', {})])
+
+    def test_requires_authentication(self):
+        response = APIClient().get('/api/events/')
+        self.assertEqual(response.status_code, 403)
+
+    async def test_stream_under_asgi(self):
+        response = await self.async_client.get('/api/events/', headers={'Last-Event-ID': str(self.start_id)})
+        self.assertTrue(response.is_async)
+        chunks = response.streaming_content
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertEqual(await anext(chunks), b': keepalive\n\n')
+        asyncio.get_running_loop().call_later(0.01, events.publish, self.user.pk, events.DATASET_UPDATED, {'id': 7})
+        received = []
+        while not received:
+            received = parse_events([await anext(chunks)])
+        self.assertEqual(received, [('dataset.updated', {'id': 7})])
+        await chunks.aclose()
+
+
+class BenchmarkToolsTestCase(TestCase):
+    def test_synthetic_csv_is_valid_and_reproducible(self):
+        content = synthetic_csv(200, seed=3)
+        self.assertEqual(content, synthetic_csv(200, seed=3))
+        self.assertNotEqual(content, synthetic_csv(200, seed=4))
+        summary = process_csv(make_csv(content.decode('utf-8')))
+        self.assertEqual(summary['total_equipment'], 200)
+
+    def test_synthetic_csv_options(self):
+        summary = process_csv(make_csv(synthetic_csv(1000, types=20).decode('utf-8')))
+        self.assertEqual(set(summary['type_distribution']), set(type_names(20)))
+        self.assertEqual(len(type_names(20)), 20)
+        with self.assertRaises(CSVValidationError):
+            process_csv(make_csv(synthetic_csv(1000, invalid_fraction=0.01).decode('utf-8')))
+
+    def test_summarize(self):
+        samples = [('summary', i / 1000, 200) for i in range(1, 100)] + [('upload', 0.5, 500), ('upload', 0.1, 0)]
+        result = summarize(samples, elapsed=2.0)
+        self.assertEqual(result['requests'], 101)
+        self.assertEqual(result['errors'], 2)
+        self.assertEqual(result['status_codes'], {'200': 99, '500': 1, '0': 1})
+        self.assertAlmostEqual(result['requests_per_second'], 50.5)
+        self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p95'])
+        self.assertEqual(result['latency_ms']['max'], 500.0)
+        self.assertEqual(parse_mix('upload=1,summary=3'), {'upload': 1.0, 'summary': 3.0})
+
+    def test_compare_with_baseline(self):
+        baseline = {'results': {
+            'process_csv@1000': {'seconds': 0.1, 'peak_bytes': 10 * 1024 * 1024},
+            'get_chart_data@1000': {'seconds': 0.0001, 'peak_bytes': 100},
+        }}
+        results = {
+            'process_csv@1000': {'seconds': 0.15, 'peak_bytes': 11 * 1024 * 1024},
+            # Far slower in relative terms, but below the noise floor
+            'get_chart_data@1000': {'seconds': 0.001, 'peak_bytes': 1000},
+            'analyze_csv@1000': {'seconds': 5.0, 'peak_bytes': 1},
+        }
+        regressions = compare(results, baseline, threshold=0.2)
+        self.assertEqual([(r['benchmark'], r['metric']) for r in regressions], [('process_csv@1000', 'seconds')])
+        self.assertEqual(compare(results, baseline, threshold=0.6), [])
+        self.assertEqual(parse_scales('1e3,25000'), [1000, 25000])
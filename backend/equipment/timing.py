@@ -0,0 +1,98 @@
+"""
+Per-request timing spans and SQL query accounting.
+RequestTimingMiddleware activates a RequestTimings for each request;
+code anywhere below the view wraps its stages in ``span('name')``.
+Outside a request (background jobs, management commands) spans cost
+one context-variable lookup and record nothing.
+The timings live in a context variable, so they follow async views into
+the executor threads that run their queries.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+_current = ContextVar('equipment_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Seconds spent per named span, plus SQL query count and time, for one
+    request. Also a database ``execute_wrapper``.
+    """
+
+    def __init__(self):
+        self.spans = {}  # name -> seconds, in first-use order
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+    def server_timing(self, total):
+        """
+        ``Server-Timing`` header value (durations in milliseconds).
+        """
+        entries = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        entries.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.spans.items())
+        return ', '.join(entries)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper installed on every connection (see apps.py);
+    counts queries towards the current request's timings.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+def activate(timings):
+    """
+    Makes ``timings`` collect the spans of the current context.
+    Returns a token for deactivate().
+    """
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record(name, seconds):
+    """
+    Adds an already measured duration to the current request's span.
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name):
+    """
+    Times the enclosed block as part of the current request's span
+    ``name``; repeated spans of one name add up.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
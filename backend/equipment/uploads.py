@@ -0,0 +1,70 @@
+"""
+Upload handlers that fingerprint files while Django receives them.
+Each uploaded file gets a ``content_hash`` (SHA-256 hex digest) computed
+from the incoming chunks, so duplicates are found without re-reading.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+# Bytes hashed per read when a file arrives without a precomputed hash
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+class ContentHashMixin:
+    """
+    Hashes the chunks an upload handler stores and sets ``content_hash``
+    on the file it produces.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Set up first: the memory handler raises StopFutureHandlers
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # Only the handler that actually keeps the file hashes it
+        if getattr(self, 'activated', True):
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def upload_content_hash(file):
+    """
+    SHA-256 hex digest of an uploaded file. Uses the hash computed during
+    upload when available; otherwise reads the file once and rewinds it.
+    """
+    content_hash = getattr(file, 'content_hash', None)
+    if content_hash:
+        return content_hash
+    hasher = hashlib.sha256()
+    for chunk in file.chunks(HASH_BLOCK_SIZE):
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def file_content_hash(path):
+    """
+    SHA-256 hex digest of a file on disk, read block by block.
+    """
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
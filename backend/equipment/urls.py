@@ -10,11 +10,30 @@ urlpatterns = [
     
     # Dataset operations
     path('upload/', views.upload_csv, name='upload_csv'),
+    path('jobs/<uuid:job_id>/', views.get_job, name='get_job'),
+    path('uploads/', views.create_upload, name='create_upload'),
+    path('uploads/<uuid:upload_id>/', views.get_upload, name='get_upload'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', views.put_upload_chunk, name='put_upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.complete_upload, name='complete_upload'),
     path('summary/', views.get_summary, name='get_summary'),
     path('history/', views.get_history, name='get_history'),
+    path('aggregate/', views.aggregate_datasets, name='aggregate_datasets'),
     path('dataset/<int:dataset_id>/', views.get_dataset, name='get_dataset'),
+    path('dataset/<int:dataset_id>/rows/', views.get_dataset_rows, name='get_dataset_rows'),
+    path('dataset/<int:dataset_id>/append/', views.append_rows, name='append_rows'),
+    path('dataset/<int:dataset_id>/export/', views.export_dataset, name='export_dataset'),
+    path('dataset/<int:dataset_id>/anomalies/', views.get_dataset_anomalies, name='dataset_anomalies'),
+    path('dataset/<int:dataset_id>/trends/', views.get_dataset_trends, name='dataset_trends'),
+    
+    # Live updates
+    path('events/', views.event_stream, name='event_stream'),
     
     # Reports
     path('report/', views.generate_report, name='generate_report_latest'),
     path('report/<int:dataset_id>/', views.generate_report, name='generate_report'),
+    
+    # Monitoring
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('profiles/', views.list_profiles_view, name='list_profiles'),
+    path('profiles/<slug:profile_id>/', views.get_profile_view, name='get_profile'),
 ]
@@ -2,12 +2,316 @@
 Utility functions for CSV parsing and analytics.
 Uses Pandas for reliable data processing.
 """
+import numpy as np
 import pandas as pd
-from io import StringIO
+
+from .stats import Moments, TDigest, Histogram, Grouping, grouped_moments, describe
+from .timing import span
 
 
 # CRITICAL: These are the EXACT column names required
 REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+
+# Rows parsed per chunk; bounds peak memory regardless of file size
+CSV_CHUNK_SIZE = 50000
+
+# Largest accepted magnitude of a numeric value. Sums of squared
+# deviations over billions of rows stay finite well below it.
+MAX_ABS_VALUE = 1e100
+
+# Bump when the layout of SummaryAccumulator.to_sketches() changes
+SKETCH_VERSION = 2
+
+
+class CSVValidationError(ValueError):
+    """
+    Raised when an uploaded CSV does not match the expected structure.
+    """
+    pass
+
+
+def iter_csv_chunks(file, chunksize=CSV_CHUNK_SIZE):
+    """
+    Reads a CSV in chunks, validating columns and numeric types as it goes.
+    Numeric columns are coerced to floats in each yielded DataFrame.
+
+    Raises:
+        CSVValidationError: if the file cannot be parsed or fails validation
+    """
+    try:
+        reader = pd.read_csv(file, chunksize=chunksize)
+        for chunk in reader:
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing_columns:
+                raise CSVValidationError(f"Missing required columns: {', '.join(missing_columns)}")
+
+            for col in NUMERIC_COLUMNS:
+                values = pd.to_numeric(chunk[col], errors='coerce')
+                if not values.notna().all():
+                    raise CSVValidationError(f"Column '{col}' must contain only numeric values")
+                values = values.astype(float)
+                # 'inf' and '-inf' parse as numbers but no statistic survives them
+                if not np.isfinite(values.to_numpy()).all():
+                    raise CSVValidationError(f"Column '{col}' must contain only finite numeric values")
+                if (values.abs() > MAX_ABS_VALUE).any():
+                    raise CSVValidationError(
+                        f"Column '{col}' must contain values between {-MAX_ABS_VALUE:g} and {MAX_ABS_VALUE:g}"
+                    )
+                chunk[col] = values
+
+            yield chunk
+    except CSVValidationError:
+        raise
+    except Exception as e:
+        raise CSVValidationError(f"Error reading CSV: {str(e)}")
+
+
+class SummaryAccumulator:
+    """
+    Running summary statistics, updated one vectorized pass per chunk.
+    Produces the same ``summary`` dict as a whole-file analysis: moments,
+    percentiles (from a t-digest), fixed-count histograms and per-Type
+    aggregates for every numeric column. Per-Type digests are kept too,
+    for the robust scores of anomaly detection.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.moments = {col: Moments() for col in NUMERIC_COLUMNS}
+        self.digests = {col: TDigest() for col in NUMERIC_COLUMNS}
+        self.histograms = {col: Histogram() for col in NUMERIC_COLUMNS}
+        self.type_moments = {}
+        self.type_digests = {}
+
+    @property
+    def type_counts(self):
+        return {
+            equipment_type: columns[NUMERIC_COLUMNS[0]].count
+            for equipment_type, columns in self.type_moments.items()
+        }
+
+    def update(self, chunk):
+        """
+        Folds a validated DataFrame chunk into the running statistics.
+        """
+        if chunk.empty:
+            return
+
+        self.count += len(chunk)
+        # Rows with a blank Type count towards the totals but towards no
+        # Type, as in pandas' value_counts()
+        typed = chunk['Type'].notna().to_numpy()
+        types = Grouping(chunk['Type'][typed].astype(str))
+        for col in NUMERIC_COLUMNS:
+            values = chunk[col].to_numpy(dtype=float)
+            self.moments[col].update(values)
+            self.digests[col].update(values)
+            self.histograms[col].update(values)
+            typed_values = values[typed]
+            for equipment_type, moments in grouped_moments(types, typed_values).items():
+                type_columns = self.type_moments.setdefault(
+                    equipment_type, {c: Moments() for c in NUMERIC_COLUMNS}
+                )
+                type_columns[col].merge(moments)
+            grouped_values = typed_values[types.order]
+            for i, equipment_type in enumerate(types.groups):
+                type_digests = self.type_digests.setdefault(
+                    equipment_type, {c: TDigest() for c in NUMERIC_COLUMNS}
+                )
+                start = types.starts[i]
+                type_digests[col].update(grouped_values[start:start + types.counts[i]])
+
+    def merge(self, other):
+        """
+        Folds another accumulator (e.g. another dataset's) into this one.
+        """
+        self.count += other.count
+        for col in NUMERIC_COLUMNS:
+            self.moments[col].merge(other.moments[col])
+            self.digests[col].merge(other.digests[col])
+            self.histograms[col].merge(other.histograms[col])
+        for equipment_type, columns in other.type_moments.items():
+            type_columns = self.type_moments.setdefault(
+                equipment_type, {c: Moments() for c in NUMERIC_COLUMNS}
+            )
+            for col in NUMERIC_COLUMNS:
+                type_columns[col].merge(columns[col])
+        for equipment_type, digests in other.type_digests.items():
+            type_digests = self.type_digests.setdefault(
+                equipment_type, {c: TDigest() for c in NUMERIC_COLUMNS}
+            )
+            for col in NUMERIC_COLUMNS:
+                type_digests[col].merge(digests[col])
+        return self
+
+    def to_sketches(self):
+        """
+        Returns the mergeable state stored on ``Dataset.sketches``.
+        Its size depends on the number of types, not the number of rows.
+        """
+        return {
+            "version": SKETCH_VERSION,
+            "count": self.count,
+            "columns": {
+                col: {
+                    "moments": self.moments[col].to_dict(),
+                    "digest": self.digests[col].to_dict(),
+                    "histogram": self.histograms[col].to_dict(),
+                }
+                for col in NUMERIC_COLUMNS
+            },
+            "types": {
+                equipment_type: {col: columns[col].to_dict() for col in NUMERIC_COLUMNS}
+                for equipment_type, columns in self.type_moments.items()
+            },
+            "type_digests": {
+                equipment_type: {col: digests[col].to_dict() for col in NUMERIC_COLUMNS}
+                for equipment_type, digests in self.type_digests.items()
+            },
+        }
+
+    @classmethod
+    def from_sketches(cls, sketches):
+        """
+        Rebuilds an accumulator from ``Dataset.sketches``.
+        """
+        accumulator = cls()
+        accumulator.count = sketches['count']
+        for col in NUMERIC_COLUMNS:
+            column = sketches['columns'][col]
+            accumulator.moments[col] = Moments.from_dict(column['moments'])
+            accumulator.digests[col] = TDigest.from_dict(column['digest'])
+            accumulator.histograms[col] = Histogram.from_dict(column['histogram'])
+        accumulator.type_moments = {
+            equipment_type: {col: Moments.from_dict(columns[col]) for col in NUMERIC_COLUMNS}
+            for equipment_type, columns in sketches['types'].items()
+        }
+        # Missing from version 1 sketches
+        accumulator.type_digests = {
+            equipment_type: {col: TDigest.from_dict(digests[col]) for col in NUMERIC_COLUMNS}
+            for equipment_type, digests in sketches.get('type_digests', {}).items()
+        }
+        return accumulator
+
+    def to_summary(self):
+        """
+        Returns the summary dict stored on ``Dataset.summary``.
+        """
+        if not self.count:
+            raise CSVValidationError("CSV file contains no equipment rows")
+
+        # Most common types first, matching pandas value_counts()
+        type_distribution = dict(sorted(self.type_counts.items(), key=lambda item: -item[1]))
+
+        moments = self.moments
+        return {
+            "total_equipment": int(self.count),
+            "average_flowrate": moments['Flowrate'].mean,
+            "average_pressure": moments['Pressure'].mean,
+            "average_temperature": moments['Temperature'].mean,
+            "type_distribution": type_distribution,
+
+            # Additional statistics for better insights
+            "min_flowrate": moments['Flowrate'].min,
+            "max_flowrate": moments['Flowrate'].max,
+            "min_pressure": moments['Pressure'].min,
+            "max_pressure": moments['Pressure'].max,
+            "min_temperature": moments['Temperature'].min,
+            "max_temperature": moments['Temperature'].max,
+
+            # Spread and shape per numeric column
+            "statistics": {
+                col: describe(moments[col], self.digests[col]) for col in NUMERIC_COLUMNS
+            },
+            "histograms": {
+                col: self.histograms[col].to_dict() for col in NUMERIC_COLUMNS
+            },
+            "type_statistics": {
+                equipment_type: {
+                    "count": self.type_counts[equipment_type],
+                    **{
+                        col: {
+                            "mean": columns[col].mean,
+                            "std": columns[col].std,
+                            "min": columns[col].min,
+                            "max": columns[col].max,
+                        }
+                        for col in NUMERIC_COLUMNS
+                    },
+                }
+                for equipment_type, columns in self.type_moments.items()
+            },
+        }
+
+
+def process_csv(file, on_records=None, chunksize=CSV_CHUNK_SIZE, accumulator=None, on_chunk=None):
+    """
+    Single-pass ingestion pipeline: validates, summarizes and emits records.
+
+    Args:
+        file: file-like object containing the CSV
+        on_records: optional callable receiving each chunk's list of
+            record dicts as soon as the chunk has been validated
+        chunksize: rows parsed per chunk
+        accumulator: optional SummaryAccumulator to fill, for callers
+            that also keep its sketches
+        on_chunk: optional callable receiving each validated DataFrame
+            chunk (e.g. AnomalySpool.add)
+
+    Returns:
+        dict: summary statistics
+
+    Raises:
+        CSVValidationError: if the CSV is malformed
+    """
+    if accumulator is None:
+        accumulator = SummaryAccumulator()
+
+    chunks = iter_csv_chunks(file, chunksize=chunksize)
+    while True:
+        with span('parse'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with span('analyze'):
+            accumulator.update(chunk)
+            if on_chunk is not None and not chunk.empty:
+                on_chunk(chunk)
+        if on_records is not None and not chunk.empty:
+            with span('convert'):
+                records = chunk.to_dict(orient="records")
+            on_records(records)
+
+    with span('analyze'):
+        return accumulator.to_summary()
+
+
+def accumulate_records(records, batch_size=CSV_CHUNK_SIZE, on_chunk=None):
+    """
+    Builds a SummaryAccumulator from stored EquipmentRecord rows, reading
+    them from a server-side cursor ``batch_size`` rows at a time.
+    ``on_chunk`` receives each batch as a DataFrame, like in process_csv().
+    """
+    accumulator = SummaryAccumulator()
+    fields = ['name', 'type', 'flowrate', 'pressure', 'temperature']
+    batch = []
+
+    def flush():
+        chunk = pd.DataFrame(batch, columns=REQUIRED_COLUMNS)
+        chunk['Type'] = chunk['Type'].replace('', None)  # Stored for blank Types
+        accumulator.update(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+
+    for row in records.order_by('row_index').values_list(*fields).iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return accumulator
 
 
 def validate_csv_structure(file):
@@ -16,24 +320,11 @@ def validate_csv_structure(file):
     Returns (is_valid, error_message)
     """
     try:
-        # Read CSV
-        df = pd.read_csv(file)
-        
-        # Check for required columns
-        missing_columns = set(REQUIRED_COLUMNS) - set(df.columns)
-        if missing_columns:
-            return False, f"Missing required columns: {', '.join(missing_columns)}"
-        
-        # Check for numeric columns
-        numeric_columns = ['Flowrate', 'Pressure', 'Temperature']
-        for col in numeric_columns:
-            if not pd.to_numeric(df[col], errors='coerce').notna().all():
-                return False, f"Column '{col}' must contain only numeric values"
-        
+        for _ in iter_csv_chunks(file):
+            pass
         return True, None
-    
-    except Exception as e:
-        return False, f"Error reading CSV: {str(e)}"
+    except CSVValidationError as e:
+        return False, str(e)
 
 
 def analyze_csv(file):
@@ -43,29 +334,8 @@ def analyze_csv(file):
     Returns:
         tuple: (summary_dict, raw_data_list)
     """
-    # Read CSV with Pandas
-    df = pd.read_csv(file)
-    
-    # Calculate summary statistics
-    summary = {
-        "total_equipment": int(len(df)),
-        "average_flowrate": float(df["Flowrate"].mean()),
-        "average_pressure": float(df["Pressure"].mean()),
-        "average_temperature": float(df["Temperature"].mean()),
-        "type_distribution": df["Type"].value_counts().to_dict(),
-        
-        # Additional statistics for better insights
-        "min_flowrate": float(df["Flowrate"].min()),
-        "max_flowrate": float(df["Flowrate"].max()),
-        "min_pressure": float(df["Pressure"].min()),
-        "max_pressure": float(df["Pressure"].max()),
-        "min_temperature": float(df["Temperature"].min()),
-        "max_temperature": float(df["Temperature"].max()),
-    }
-    
-    # Convert DataFrame to list of dictionaries for storage
-    raw_data = df.to_dict(orient="records")
-    
+    raw_data = []
+    summary = process_csv(file, on_records=raw_data.extend)
     return summary, raw_data
 
 
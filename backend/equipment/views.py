@@ -1,30 +1,120 @@
 """
 API Views for Equipment Dataset Management.
 """
+import io
+import os
+
+from asgiref.sync import sync_to_async
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.http import HttpResponse
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.contrib.auth import authenticate, login, logout
 
-from .models import Dataset
-from .serializers import DatasetSerializer, DatasetSummarySerializer
-from .utils import validate_csv_structure, analyze_csv, get_chart_data
-
-# PDF generation imports
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, KeepTogether
-from reportlab.lib import colors
-from reportlab.graphics.shapes import Drawing, Polygon, Circle
-from reportlab.graphics.charts.barcharts import VerticalBarChart
-from reportlab.graphics.charts.piecharts import Pie
-from reportlab.graphics.charts.legends import Legend
+from .models import Anomaly, Dataset, EquipmentRecord, IngestJob, UploadSession
+from .serializers import (AnomalySerializer, DatasetSerializer, DatasetSummarySerializer, EquipmentRecordSerializer,
+                          IngestJobSerializer, UploadedDatasetSerializer, UploadSessionSerializer)
+from .pagination import AnomalyCursorPagination, RecordCursorPagination
+from .anomalies import anomaly_thresholds, anomaly_counts, filter_anomalies
+from .permissions import MetricsAccess
+from .queries import filter_records, parse_ordering, parse_id_list, QueryError
+from .utils import CSVValidationError, SummaryAccumulator, get_chart_data
+from .ingest import ingest_csv, append_csv, find_duplicate, DatasetBusy, DuplicateUpload
+from .jobs import submit_ingest_job, completed_job, schedule_report_prerender
+from .uploads import upload_content_hash
+from .chunked import create_session, write_chunk, complete_session, ChunkedUploadError, UploadIncomplete
+from .reports import get_report_path, ReportQueueFull, REPORT_TEMPLATE_VERSION
+from .streaming import (ranged_file_response, iter_records_csv, iter_dataset_json, aiter_dataset_json, aiter_sync,
+                        EXPORT_FETCH_SIZE)
+from .columnar import parse_columns, encode_queryset, encode_records, encode_arrays
+from .downsampling import parse_trend_params, dataset_trends
+from .cache import acached
+from .async_api import async_api_view, is_asgi
+from .metrics import exposition
+from .renderers import ORJSONRenderer, EventStreamRenderer, PlainTextRenderer, PrometheusTextRenderer
+from .events import iter_event_stream, aiter_event_stream, parse_event_id
+from .profiling import list_profiles, get_profile, profile_text
+from .timing import span
+from .conditional import (make_etag, dataset_version, version_token, etag_matches, not_modified_response,
+                          VERSION_FIELDS)
 
-import io
-from datetime import datetime
+
+def wants_summary_only(request):
+    """
+    True when the client asked for the summary without the row data
+    (``?summary_only=true``).
+    """
+    return request.query_params.get('summary_only', '').lower() in ('1', 'true', 'yes')
+
+
+def wants_columnar(request):
+    """
+    True when content negotiation picked a binary format, in which case
+    rows are returned column-wise.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.format == 'msgpack'
+
+
+def dataset_payload(request, dataset):
+    """
+    Serialized dataset for a request: summary only, JSON rows, or
+    column-wise rows (``?columns=`` picks which) for binary formats.
+
+    Raises:
+        QueryError: if unknown columns are requested
+    """
+    if wants_summary_only(request):
+        return DatasetSummarySerializer(dataset).data
+    if wants_columnar(request):
+        columns = parse_columns(request.query_params.get('columns'))
+        data = DatasetSummarySerializer(dataset).data
+        data.update(encode_queryset(dataset.records.order_by('row_index'), columns))
+        return data
+    return DatasetSerializer(dataset).data
+
+
+async def dataset_response(request, dataset, etag):
+    """
+    Response for a dataset. Full JSON datasets are streamed row batch by
+    row batch (from an async iterator under ASGI); every other form is
+    built in an executor thread and goes through the negotiated renderer.
+
+    Raises:
+        QueryError: if unknown columns are requested
+    """
+    if request.accepted_renderer.format == 'json' and not wants_summary_only(request):
+        iter_rows = aiter_dataset_json if is_asgi(request) else iter_dataset_json
+        response = StreamingHttpResponse(
+            iter_rows(
+                DatasetSummarySerializer(dataset).data,
+                dataset.records.order_by('row_index')
+            ),
+            content_type='application/json'
+        )
+        response['ETag'] = etag
+        return response
+    data = await sync_to_async(dataset_payload)(request, dataset)
+    return Response(data, headers={'ETag': etag})
+
+
+def wants_async(request):
+    """
+    True when the client asked for background ingestion (``?async=true``).
+    """
+    return request.query_params.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def uploaded_dataset_data(request, dataset):
+    """
+    Upload response for a dataset: its summary and, unless
+    ``?summary_only=true``, a link to its rows.
+    """
+    if wants_summary_only(request):
+        return DatasetSummarySerializer(dataset).data
+    return UploadedDatasetSerializer(dataset, context={'request': request}).data
 
 
 @api_view(['POST'])
@@ -85,9 +175,9 @@ def register(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET'])
+@async_api_view(['GET'])
 @permission_classes([AllowAny])
-def check_auth(request):
+async def check_auth(request):
     """
     Check if user is authenticated.
     """
@@ -106,6 +196,13 @@ def upload_csv(request):
     Upload and process CSV file.
     Validates structure, analyzes data, and stores in database.
     Maintains only last 5 uploads for the current user.
+    
+    With ``?async=true`` the file is queued for background analysis and
+    the response is ``202`` with a job to poll at ``/api/jobs/<id>/``.
+    
+    A file whose content the user already uploaded is not analyzed again:
+    the existing dataset (or an already finished job) is returned with
+    ``200``.
     """
     if 'file' not in request.FILES:
         return Response(
@@ -122,60 +219,263 @@ def upload_csv(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Validate CSV structure
-    is_valid, error_message = validate_csv_structure(file)
-    if not is_valid:
+    with span('hash'):
+        content_hash = upload_content_hash(file)
+    duplicate = find_duplicate(request.user, content_hash)
+    if duplicate is not None:
+        if wants_async(request):
+            data = IngestJobSerializer(completed_job(request.user, file.name, duplicate)).data
+        else:
+            data = uploaded_dataset_data(request, duplicate)
+        return Response(data, status=status.HTTP_200_OK)
+    
+    if wants_async(request):
+        job = submit_ingest_job(request.user, file, content_hash)
+        serializer = IngestJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+    
+    # Validate, analyze and store in a single streaming pass
+    try:
+        dataset = ingest_csv(request.user, file, file.name, content_hash=content_hash)
+    except DuplicateUpload as e:
+        # The same file was uploaded concurrently and finished first
+        return Response(uploaded_dataset_data(request, e.dataset), status=status.HTTP_200_OK)
+    except CSVValidationError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        return Response(
+            {'error': f'Error analyzing CSV: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    schedule_report_prerender(dataset)
+    
+    return Response(uploaded_dataset_data(request, dataset), status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_upload(request):
+    """
+    Start a resumable chunked upload.
+    Expects ``file_name`` and ``total_size`` (bytes); ``chunk_size`` is
+    optional. Chunks are then PUT to ``/api/uploads/<id>/chunks/<n>/``.
+    """
+    try:
+        session = create_session(
+            request.user,
+            request.data.get('file_name'),
+            request.data.get('total_size'),
+            request.data.get('chunk_size')
+        )
+    except ChunkedUploadError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    serializer = UploadSessionSerializer(session)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_upload(request, upload_id):
+    """
+    Get a chunked upload's received byte ranges and missing chunks,
+    e.g. to resume it after a dropped connection.
+    """
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response(
+            {'error': 'Upload not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    serializer = UploadSessionSerializer(session)
+    return Response(serializer.data)
+
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def put_upload_chunk(request, upload_id, index):
+    """
+    Store one chunk of a chunked upload.
+    The body is the raw chunk; ``X-Chunk-Checksum`` carries its SHA-256
+    hex digest. Chunks may be sent in any order, in parallel and again.
+    """
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response(
+            {'error': 'Upload not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        chunk = write_chunk(session, index, request.stream or io.BytesIO(), request.headers.get('X-Chunk-Checksum'))
+    except ChunkedUploadError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({'index': chunk.index, 'size': chunk.size, 'checksum': chunk.checksum})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_upload(request, upload_id):
+    """
+    Finish a chunked upload once every chunk has arrived.
+    The assembled file is analyzed in the background; the response is
+    ``202`` with a job to poll at ``/api/jobs/<id>/``.
+    """
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response(
+            {'error': 'Upload not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        job = complete_session(session)
+    except UploadIncomplete as e:
+        return Response(
+            {'error': str(e), 'missing_chunks': e.missing},
+            status=status.HTTP_409_CONFLICT
+        )
+    except ChunkedUploadError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    serializer = IngestJobSerializer(job)
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def append_rows(request, dataset_id):
+    """
+    Append the rows of a CSV file to an existing dataset.
+    Only the new rows are analyzed; the summary is updated incrementally.
+    Returns the updated summary and the number of rows appended.
+    """
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
         return Response(
-            {'error': error_message},
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if 'file' not in request.FILES:
+        return Response(
+            {'error': 'No file provided'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Reset file pointer after validation
-    file.seek(0)
+    file = request.FILES['file']
+    if not file.name.endswith('.csv'):
+        return Response(
+            {'error': 'File must be a CSV'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    # Analyze CSV
     try:
-        summary, raw_data = analyze_csv(file)
+        appended = append_csv(dataset, file)
+    except CSVValidationError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except DatasetBusy as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_409_CONFLICT
+        )
     except Exception as e:
         return Response(
             {'error': f'Error analyzing CSV: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
-    # Create dataset record
-    dataset = Dataset.objects.create(
-        user=request.user,
-        file_name=file.name,
-        summary=summary,
-        raw_data=raw_data
-    )
-    
-    # Keep only last 5 uploads for this user
-    ids_to_keep = list(Dataset.objects.filter(user=request.user).order_by('-uploaded_at').values_list('id', flat=True)[:5])
-    if ids_to_keep:
-        Dataset.objects.filter(user=request.user).exclude(id__in=ids_to_keep).delete()
+    dataset.refresh_from_db()
+    schedule_report_prerender(dataset)
     
-    serializer = DatasetSerializer(dataset)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    data = UploadedDatasetSerializer(dataset, context={'request': request}).data
+    data['rows_appended'] = appended
+    return Response(data, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_summary(request):
+def get_job(request, job_id):
+    """
+    Get progress, per-stage timings and the resulting dataset of an
+    ingestion job.
+    """
+    try:
+        job = IngestJob.objects.get(id=job_id, user=request.user)
+    except IngestJob.DoesNotExist:
+        return Response(
+            {'error': 'Job not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    serializer = IngestJobSerializer(job)
+    return Response(serializer.data)
+
+
+@async_api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def get_summary(request):
     """
     Get the most recent dataset summary for the current user.
+    Pass ``?summary_only=true`` to omit the row data; full JSON
+    responses are streamed.
+    Answers ``If-None-Match`` with ``304`` when nothing changed. The
+    latest dataset's version and summary come from the per-user cache.
     """
+    async def load_latest():
+        # Version of the latest dataset, or () when there is none
+        return await Dataset.objects.filter(user=request.user).values_list(*VERSION_FIELDS).afirst() or ()
+    
+    async def load_summary():
+        return DatasetSummarySerializer(await Dataset.objects.defer('sketches').aget(pk=latest[0])).data
+    
     try:
-        latest_dataset = Dataset.objects.filter(user=request.user).first()
-        if not latest_dataset:
+        latest = await acached(request.user.pk, 'latest', load_latest)
+        if not latest:
             return Response(
                 {'error': 'No datasets uploaded yet'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        serializer = DatasetSerializer(latest_dataset)
-        return Response(serializer.data)
+        version = version_token(*latest)
+        etag = make_etag(request, version)
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        
+        if wants_summary_only(request):
+            data = await acached(request.user.pk, 'summary', load_summary, version)
+            return Response(data, headers={'ETag': etag})
+        
+        latest_dataset = await Dataset.objects.aget(pk=latest[0])
+        return await dataset_response(request, latest_dataset, etag)
     
+    except QueryError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -183,32 +483,281 @@ def get_summary(request):
         )
 
 
-@api_view(['GET'])
+@async_api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_history(request):
+async def get_history(request):
     """
     Get last 5 dataset uploads for the current user.
+    Answers ``If-None-Match`` with ``304`` when nothing changed. Served
+    from the per-user cache until the user's datasets change.
     """
-    datasets = Dataset.objects.filter(user=request.user)[:5]
-    serializer = DatasetSummarySerializer(datasets, many=True)
-    return Response(serializer.data)
+    async def load():
+        datasets = [dataset async for dataset in Dataset.objects.filter(user=request.user).defer('sketches')[:5]]
+        return {
+            'versions': [dataset_version(dataset) for dataset in datasets],
+            'data': DatasetSummarySerializer(datasets, many=True).data,
+        }
+    
+    history = await acached(request.user.pk, 'history', load)
+    etag = make_etag(request, *history['versions'])
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    return Response(history['data'], headers={'ETag': etag})
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_dataset(request, dataset_id):
+def aggregate_datasets(request):
+    """
+    Combined summary across datasets: all of the user's by default, or
+    those listed in ``?datasets=1,2``. Merged from each dataset's stored
+    sketches, so no rows are read.
+    Answers ``If-None-Match`` with ``304`` when nothing changed.
+    """
+    try:
+        dataset_ids = parse_id_list(request.query_params.getlist('datasets'))
+    except QueryError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    datasets = Dataset.objects.filter(user=request.user).order_by('id')
+    if dataset_ids is not None:
+        datasets = datasets.filter(id__in=dataset_ids)
+    versions = list(datasets.values_list(*VERSION_FIELDS))
+    if not versions or (dataset_ids is not None and len(versions) != len(dataset_ids)):
+        return Response(
+            {'error': 'Dataset not found' if dataset_ids else 'No datasets uploaded yet'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    etag = make_etag(request, *(version_token(*version) for version in versions))
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    accumulator = SummaryAccumulator()
+    for sketches in datasets.values_list('sketches', flat=True):
+        accumulator.merge(SummaryAccumulator.from_sketches(sketches))
+    
+    return Response({
+        'datasets': [version[0] for version in versions],
+        'summary': accumulator.to_summary(),
+    }, headers={'ETag': etag})
+
+
+@async_api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def get_dataset(request, dataset_id):
     """
     Get specific dataset by ID (ensuring it belongs to the user).
+    Pass ``?summary_only=true`` to omit the row data. Full JSON
+    responses are streamed; with ``Accept: application/x-msgpack`` rows
+    are returned column-wise.
+    Answers ``If-None-Match`` with ``304`` when nothing changed.
+    """
+    try:
+        dataset = await Dataset.objects.aget(id=dataset_id, user=request.user)
+        etag = make_etag(request, dataset_version(dataset))
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        
+        return await dataset_response(request, dataset, etag)
+    except Dataset.DoesNotExist:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except QueryError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_dataset_rows(request, dataset_id):
+    """
+    Query a dataset's rows, one page at a time.
+    
+    Filters: ``type``, ``<flowrate|pressure|temperature>_min/_max`` and
+    ``name_prefix``. Sort with ``?ordering=-pressure,name`` (default: row
+    index). Supports ``?page_size=N``; follow ``next`` for the following page.
+    Binary formats return each page column-wise.
+    """
+    if not Dataset.objects.filter(id=dataset_id, user=request.user).exists():
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        records = filter_records(
+            EquipmentRecord.objects.filter(dataset_id=dataset_id),
+            request.query_params
+        )
+        ordering = parse_ordering(request.query_params.get('ordering'))
+    except QueryError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    paginator = RecordCursorPagination()
+    paginator.ordering = ordering
+    page = paginator.paginate_queryset(records, request)
+    if wants_columnar(request):
+        try:
+            columns = parse_columns(request.query_params.get('columns'))
+        except QueryError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return paginator.get_paginated_response(encode_records(page, columns))
+    serializer = EquipmentRecordSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_dataset_anomalies(request, dataset_id):
+    """
+    Values of a dataset flagged at upload by z-score, IQR fences or
+    per-Type MAD, one page at a time in row order, with the thresholds
+    they were checked against and counts per column and method.
+    Filters: ``column`` and ``method`` (zscore, iqr or mad).
+    """
+    dataset = Dataset.objects.filter(id=dataset_id, user=request.user).only('id', 'sketches').first()
+    if dataset is None:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    anomalies = Anomaly.objects.filter(dataset_id=dataset_id)
+    try:
+        filtered = filter_anomalies(anomalies, request.query_params)
+    except QueryError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    paginator = AnomalyCursorPagination()
+    page = paginator.paginate_queryset(filtered, request)
+    records = {
+        row_index: (name, equipment_type)
+        for row_index, name, equipment_type in EquipmentRecord.objects.filter(
+            dataset_id=dataset_id, row_index__in={anomaly.row_index for anomaly in page}
+        ).values_list('row_index', 'name', 'type')
+    }
+    response = paginator.get_paginated_response(
+        AnomalySerializer(page, many=True, context={'records': records}).data
+    )
+    response.data['counts'] = anomaly_counts(anomalies)
+    response.data['thresholds'] = anomaly_thresholds(SummaryAccumulator.from_sketches(dataset.sketches))
+    return response
+
+
+@async_api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def get_dataset_trends(request, dataset_id):
+    """
+    Flowrate, Pressure and Temperature of a dataset downsampled for trend
+    charts: ``?points=`` per series (default 500), an optional window
+    of row indexes (``?start=``, ``?end=`` exclusive) and ``?method=``
+    lttb or minmax. Results are cached per dataset version; binary
+    formats return the series as typed buffers.
+    Answers ``If-None-Match`` with ``304`` when nothing changed.
+    """
+    try:
+        params = parse_trend_params(request.query_params)
+        dataset = await Dataset.objects.only(*VERSION_FIELDS).aget(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except QueryError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    version = dataset_version(dataset)
+    etag = make_etag(request, version)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    async def load():
+        return await sync_to_async(dataset_trends)(dataset.id, **params)
+    
+    trends = await acached(request.user.pk, 'trends', load, version, *params.values())
+    data = {'dataset': dataset.id, **trends}
+    if wants_columnar(request):
+        data['columns'] = encode_arrays(trends['columns'])
+    return Response(data, headers={'ETag': etag})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_dataset(request, dataset_id):
+    """
+    Stream a dataset's rows as a CSV file.
+    Accepts the same filters and ordering as the rows endpoint.
     """
     try:
         dataset = Dataset.objects.get(id=dataset_id, user=request.user)
-        serializer = DatasetSerializer(dataset)
-        return Response(serializer.data)
+        records = filter_records(dataset.records.all(), request.query_params)
+        ordering = parse_ordering(request.query_params.get('ordering'))
     except Dataset.DoesNotExist:
         return Response(
             {'error': 'Dataset not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    except QueryError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    file_name = dataset.file_name if dataset.file_name.endswith('.csv') else f'{dataset.file_name}.csv'
+    lines = iter_records_csv(records.order_by(*ordering))
+    response = StreamingHttpResponse(
+        aiter_sync(lines, EXPORT_FETCH_SIZE) if is_asgi(request) else lines,
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
+
+
+@async_api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, EventStreamRenderer])
+async def event_stream(request):
+    """
+    Server-sent events for the current user: ``dataset.created``,
+    ``dataset.updated``, ``retention.deleted`` and ``job.progress``.
+    Reconnecting clients send ``Last-Event-ID`` (or ``?last_event_id=``)
+    to receive what they missed, or a ``resync`` event when that is no
+    longer possible.
+    """
+    last_event_id = parse_event_id(
+        request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_event_id')
+    )
+    if is_asgi(request):
+        events = aiter_event_stream(request.user.pk, last_event_id)
+    else:
+        events = iter_event_stream(request.user.pk, last_event_id)
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keeps nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @api_view(['GET'])
@@ -216,6 +765,10 @@ def get_dataset(request, dataset_id):
 def generate_report(request, dataset_id=None):
     """
     Generate PDF report for a dataset.
+    Reports are cached on disk and only rendered once per summary.
+    Supports ``Range`` requests (with ``If-Range``) for resumable
+    downloads and answers ``If-None-Match`` with ``304`` when nothing
+    changed.
     """
     try:
         # Get dataset
@@ -229,176 +782,20 @@ def generate_report(request, dataset_id=None):
                     status=status.HTTP_404_NOT_FOUND
                 )
         
-        # Create PDF buffer
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # --- Logo ---
-        logo_drawing = Drawing(40, 40)
-        points = [20, 40, 37, 30, 37, 10, 20, 0, 3, 10, 3, 30]
-        hexagon = Polygon(points)
-        hexagon.fillColor = colors.HexColor('#1a5490')
-        hexagon.strokeColor = colors.HexColor('#1a5490')
-        logo_drawing.add(hexagon)
-        
-        circle = Circle(20, 20, 10)
-        circle.fillColor = colors.white
-        circle.strokeColor = colors.white
-        logo_drawing.add(circle)
-        
-        story.append(logo_drawing)
-        story.append(Spacer(1, 0.1*inch))
-        
-        # --- Title ---
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1a5490'),
-            spaceAfter=20,
-            alignment=1  # Center
-        )
-        story.append(Paragraph("Chemical Equipment Parameter Report", title_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # --- Metadata ---
-        info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.HexColor('#555555')
-        )
-        story.append(Paragraph(f"<b>Dataset:</b> {dataset.file_name}", info_style))
-        story.append(Paragraph(f"<b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", info_style))
-        story.append(Paragraph(f"<b>Uploaded:</b> {dataset.uploaded_at.strftime('%Y-%m-%d %H:%M:%S')}", info_style))
-        story.append(Spacer(1, 0.3*inch))
-        
-        # --- Summary Statistics Table ---
-        story.append(Paragraph("<b>Summary Statistics</b>", styles['Heading2']))
-        story.append(Spacer(1, 0.1*inch))
-        
-        summary = dataset.summary
-        
-        # Helper to safely get value
-        def get_val(key, fmt="{:.2f}"):
-            val = summary.get(key)
-            if val is None:
-                return "N/A"
-            return fmt.format(val)
-
-        summary_data = [
-            ['Metric', 'Value', 'Min', 'Max'],
-            ['Total Equipment', str(summary.get('total_equipment', 0)), '-', '-'],
-            ['Flowrate', get_val('average_flowrate'), get_val('min_flowrate'), get_val('max_flowrate')],
-            ['Pressure', get_val('average_pressure'), get_val('min_pressure'), get_val('max_pressure')],
-            ['Temperature', get_val('average_temperature'), get_val('min_temperature'), get_val('max_temperature')],
-        ]
-        
-        summary_table = Table(summary_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a5490')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'), # Left align first column
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f1f2f6')]),
-        ]))
-        story.append(summary_table)
-        story.append(Spacer(1, 0.2*inch))
+        # Unchanged dataset and template: the client's copy is current
+        etag = make_etag(request, dataset_version(dataset), REPORT_TEMPLATE_VERSION)
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
         
-        # --- Bar Chart ---
-        bar_elements = []
-        bar_elements.append(Paragraph("<b>Average Parameters</b>", styles['Heading2']))
-        bar_elements.append(Spacer(1, 0.1*inch))
-        
-        drawing = Drawing(450, 200)
-        bar_chart = VerticalBarChart()
-        bar_chart.x = 50
-        bar_chart.y = 50
-        bar_chart.height = 150
-        bar_chart.width = 350
-        bar_chart.data = [[
-            summary.get('average_flowrate', 0),
-            summary.get('average_pressure', 0),
-            summary.get('average_temperature', 0)
-        ]]
-        bar_chart.categoryAxis.categoryNames = ['Flowrate', 'Pressure', 'Temperature']
-        bar_chart.bars[0].fillColor = colors.HexColor('#1a5490')
-        bar_chart.valueAxis.valueMin = 0
-        drawing.add(bar_chart)
-        bar_elements.append(drawing)
-        
-        story.append(KeepTogether(bar_elements))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # --- Pie Chart ---
-        pie_elements = []
-        pie_elements.append(Paragraph("<b>Equipment Type Distribution</b>", styles['Heading2']))
-        pie_elements.append(Spacer(1, 0.1*inch))
-        
-        pie_drawing = Drawing(450, 250)
-        pie = Pie()
-        pie.x = 20
-        pie.y = 60
-        pie.width = 150
-        pie.height = 150
-        
-        # Data
-        labels = list(summary['type_distribution'].keys())
-        data = list(summary['type_distribution'].values())
-        
-        pie.data = data
-        pie.labels = None # Disable direct labels to avoid overlap
-        
-        # Colors
-        pie_colors = [
-            colors.HexColor('#1a5490'), colors.HexColor('#4a69bd'),
-            colors.HexColor('#6a89cc'), colors.HexColor('#82ccdd'),
-            colors.HexColor('#b8e994'), colors.HexColor('#f8c291'),
-            colors.HexColor('#e55039')
-        ]
-        
-        for i, val in enumerate(pie.data):
-             pie.slices[i].fillColor = pie_colors[i % len(pie_colors)]
-             pie.slices[i].strokeColor = colors.white
-             pie.slices[i].strokeWidth = 1
-        
-        pie_drawing.add(pie)
-        
-        # Legend
-        legend = Legend()
-        legend.x = 220
-        legend.y = 160
-        legend.boxAnchor = 'w'
-        legend.columnMaximum = 10
-        legend.fontName = 'Helvetica'
-        legend.fontSize = 10
-        
-        # Create color/name pairs for legend
-        legend_data = []
-        for i, label in enumerate(labels):
-            color = pie_colors[i % len(pie_colors)]
-            # Add count to label
-            label_text = f"{label} ({data[i]})"
-            legend_data.append((color, label_text))
-            
-        legend.colorNamePairs = legend_data
-        pie_drawing.add(legend)
-        
-        pie_elements.append(pie_drawing)
-        story.append(KeepTogether(pie_elements))
-        
-        # --- Build PDF ---
-        doc.build(story)
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="equipment_report_{dataset.id}.pdf"'
+        # Streamed from the report cache; rendered on a miss
+        report_path = get_report_path(dataset)
+        response = ranged_file_response(
+            request,
+            report_path,
+            filename=f"equipment_report_{dataset.id}.pdf",
+            content_type='application/pdf',
+            etag=etag
+        )
         return response
     
     except Dataset.DoesNotExist:
@@ -406,8 +803,68 @@ def generate_report(request, dataset_id=None):
             {'error': 'Dataset not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    except ReportQueueFull as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(settings.EQUIPMENT_REPORT_RETRY_AFTER)}
+        )
     except Exception as e:
         return Response(
             {'error': f'Error generating report: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['GET'])
+@permission_classes([MetricsAccess])
+@renderer_classes([PrometheusTextRenderer])
+def metrics_view(request):
+    """
+    Request, SQL, cache and report metrics of this process in the
+    Prometheus text format. Open to staff users, to scrapers that send
+    ``Authorization: Bearer <EQUIPMENT_METRICS_TOKEN>`` and to the
+    addresses in ``EQUIPMENT_METRICS_ALLOWED_IPS``; both settings are
+    empty by default. Everything else, a wrong token included, gets a 403
+    rather than a 401, as session authentication sends no challenge.
+    """
+    return Response(exposition())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_profiles_view(request):
+    """
+    Stored request profiles, newest first (staff only).
+    """
+    return Response({'profiles': list_profiles()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes([ORJSONRenderer, PlainTextRenderer])
+def get_profile_view(request, profile_id):
+    """
+    Download a stored profile: a cProfile ``.prof`` file for pstats or
+    snakeviz, or collapsed stacks of a sampled one. ``?format=txt``
+    returns the top functions of a cProfile profile as text instead.
+    """
+    details, data_path = get_profile(profile_id)
+    if details is None:
+        return Response(
+            {'error': 'Profile not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if request.accepted_renderer.format == 'txt':
+        if details['kind'] == 'cprofile':
+            return Response(profile_text(data_path))
+        with open(data_path, encoding='utf-8') as f:
+            return Response(f.read())
+
+    return ranged_file_response(
+        request,
+        data_path,
+        filename=os.path.basename(data_path),
+        content_type='application/octet-stream'
+    )
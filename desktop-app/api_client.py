@@ -1,14 +1,204 @@
 """
 API Client for communicating with Django backend.
 """
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import msgpack
+import numpy as np
 import requests
+import urllib3
 from requests.auth import HTTPBasicAuth
 
 
+# Bytes written per block when streaming downloads to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+MSGPACK_MEDIA_TYPE = 'application/x-msgpack'
+
+# Attempts per chunk before a chunked upload gives up
+CHUNK_RETRIES = 3
+
+# Seconds without data (the server sends keepalives every 15 s) before
+# an event stream is considered dead, and the reconnect backoff limits
+EVENTS_READ_TIMEOUT = 45
+EVENTS_RETRY_DELAY = 3
+EVENTS_MAX_RETRY_DELAY = 60
+
+
+def decode_column(column):
+    """
+    Decode one column of a binary (msgpack) dataset response into a
+    NumPy array. Numeric columns wrap the received buffer directly.
+    """
+    dtype = column['dtype']
+    if dtype == 'str':
+        return np.array(column['values'], dtype=object)
+    if dtype == 'category':
+        codes = np.frombuffer(column['codes']['data'], dtype=column['codes']['dtype'])
+        return np.array(column['categories'], dtype=object)[codes]
+    return np.frombuffer(column['data'], dtype=dtype)
+
+
+def decode_columns(payload):
+    """
+    Replace the encoded 'columns' of a binary response with NumPy arrays.
+    """
+    payload['columns'] = {name: decode_column(column) for name, column in payload['columns'].items()}
+    return payload
+
+
+def iter_stream_lines(response):
+    """
+    Yield the lines of a streaming response as soon as each arrives.
+    (iter_lines() waits for a full block, which holds back small events
+    on servers that do not use chunked encoding.)
+    """
+    buffer = b''
+    while True:
+        chunk = response.raw.read1(DOWNLOAD_CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            break
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        for line in lines:
+            yield line.rstrip(b'\r').decode('utf-8')
+    if buffer:
+        yield buffer.decode('utf-8')
+
+
+def parse_event_stream(lines):
+    """
+    Parse server-sent event lines into (id, type, data) tuples, with
+    data decoded from JSON. A 'retry' hint is reported with type
+    'retry' and the delay in milliseconds as data.
+    """
+    event_id, event_type, data = None, 'message', []
+    for line in lines:
+        if not line:
+            if data:
+                yield event_id, event_type, json.loads('\n'.join(data))
+            event_id, event_type, data = None, 'message', []
+            continue
+        if line.startswith(':'):
+            continue  # Keepalive comment
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'id':
+            event_id = value
+        elif field == 'event':
+            event_type = value
+        elif field == 'data':
+            data.append(value)
+        elif field == 'retry' and value.isdigit():
+            yield None, 'retry', int(value)
+
+
+class EventSubscriber(threading.Thread):
+    """
+    Background thread that follows the server's event stream and calls
+    callback(event_type, data) for every event, reconnecting with
+    Last-Event-ID after errors so no event is missed. callback runs on
+    this thread; GUI code should hand events over to its own thread.
+    After stop() no more callbacks are made; the thread itself ends
+    with the next data or keepalive from the server.
+    """
+    
+    def __init__(self, api_client, callback, on_connection_change=None):
+        super().__init__(daemon=True, name='event-subscriber')
+        self.api_client = api_client
+        self.callback = callback
+        self.on_connection_change = on_connection_change
+        self.last_event_id = None
+        self.connected = False
+        self._stop_event = threading.Event()
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def _set_connected(self, connected):
+        if connected != self.connected and not self._stop_event.is_set():
+            self.connected = connected
+            if self.on_connection_change:
+                self.on_connection_change(connected)
+    
+    def run(self):
+        delay = EVENTS_RETRY_DELAY
+        while not self._stop_event.is_set():
+            try:
+                with self.api_client.open_event_stream(self.last_event_id) as response:
+                    self._set_connected(True)
+                    for event_id, event_type, data in parse_event_stream(iter_stream_lines(response)):
+                        if self._stop_event.is_set():
+                            break
+                        if event_type == 'retry':
+                            delay = data / 1000
+                            continue
+                        if event_id is not None:
+                            self.last_event_id = event_id
+                        self.callback(event_type, data)
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code in (401, 403):
+                    break  # Logged out; reconnecting would not help
+            except (requests.RequestException, urllib3.exceptions.HTTPError, OSError, ValueError):
+                pass
+            self._set_connected(False)
+            # The server ends streams after a while: reconnect after its
+            # retry delay, and back off while it is unreachable
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, EVENTS_MAX_RETRY_DELAY)
+        self._set_connected(False)
+
+
 class APIClient:
     def __init__(self, base_url="http://127.0.0.1:8000/api"):
         self.base_url = base_url
         self.session = requests.Session()
+        # (url, params) -> (etag, parsed body) of conditional GETs
+        self._etag_cache = {}
+        # True when the last conditional GET was answered with 304
+        self.not_modified = False
+    
+    def _get_json(self, url, params=None):
+        """
+        GET a JSON resource, revalidating any cached copy with If-None-Match.
+        A 304 answer returns the cached body and sets self.not_modified.
+        """
+        return self._conditional_get(url, params, 'application/json', lambda r: r.json())
+    
+    def _get_msgpack(self, url, params=None):
+        """
+        GET a binary (msgpack) resource with the same revalidation as _get_json.
+        """
+        return self._conditional_get(
+            url, params, MSGPACK_MEDIA_TYPE,
+            lambda r: decode_columns(msgpack.unpackb(r.content, raw=False))
+        )
+    
+    def _conditional_get(self, url, params, accept, parse):
+        key = (url, tuple(sorted((params or {}).items())), accept)
+        cached = self._etag_cache.get(key)
+        headers = {'Accept': accept}
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        
+        response = self.session.get(url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            self.not_modified = True
+            return cached[1]
+        response.raise_for_status()
+        
+        self.not_modified = False
+        data = parse(response)
+        etag = response.headers.get('ETag')
+        if etag:
+            self._etag_cache[key] = (etag, data)
+        else:
+            self._etag_cache.pop(key, None)
+        return data
     
     def login(self, username, password):
         """
@@ -55,6 +245,7 @@ class APIClient:
         url = f"{self.base_url}/logout/"
         response = self.session.post(url)
         response.raise_for_status()
+        self._etag_cache.clear()
         return response.json()
     
     def check_auth(self):
@@ -69,56 +260,279 @@ class APIClient:
         except:
             return {'authenticated': False}
     
-    def upload_csv(self, file_path):
+    def upload_csv(self, file_path, background=False):
         """
         Upload CSV file to backend.
+        With background=True the server analyzes the file asynchronously
+        and a job is returned; poll it with get_job().
         """
         url = f"{self.base_url}/upload/"
+        params = {'async': 'true'} if background else None
+        with open(file_path, 'rb') as f:
+            files = {'file': f}
+            response = self.session.post(url, files=files, params=params)
+        response.raise_for_status()
+        return response.json()
+    
+    def upload_csv_chunked(self, file_path, chunk_size=None, workers=4, progress_callback=None, upload_id=None):
+        """
+        Upload a large CSV file in checksummed chunks, several at a time.
+        Pass the upload_id of an interrupted upload to send only the
+        chunks the server has not received yet. Returns the background
+        analysis job; poll it with get_job().
+        """
+        if upload_id:
+            upload = self.get_upload(upload_id)
+        else:
+            response = self.session.post(f"{self.base_url}/uploads/", json={
+                'file_name': os.path.basename(file_path),
+                'total_size': os.path.getsize(file_path),
+                'chunk_size': chunk_size,
+            })
+            response.raise_for_status()
+            upload = response.json()
+        
+        url = f"{self.base_url}/uploads/{upload['id']}/"
+        total = upload['total_size']
+        pending = upload['missing_chunks']
+        done = total - sum(self._chunk_length(upload, index) for index in pending)
+        if progress_callback:
+            progress_callback(done, total, upload['id'])
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._put_chunk, url, file_path, upload, index) for index in pending]
+            for future in as_completed(futures):
+                done += future.result()
+                if progress_callback:
+                    progress_callback(done, total, upload['id'])
+        
+        response = self.session.post(f"{url}complete/")
+        response.raise_for_status()
+        return response.json()
+    
+    def get_upload(self, upload_id):
+        """
+        Get a chunked upload's received byte ranges and missing chunks.
+        """
+        url = f"{self.base_url}/uploads/{upload_id}/"
+        response = self.session.get(url)
+        response.raise_for_status()
+        return response.json()
+    
+    @staticmethod
+    def _chunk_length(upload, index):
+        return min(upload['chunk_size'], upload['total_size'] - index * upload['chunk_size'])
+    
+    def _put_chunk(self, url, file_path, upload, index):
+        with open(file_path, 'rb') as f:
+            f.seek(index * upload['chunk_size'])
+            data = f.read(self._chunk_length(upload, index))
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'X-Chunk-Checksum': hashlib.sha256(data).hexdigest(),
+        }
+        for attempt in range(CHUNK_RETRIES):
+            try:
+                response = self.session.put(f"{url}chunks/{index}/", data=data, headers=headers)
+                response.raise_for_status()
+                return len(data)
+            except requests.RequestException:
+                if attempt == CHUNK_RETRIES - 1:
+                    raise
+    
+    def append_csv(self, dataset_id, file_path):
+        """
+        Append the rows of a CSV file to an existing dataset.
+        Returns the updated summary and the number of rows appended.
+        """
+        url = f"{self.base_url}/dataset/{dataset_id}/append/"
         with open(file_path, 'rb') as f:
             files = {'file': f}
             response = self.session.post(url, files=files)
         response.raise_for_status()
         return response.json()
     
-    def get_summary(self):
+    def get_job(self, job_id):
         """
-        Get latest dataset summary.
+        Get status and progress of a background upload job.
         """
-        url = f"{self.base_url}/summary/"
+        url = f"{self.base_url}/jobs/{job_id}/"
         response = self.session.get(url)
         response.raise_for_status()
         return response.json()
     
+    def open_event_stream(self, last_event_id=None):
+        """
+        Open the server-sent event stream of the logged-in user.
+        Events after last_event_id are replayed first. Returns the
+        streaming response; see EventSubscriber for reading it.
+        """
+        url = f"{self.base_url}/events/"
+        headers = {'Accept': 'text/event-stream'}
+        if last_event_id:
+            headers['Last-Event-ID'] = str(last_event_id)
+        response = self.session.get(url, headers=headers, stream=True, timeout=(10, EVENTS_READ_TIMEOUT))
+        response.raise_for_status()
+        return response
+    
+    def subscribe_events(self, callback, on_connection_change=None):
+        """
+        Follow the event stream in a background thread, calling
+        callback(event_type, data) for each event ('dataset.created',
+        'dataset.updated', 'retention.deleted', 'job.progress' or
+        'resync'). Returns the started EventSubscriber; stop() it on logout.
+        """
+        subscriber = EventSubscriber(self, callback, on_connection_change)
+        subscriber.start()
+        return subscriber
+    
+    def get_summary(self, summary_only=False):
+        """
+        Get latest dataset summary.
+        With summary_only, the row data is left out of the response.
+        """
+        url = f"{self.base_url}/summary/"
+        params = {'summary_only': 'true'} if summary_only else None
+        return self._get_json(url, params)
+    
     def get_history(self):
         """
         Get last 5 uploads.
         """
         url = f"{self.base_url}/history/"
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.json()
+        return self._get_json(url)
+    
+    def get_aggregate(self, dataset_ids=None):
+        """
+        Get a summary combined across datasets (all uploads if no IDs).
+        """
+        url = f"{self.base_url}/aggregate/"
+        params = {'datasets': ','.join(str(pk) for pk in dataset_ids)} if dataset_ids else None
+        return self._get_json(url, params)
     
-    def get_dataset(self, dataset_id):
+    def get_dataset(self, dataset_id, summary_only=False):
         """
         Get specific dataset by ID.
         """
         url = f"{self.base_url}/dataset/{dataset_id}/"
-        response = self.session.get(url)
+        params = {'summary_only': 'true'} if summary_only else None
+        return self._get_json(url, params)
+    
+    def get_columns(self, dataset_id=None, columns=None):
+        """
+        Get a dataset (latest if no ID) with its rows as NumPy columns,
+        using the binary columnar format. columns limits which are sent,
+        e.g. ['Flowrate', 'Pressure', 'Temperature'].
+        """
+        if dataset_id:
+            url = f"{self.base_url}/dataset/{dataset_id}/"
+        else:
+            url = f"{self.base_url}/summary/"
+        params = {'columns': ','.join(columns)} if columns else None
+        return self._get_msgpack(url, params)
+    
+    def get_trends(self, dataset_id, points=500, start=None, end=None, method='lttb'):
+        """
+        Get a dataset's Flowrate, Pressure and Temperature downsampled
+        server-side to about `points` points per series, optionally for
+        a window of row indexes [start, end). 'columns' holds NumPy
+        arrays: row_index plus one per series.
+        """
+        url = f"{self.base_url}/dataset/{dataset_id}/trends/"
+        params = {'points': points, 'method': method}
+        if start is not None:
+            params['start'] = start
+        if end is not None:
+            params['end'] = end
+        return self._get_msgpack(url, params)
+    
+    def get_rows(self, dataset_id=None, page_size=500, next_url=None, ordering=None, **filters):
+        """
+        Get one page of dataset rows.
+        Filters (type, flowrate_min, name_prefix, ...) and ordering are
+        applied server-side. Pass the previous page's 'next' link as
+        next_url to continue.
+        """
+        if next_url:
+            response = self.session.get(next_url)
+        else:
+            url = f"{self.base_url}/dataset/{dataset_id}/rows/"
+            params = {'page_size': page_size, **filters}
+            if ordering:
+                params['ordering'] = ordering
+            response = self.session.get(url, params=params)
         response.raise_for_status()
         return response.json()
     
-    def download_report(self, dataset_id=None, save_path="report.pdf"):
+    def download_report(self, dataset_id=None, save_path="report.pdf", progress_callback=None):
         """
         Download PDF report.
+        progress_callback(bytes_done, total_bytes) is called as blocks arrive.
         """
         url = f"{self.base_url}/report/"
         if dataset_id:
             url = f"{self.base_url}/report/{dataset_id}/"
         
-        response = self.session.get(url)
-        response.raise_for_status()
+        return self._download(url, save_path, progress_callback)
+    
+    def export_csv(self, dataset_id, save_path, progress_callback=None, **filters):
+        """
+        Download a dataset's rows as CSV, optionally filtered server-side.
+        """
+        url = f"{self.base_url}/dataset/{dataset_id}/export/"
+        return self._download(url, save_path, progress_callback, params=filters)
+    
+    def _download(self, url, save_path, progress_callback=None, params=None):
+        """
+        Stream a download to disk in blocks.
+        Data goes to '<save_path>.part' first, with the response's ETag
+        kept in '<save_path>.part.etag'. If an earlier attempt left both
+        behind, only the missing bytes are requested, with a Range header
+        and an If-Range header so that a file that changed meanwhile is
+        sent whole instead of being spliced onto the old bytes.
+        """
+        part_path = f"{save_path}.part"
+        etag_path = f"{part_path}.etag"
+        etag = None
+        if os.path.exists(part_path) and os.path.exists(etag_path):
+            with open(etag_path, encoding='utf-8') as f:
+                etag = f.read().strip() or None
+        done = os.path.getsize(part_path) if etag and os.path.exists(part_path) else 0
+        headers = {'Range': f"bytes={done}-", 'If-Range': etag} if done else {}
         
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
+        with self.session.get(url, params=params, headers=headers, stream=True) as response:
+            if response.status_code == 416:
+                # Nothing left to fetch (or the file changed); start over
+                os.remove(part_path)
+                if os.path.exists(etag_path):
+                    os.remove(etag_path)
+                return self._download(url, save_path, progress_callback, params)
+            response.raise_for_status()
+            
+            if response.status_code == 206:
+                total = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+                mode = 'ab'
+            else:
+                # A whole file: the server ignored or rejected the range
+                length = response.headers.get('Content-Length')
+                total = int(length) if length else None
+                done = 0
+                mode = 'wb'
+                new_etag = response.headers.get('ETag')
+                if new_etag:
+                    with open(etag_path, 'w', encoding='utf-8') as f:
+                        f.write(new_etag)
+                elif os.path.exists(etag_path):
+                    os.remove(etag_path)
+            
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    done += len(chunk)
+                    if progress_callback:
+                        progress_callback(done, total)
         
+        os.replace(part_path, save_path)
+        if os.path.exists(etag_path):
+            os.remove(etag_path)
         return save_path
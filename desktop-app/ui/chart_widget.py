@@ -9,6 +9,9 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 class ChartWidget(QWidget):
+    # Points per series requested for the trend chart
+    TREND_POINTS = 500
+
     def __init__(self):
         super().__init__()
         self.animations_enabled = True
@@ -105,6 +108,11 @@ class ChartWidget(QWidget):
         self.animations_enabled = enabled
             
     def update_charts(self, summary, raw_data):
+        """
+        Redraw all charts. raw_data is either a list of row dicts or the
+        server's downsampled trends: a dict of NumPy columns (row_index,
+        Flowrate, Pressure, Temperature).
+        """
         if not summary:
             return
         
@@ -177,9 +185,10 @@ class ChartWidget(QWidget):
         self.ax2.set_title('Equipment Distribution', fontsize=14, fontweight='bold', pad=10, color='#333333')
         
         # --- Line Chart (Trends) ---
-        if raw_data:
-            step = 10 if len(raw_data) > 100 else 1
-            indices = np.array(list(range(1, len(raw_data) + 1))[::step])
+        row_count = len(raw_data['Flowrate']) if isinstance(raw_data, dict) else len(raw_data or [])
+        if row_count:
+            step = 10 if row_count > 100 else 1
+            indices = np.arange(1, row_count + 1)[::step]
             
             # Helper: Catmull-Rom Spline
             def catmull_rom_spline(x, y, num_points=20):
@@ -211,9 +220,16 @@ class ChartWidget(QWidget):
                     ax.plot(x, y, label=label, color=color, linewidth=2, zorder=3)
                     ax.fill_between(x, y, color=color, alpha=0.1, zorder=2)
 
-            flowrates = np.array([d['Flowrate'] for d in raw_data][::step])
-            pressures = np.array([d['Pressure'] for d in raw_data][::step])
-            temperatures = np.array([d['Temperature'] for d in raw_data][::step])
+            if isinstance(raw_data, dict):
+                # Already downsampled by the server (LTTB), spikes included
+                indices = raw_data['row_index'] + 1
+                flowrates = raw_data['Flowrate']
+                pressures = raw_data['Pressure']
+                temperatures = raw_data['Temperature']
+            else:
+                flowrates = np.array([d['Flowrate'] for d in raw_data][::step])
+                pressures = np.array([d['Pressure'] for d in raw_data][::step])
+                temperatures = np.array([d['Temperature'] for d in raw_data][::step])
             
             self.chart_elements['lines'] = {
                 'x': indices,
@@ -1,12 +1,12 @@
 """
 Main window for the desktop application.
 """
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTabWidget, QPushButton, QLabel, QMessageBox,
                              QDialog, QLineEdit, QFormLayout, QDialogButtonBox,
                              QFileDialog, QStatusBar, QTableWidget, QTableWidgetItem,
                              QHeaderView, QScrollArea, QSizePolicy, QGraphicsOpacityEffect)
-from PyQt5.QtCore import Qt, QSize, QPropertyAnimation, QEasingCurve, QTimer
+from PyQt5.QtCore import Qt, QSize, QPropertyAnimation, QEasingCurve, QTimer, pyqtSignal
 from PyQt5.QtGui import QIcon
 
 from .upload_widget import UploadWidget
@@ -166,12 +166,25 @@ class SignupDialog(QDialog):
 
 
 class MainWindow(QMainWindow):
+    # Server events, delivered from the subscriber thread to the GUI thread
+    event_received = pyqtSignal(str, object)
+    events_connection_changed = pyqtSignal(bool)
+    
     def __init__(self, api_client):
         super().__init__()
         self.api_client = api_client
         self.current_dataset = None
+        self.next_rows_url = None
+        self.history = []
         self.animations_enabled = True
         self.init_ui()
+        
+        # Follow the server's events instead of polling
+        self.event_received.connect(self.on_event)
+        self.events_connection_changed.connect(self.upload_widget.set_events_connected)
+        self.event_subscriber = self.api_client.subscribe_events(
+            self.event_received.emit, self.events_connection_changed.emit
+        )
     
     def init_ui(self):
         self.setWindowTitle("Chemical Equipment Parameter Visualizer")
@@ -394,6 +407,7 @@ class MainWindow(QMainWindow):
         self.table_widget = TableWidget()
         self.table_widget.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.MinimumExpanding)
         self.table_widget.setMinimumHeight(250)
+        self.table_widget.load_more_requested.connect(self.load_more_rows)
         layout.addWidget(self.table_widget)
         
         self.dashboard_content.setLayout(layout)
@@ -450,15 +464,14 @@ class MainWindow(QMainWindow):
         try:
             self.statusBar.showMessage("Loading data...")
             
-            # Get latest summary
-            data = self.api_client.get_summary()
-            self.current_dataset = data
-            
-            # Update widgets
-            self.context_label.setText(f"Showing analysis for: {data['file_name']}")
-            self.summary_widget.update_summary(data['summary'])
-            self.chart_widget.update_charts(data['summary'], data['raw_data'])
-            self.table_widget.update_data(data['raw_data'])
+            # Get latest summary, then only the first page of rows
+            data = self.api_client.get_summary(summary_only=True)
+            if self.api_client.not_modified and self.current_dataset:
+                # Nothing changed on the server; keep what is on screen
+                self.statusBar.showMessage(f"Up to date: {data['file_name']}")
+                self.opacity_effect.setOpacity(1.0)
+                return
+            self.show_dataset(data)
             
             # Get history
             history_data = self.api_client.get_history()
@@ -478,9 +491,60 @@ class MainWindow(QMainWindow):
             self.statusBar.showMessage("No data available")
             self.opacity_effect.setOpacity(1.0)
 
+    def show_dataset(self, data):
+        """Show a dataset's summary (as received) with its first rows and trends."""
+        self.current_dataset = data
+        page = self.api_client.get_rows(data['id'])
+        self.next_rows_url = page['next']
+        
+        # Update widgets
+        self.context_label.setText(f"Showing analysis for: {data['file_name']}")
+        self.summary_widget.update_summary(data['summary'])
+        trends = self.api_client.get_trends(data['id'], points=self.chart_widget.TREND_POINTS)
+        self.chart_widget.update_charts(data['summary'], trends['columns'])
+        self.table_widget.update_data(page['results'])
+        self.table_widget.set_has_more(bool(self.next_rows_url))
+
+    def on_event(self, event_type, data):
+        """
+        Apply a server event. New and appended datasets arrive with their
+        summary, so only their rows and trends are downloaded.
+        """
+        try:
+            if event_type in ('dataset.created', 'dataset.updated'):
+                self.update_history([data] + [item for item in self.history if item['id'] != data['id']][:4])
+                current_id = self.current_dataset['id'] if self.current_dataset else None
+                if event_type == 'dataset.created' or data['id'] == current_id:
+                    self.show_dataset(data)
+                    self.statusBar.showMessage(f"Loaded: {data['file_name']}")
+            elif event_type == 'retention.deleted':
+                self.update_history([item for item in self.history if item['id'] not in data['ids']])
+            elif event_type == 'job.progress':
+                self.upload_widget.on_job_event(data)
+                if data['status'] == 'running':
+                    self.statusBar.showMessage(f"Analyzing {data['file_name']}... {int(data['progress'] * 100)}%")
+            elif event_type == 'resync':
+                # Events were missed; start over from the server's state
+                self.load_data()
+        except Exception as e:
+            self.statusBar.showMessage(f"Failed to apply update: {str(e)}")
+
+    def load_more_rows(self):
+        """Fetch the next page of rows into the data table."""
+        if not self.next_rows_url:
+            return
+        try:
+            page = self.api_client.get_rows(next_url=self.next_rows_url)
+            self.next_rows_url = page['next']
+            self.table_widget.append_data(page['results'])
+            self.table_widget.set_has_more(bool(self.next_rows_url))
+        except Exception as e:
+            self.statusBar.showMessage(f"Failed to load rows: {str(e)}")
+
     def update_history(self, history_data):
         """Update history table."""
         from datetime import datetime
+        self.history = history_data
         self.history_table.setRowCount(len(history_data))
         for i, item in enumerate(history_data):
             # Filename
@@ -515,9 +579,13 @@ class MainWindow(QMainWindow):
             
             self.history_table.setCellWidget(i, 3, btn_container)
     
-    def on_upload_success(self):
+    def on_upload_success(self, dataset_id):
         """Handle successful upload."""
-        self.load_data()
+        current_id = self.current_dataset['id'] if self.current_dataset else None
+        # When connected, the dataset.created event has already updated the
+        # dashboard; a repeated upload only sends dataset.updated
+        if not self.event_subscriber.connected or current_id != dataset_id:
+            self.load_data()
         self.tabs.setCurrentIndex(1)  # Switch to dashboard
     
     def download_report(self, dataset_id=None):
@@ -546,7 +614,8 @@ class MainWindow(QMainWindow):
                 self.statusBar.showMessage("Generating report...")
                 self.api_client.download_report(
                     target_id,
-                    file_path
+                    file_path,
+                    progress_callback=self.on_download_progress
                 )
                 self.statusBar.showMessage(f"Report saved: {file_path}")
                 QMessageBox.information(
@@ -563,8 +632,17 @@ class MainWindow(QMainWindow):
             )
             self.statusBar.showMessage("Report download failed")
     
+    def on_download_progress(self, done, total):
+        """Show download progress in the status bar."""
+        if total:
+            self.statusBar.showMessage(f"Downloading report... {done * 100 // total}%")
+        else:
+            self.statusBar.showMessage(f"Downloading report... {done // 1024} KB")
+        QApplication.processEvents()
+    
     def logout(self):
         """Logout and close application."""
+        self.event_subscriber.stop()
         try:
             self.api_client.logout()
         except:
@@ -582,6 +660,7 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
+            self.event_subscriber.stop()
             event.accept()
         else:
             event.ignore()
@@ -57,6 +57,12 @@ class CardWidget(QFrame):
             self.unit_label = QLabel(self.unit)
             self.unit_label.setStyleSheet("color: #9CA3AF; font-size: 12px; font-style: italic;")
             text_layout.addWidget(self.unit_label)
+        
+        # Spread of the value (median, std dev), hidden until set
+        self.detail_label = QLabel("")
+        self.detail_label.setStyleSheet("color: #6B7280; font-size: 12px;")
+        self.detail_label.hide()
+        text_layout.addWidget(self.detail_label)
             
         layout.addLayout(text_layout)
         
@@ -92,6 +98,10 @@ class CardWidget(QFrame):
         self.step = target / 20 # 20 steps
         self.timer.start(50) # 50ms * 20 = 1000ms
 
+    def set_detail(self, text):
+        self.detail_label.setText(text)
+        self.detail_label.setVisible(bool(text))
+
     def _update_animation(self):
         self.current_value += self.step
         
@@ -160,6 +170,14 @@ class SummaryWidget(QWidget):
         self.flowrate_card.set_value(f"{summary['average_flowrate']:.2f}")
         self.pressure_card.set_value(f"{summary['average_pressure']:.2f}")
         self.temperature_card.set_value(f"{summary['average_temperature']:.2f}")
+        
+        # Median and std dev are precomputed by the backend at upload
+        statistics = summary.get('statistics', {})
+        for card, column in ((self.flowrate_card, 'Flowrate'),
+                             (self.pressure_card, 'Pressure'),
+                             (self.temperature_card, 'Temperature')):
+            described = statistics.get(column)
+            card.set_detail(f"Median {described['median']:.2f} · σ {described['std']:.2f}" if described else "")
     
     def clear(self):
         """
@@ -169,3 +187,5 @@ class SummaryWidget(QWidget):
         self.flowrate_card.set_value("0.00", animate=False)
         self.pressure_card.set_value("0.00", animate=False)
         self.temperature_card.set_value("0.00", animate=False)
+        for card in (self.flowrate_card, self.pressure_card, self.temperature_card):
+            card.set_detail("")
@@ -2,11 +2,13 @@
 Table widget for displaying equipment data.
 """
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem, 
-                             QGroupBox, QHeaderView)
-from PyQt5.QtCore import Qt
+                             QGroupBox, QHeaderView, QPushButton)
+from PyQt5.QtCore import Qt, pyqtSignal
 
 
 class TableWidget(QWidget):
+    load_more_requested = pyqtSignal()
+    
     def __init__(self):
         super().__init__()
         self.init_ui()
@@ -57,6 +59,13 @@ class TableWidget(QWidget):
         header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
         
         group_layout.addWidget(self.table)
+        
+        # Rows are fetched page by page; this loads the next page
+        self.load_more_btn = QPushButton("Load more rows")
+        self.load_more_btn.setVisible(False)
+        self.load_more_btn.clicked.connect(self.load_more_requested.emit)
+        group_layout.addWidget(self.load_more_btn)
+        
         group.setLayout(group_layout)
         layout.addWidget(group)
         
@@ -66,13 +75,20 @@ class TableWidget(QWidget):
         """
         Update table with equipment data.
         """
+        self.table.setRowCount(0)
+        self.append_data(raw_data)
+    
+    def append_data(self, raw_data):
+        """
+        Append equipment rows below the ones already shown.
+        """
         if not raw_data:
-            self.table.setRowCount(0)
             return
         
-        self.table.setRowCount(len(raw_data))
+        start = self.table.rowCount()
+        self.table.setRowCount(start + len(raw_data))
         
-        for row_idx, row_data in enumerate(raw_data):
+        for row_idx, row_data in enumerate(raw_data, start):
             # Equipment Name
             item = QTableWidgetItem(row_data.get('Equipment Name', ''))
             self.table.setItem(row_idx, 0, item)
@@ -100,8 +116,15 @@ class TableWidget(QWidget):
             item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
             self.table.setItem(row_idx, 4, item)
     
+    def set_has_more(self, has_more):
+        """
+        Show or hide the load-more button.
+        """
+        self.load_more_btn.setVisible(has_more)
+    
     def clear(self):
         """
         Clear table data.
         """
         self.table.setRowCount(0)
+        self.load_more_btn.setVisible(False)
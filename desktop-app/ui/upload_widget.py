@@ -1,18 +1,28 @@
 """
 Upload widget for CSV file selection and upload.
 """
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                              QLabel, QFileDialog, QMessageBox, QGroupBox)
-from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer
 
 
 class UploadWidget(QWidget):
-    upload_success = pyqtSignal()
+    upload_success = pyqtSignal(int)  # Id of the resulting dataset
     
     def __init__(self, api_client):
         super().__init__()
         self.api_client = api_client
         self.selected_file = None
+        self.current_job_id = None
+        self.upload_id = None  # Chunked upload to resume if sending fails
+        # True while job progress arrives as server events
+        self.events_connected = False
+        
+        # Polls the background analysis job when events are not available
+        self.job_timer = QTimer(self)
+        self.job_timer.setInterval(500)
+        self.job_timer.timeout.connect(self.poll_job)
+        
         self.init_ui()
     
     def init_ui(self):
@@ -102,6 +112,7 @@ class UploadWidget(QWidget):
         
         if file_path:
             self.selected_file = file_path
+            self.upload_id = None
             self.file_label.setText(file_path.split('/')[-1])
             self.upload_btn.setEnabled(True)
     
@@ -113,9 +124,54 @@ class UploadWidget(QWidget):
             self.upload_btn.setEnabled(False)
             self.upload_btn.setText("Uploading...")
             
-            # Upload to backend
-            result = self.api_client.upload_csv(self.selected_file)
+            # Upload to backend in chunks; analysis continues in the background.
+            # A retry after a failure resumes with the chunks still missing.
+            job = self.api_client.upload_csv_chunked(
+                self.selected_file,
+                progress_callback=self.on_upload_progress,
+                upload_id=self.upload_id
+            )
+            self.upload_id = None
+            self.current_job_id = job['id']
+            self.upload_btn.setText("Analyzing...")
+            if not self.events_connected:
+                self.job_timer.start()
             
+        except Exception as e:
+            self.on_upload_failed(str(e))
+    
+    def on_upload_progress(self, done, total, upload_id):
+        self.upload_id = upload_id
+        self.upload_btn.setText(f"Uploading... {int(done * 100 / total)}%")
+        QApplication.processEvents()
+    
+    def set_events_connected(self, connected):
+        """Poll the running job only while server events are unavailable."""
+        self.events_connected = connected
+        if connected:
+            self.job_timer.stop()
+        elif self.current_job_id:
+            self.job_timer.start()
+    
+    def on_job_event(self, job):
+        """Handle a job.progress event from the server."""
+        if job['id'] == self.current_job_id:
+            self.update_job(job)
+    
+    def poll_job(self):
+        """Check on the background analysis job."""
+        try:
+            job = self.api_client.get_job(self.current_job_id)
+        except Exception as e:
+            self.job_timer.stop()
+            self.on_upload_failed(str(e))
+            return
+        self.update_job(job)
+    
+    def update_job(self, job):
+        """Show a job's progress, or its outcome once it is finished."""
+        if job['status'] == 'succeeded':
+            self.job_timer.stop()
             QMessageBox.information(
                 self,
                 "Success",
@@ -123,21 +179,30 @@ class UploadWidget(QWidget):
             )
             
             # Reset
+            dataset_id = job['dataset']
             self.selected_file = None
+            self.current_job_id = None
+            self.upload_id = None
             self.file_label.setText("No file selected")
             self.upload_btn.setText("Upload & Analyze")
             
             # Emit success signal
-            self.upload_success.emit()
-            
-        except Exception as e:
-            QMessageBox.critical(
-                self,
-                "Upload Error",
-                f"Failed to upload file:\n{str(e)}"
-            )
-            self.upload_btn.setEnabled(True)
-            self.upload_btn.setText("Upload & Analyze")
+            self.upload_success.emit(dataset_id)
+        elif job['status'] == 'failed':
+            self.job_timer.stop()
+            self.on_upload_failed(job['error'])
+        else:
+            self.upload_btn.setText(f"Analyzing... {int(job['progress'] * 100)}%")
+    
+    def on_upload_failed(self, message):
+        QMessageBox.critical(
+            self,
+            "Upload Error",
+            f"Failed to upload file:\n{message}"
+        )
+        self.current_job_id = None
+        self.upload_btn.setEnabled(True)
+        self.upload_btn.setText("Upload & Analyze")
     
     def toggle_info(self):
         """Toggle visibility of requirements info."""
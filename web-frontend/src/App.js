@@ -4,7 +4,7 @@ import UploadForm from './components/UploadForm';
 import SummaryCards from './components/SummaryCards';
 import DataTable from './components/DataTable';
 import Charts from './components/Charts';
-import { getSummary, getHistory, downloadReport } from './services/api';
+import { getSummary, getHistory, getRows, getTrends, downloadReport, subscribeEvents } from './services/api';
 import { checkAuth, logout } from './services/auth';
 import './App.css';
 
@@ -12,6 +12,9 @@ function App() {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [loading, setLoading] = useState(true);
   const [currentDataset, setCurrentDataset] = useState(null);
+  const [rows, setRows] = useState([]);
+  const [nextRowsUrl, setNextRowsUrl] = useState(null);
+  const [trends, setTrends] = useState(null);
   const [history, setHistory] = useState([]);
   // Animations are now always enabled by default
   const enableAnimations = true;
@@ -44,9 +47,14 @@ function App() {
         await new Promise(resolve => setTimeout(resolve, 300));
       }
 
-      // Try to get latest summary
-      const summaryData = await getSummary();
+      // Try to get latest summary, then only the first page of rows and
+      // the server-side downsampled trends
+      const summaryData = await getSummary({ summaryOnly: true });
+      const [rowsPage, trendsData] = await Promise.all([getRows(summaryData.id), getTrends(summaryData.id)]);
       setCurrentDataset(summaryData);
+      setRows(rowsPage.results);
+      setNextRowsUrl(rowsPage.next);
+      setTrends(trendsData);
 
       // Get history
       const historyData = await getHistory();
@@ -60,6 +68,13 @@ function App() {
     }
   }, []); // Stable dependency array
 
+  const loadMoreRows = async () => {
+    if (!nextRowsUrl) return;
+    const rowsPage = await getRows(null, { nextUrl: nextRowsUrl });
+    setRows(prevRows => [...prevRows, ...rowsPage.results]);
+    setNextRowsUrl(rowsPage.next);
+  };
+
   useEffect(() => {
     // Load data if authenticated
     if (isAuthenticated) {
@@ -67,6 +82,41 @@ function App() {
     }
   }, [isAuthenticated, loadData]);
 
+  // Server events keep the dashboard current without polling; a new or
+  // grown dataset arrives with its summary, so only its rows and trends
+  // are fetched
+  const showDataset = React.useCallback(async (dataset) => {
+    const [rowsPage, trendsData] = await Promise.all([getRows(dataset.id), getTrends(dataset.id)]);
+    setCurrentDataset(dataset);
+    setRows(rowsPage.results);
+    setNextRowsUrl(rowsPage.next);
+    setTrends(trendsData);
+  }, []);
+
+  const eventsConnectedRef = React.useRef(false);
+
+  useEffect(() => {
+    if (!isAuthenticated) return undefined;
+    const close = subscribeEvents((type, data) => {
+      if (type === 'dataset.created' || type === 'dataset.updated') {
+        setHistory(prev => [data, ...prev.filter(item => item.id !== data.id)].slice(0, 5));
+        if (type === 'dataset.created' || currentDatasetRef.current?.id === data.id) {
+          showDataset(data).catch(() => loadData());
+        }
+      } else if (type === 'retention.deleted') {
+        setHistory(prev => prev.filter(item => !data.ids.includes(item.id)));
+      } else if (type === 'resync') {
+        loadData();
+      }
+    }, (open) => {
+      eventsConnectedRef.current = open;
+    });
+    return () => {
+      close();
+      eventsConnectedRef.current = false;
+    };
+  }, [isAuthenticated, loadData, showDataset]);
+
 
   const getRelativeTime = (dateString) => {
     const date = new Date(dateString);
@@ -91,8 +141,12 @@ function App() {
     setHistory([]);
   };
 
-  const handleUploadSuccess = () => {
-    loadData();
+  const handleUploadSuccess = (dataset) => {
+    // When connected, the dataset.created event updates the dashboard. A
+    // repeated upload only sends dataset.updated, so it is loaded here.
+    if (!eventsConnectedRef.current || currentDatasetRef.current?.id !== dataset?.id) {
+      loadData();
+    }
     setActiveTab('dashboard');
   };
 
@@ -178,8 +232,8 @@ function App() {
                   Showing analysis for: <strong>{currentDataset.file_name}</strong>
                 </p>
 
-                <Charts summary={currentDataset.summary} data={currentDataset.raw_data} enableAnimations={enableAnimations} />
-                <DataTable data={currentDataset.raw_data} />
+                <Charts summary={currentDataset.summary} trends={trends} enableAnimations={enableAnimations} />
+                <DataTable data={rows} hasMore={Boolean(nextRowsUrl)} onLoadMore={loadMoreRows} />
               </>
             ) : (
               <div className="no-data-placeholder">
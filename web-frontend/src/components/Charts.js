@@ -25,7 +25,7 @@ ChartJS.register(
   ArcElement
 );
 
-function Charts({ summary, data, enableAnimations = true }) {
+function Charts({ summary, trends, enableAnimations = true }) {
   if (!summary) {
     return <div className="no-data">No data available for charts.</div>;
   }
@@ -169,16 +169,19 @@ function Charts({ summary, data, enableAnimations = true }) {
   };
 
   // Line chart data - Trends
-  // Downsample data for readability (show every 10th point if > 100 points)
-  const step = data && data.length > 100 ? 10 : 1;
-  const filteredData = data ? data.filter((_, i) => i % step === 0) : [];
+  // Downsampled by the server (LTTB), so spikes survive and only a few
+  // hundred points per series are sent
+  const trendColumns = trends ? trends.columns : null;
 
-  const lineData = data ? {
-    labels: filteredData.map((_, index) => (index * step) + 1),
+  // Draw the line in within a second however many points there are
+  const pointDelay = trendColumns ? Math.min(5, 1000 / trendColumns.row_index.length) : 5;
+
+  const lineData = trendColumns ? {
+    labels: trendColumns.row_index.map(index => index + 1),
     datasets: [
       {
         label: 'Flowrate',
-        data: filteredData.map(d => d.Flowrate),
+        data: trendColumns.Flowrate,
         borderColor: 'rgba(46, 204, 113, 0.8)', // Slight transparency
         backgroundColor: 'rgba(46, 204, 113, 0.1)', // Lower opacity
         tension: 0.4,
@@ -188,7 +191,7 @@ function Charts({ summary, data, enableAnimations = true }) {
       },
       {
         label: 'Pressure',
-        data: filteredData.map(d => d.Pressure),
+        data: trendColumns.Pressure,
         borderColor: 'rgba(59, 130, 246, 0.8)',
         backgroundColor: 'rgba(59, 130, 246, 0.1)',
         tension: 0.4,
@@ -198,7 +201,7 @@ function Charts({ summary, data, enableAnimations = true }) {
       },
       {
         label: 'Temperature',
-        data: filteredData.map(d => d.Temperature),
+        data: trendColumns.Temperature,
         borderColor: 'rgba(239, 68, 68, 0.8)',
         backgroundColor: 'rgba(239, 68, 68, 0.1)',
         tension: 0.4,
@@ -224,7 +227,7 @@ function Charts({ summary, data, enableAnimations = true }) {
             return 0;
           }
           ctx.xStarted = true;
-          return ctx.index * 5;
+          return ctx.index * pointDelay;
         }
       },
     },
@@ -1,6 +1,6 @@
 import React from 'react';
 
-function DataTable({ data }) {
+function DataTable({ data, hasMore = false, onLoadMore }) {
   if (!data || data.length === 0) {
     return <div className="no-data">No equipment data available.</div>;
   }
@@ -21,7 +21,7 @@ function DataTable({ data }) {
           </thead>
           <tbody>
             {data.map((row, index) => (
-              <tr key={index}>
+              <tr key={row.row_index ?? index}>
                 <td>{row['Equipment Name']}</td>
                 <td>
                   <span className="type-badge">{row.Type}</span>
@@ -34,6 +34,11 @@ function DataTable({ data }) {
           </tbody>
         </table>
       </div>
+      {hasMore && (
+        <button onClick={onLoadMore} className="btn-secondary">
+          Load more rows
+        </button>
+      )}
     </div>
   );
 }
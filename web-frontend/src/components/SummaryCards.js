@@ -32,6 +32,13 @@ function SummaryCards({ summary, enableAnimations = true }) {
     return <div className="no-data">No data available. Please upload a CSV file.</div>;
   }
 
+  // Median and std dev are precomputed by the backend at upload
+  const statistics = summary.statistics || {};
+  const detail = (column) => {
+    const described = statistics[column];
+    return described ? `Median ${described.median.toFixed(2)} · σ ${described.std.toFixed(2)}` : null;
+  };
+
   const cards = [
     {
       title: 'Total Equipment',
@@ -46,6 +53,7 @@ function SummaryCards({ summary, enableAnimations = true }) {
     {
       title: 'Avg Flowrate',
       value: summary.average_flowrate,
+      detail: detail('Flowrate'),
       unit: 'm³/h',
       decimals: 2,
       icon: '💧',
@@ -56,6 +64,7 @@ function SummaryCards({ summary, enableAnimations = true }) {
     {
       title: 'Avg Pressure',
       value: summary.average_pressure,
+      detail: detail('Pressure'),
       unit: 'bar',
       decimals: 2,
       icon: '⚙️',
@@ -66,6 +75,7 @@ function SummaryCards({ summary, enableAnimations = true }) {
     {
       title: 'Avg Temperature',
       value: summary.average_temperature,
+      detail: detail('Temperature'),
       unit: '°C',
       decimals: 2,
       icon: '🌡️',
@@ -93,6 +103,7 @@ function SummaryCards({ summary, enableAnimations = true }) {
               <CountUp end={card.value} decimals={card.decimals} enabled={enableAnimations} />
             </p>
             {card.unit && <p className="card-unit" style={{ fontSize: '0.8rem', color: '#9CA3AF', marginTop: '2px' }}>{card.unit}</p>}
+            {card.detail && <p className="card-detail" style={{ fontSize: '0.75rem', color: '#6B7280', marginTop: '2px' }}>{card.detail}</p>}
           </div>
         </div>
       ))}
@@ -32,7 +32,7 @@ function UploadForm({ onUploadSuccess }) {
     setSuccess('');
 
     try {
-      await uploadCSV(selectedFile);
+      const dataset = await uploadCSV(selectedFile);
       setSuccess('File uploaded and analyzed successfully!');
       setSelectedFile(null);
 
@@ -42,7 +42,7 @@ function UploadForm({ onUploadSuccess }) {
 
       // Notify parent component
       if (onUploadSuccess) {
-        onUploadSuccess();
+        onUploadSuccess(dataset);
       }
     } catch (err) {
       setError(err.response?.data?.error || 'Upload failed. Please try again.');
@@ -23,11 +23,30 @@ export const uploadCSV = async (file) => {
   return response.data;
 };
 
+/**
+ * Append the rows of a CSV file to an existing dataset
+ */
+export const appendCSV = async (datasetId, file) => {
+  const formData = new FormData();
+  formData.append('file', file);
+
+  const response = await axios.post(`${API_BASE_URL}/dataset/${datasetId}/append/`, formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  });
+
+  return response.data;
+};
+
 /**
  * Get latest dataset summary
+ * Pass summaryOnly to leave the row data out of the response
  */
-export const getSummary = async () => {
-  const response = await axios.get(`${API_BASE_URL}/summary/`);
+export const getSummary = async ({ summaryOnly = false } = {}) => {
+  const response = await axios.get(`${API_BASE_URL}/summary/`, {
+    params: summaryOnly ? { summary_only: 'true' } : undefined,
+  });
   return response.data;
 };
 
@@ -39,6 +58,15 @@ export const getHistory = async () => {
   return response.data;
 };
 
+/**
+ * Get a summary combined across datasets (all of the user's by default)
+ */
+export const getAggregate = async (datasetIds = null) => {
+  const params = datasetIds ? { datasets: datasetIds.join(',') } : {};
+  const response = await axios.get(`${API_BASE_URL}/aggregate/`, { params });
+  return response.data;
+};
+
 /**
  * Get specific dataset by ID
  */
@@ -47,6 +75,48 @@ export const getDataset = async (datasetId) => {
   return response.data;
 };
 
+/**
+ * Get one page of dataset rows
+ * Pass the previous page's `next` link as nextUrl to continue
+ */
+export const getRows = async (datasetId, { pageSize = 500, nextUrl = null } = {}) => {
+  const response = nextUrl
+    ? await axios.get(nextUrl)
+    : await axios.get(`${API_BASE_URL}/dataset/${datasetId}/rows/`, {
+      params: { page_size: pageSize },
+    });
+  return response.data;
+};
+
+/**
+ * Get a dataset's Flowrate, Pressure and Temperature downsampled by the
+ * server to about `points` points per series (LTTB), optionally for the
+ * window of row indexes [start, end). Columns share `columns.row_index`.
+ */
+export const getTrends = async (datasetId, { points = 500, start, end, method = 'lttb' } = {}) => {
+  const response = await axios.get(`${API_BASE_URL}/dataset/${datasetId}/trends/`, {
+    params: { points, start, end, method },
+  });
+  return response.data;
+};
+
+/**
+ * Follow the server's events for the logged-in user
+ * onEvent(type, data) is called for dataset.created, dataset.updated,
+ * retention.deleted, job.progress and resync. EventSource reconnects on
+ * its own, resuming from the last event it saw; onConnectionChange(open)
+ * reports when it is connected. Returns a function that closes the stream.
+ */
+export const subscribeEvents = (onEvent, onConnectionChange = () => {}) => {
+  const source = new EventSource(`${API_BASE_URL}/events/`, { withCredentials: true });
+  source.onopen = () => onConnectionChange(true);
+  source.onerror = () => onConnectionChange(false);
+  ['dataset.created', 'dataset.updated', 'retention.deleted', 'job.progress', 'resync'].forEach((type) => {
+    source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+  });
+  return () => source.close();
+};
+
 /**
  * Download PDF report
  */
@@ -111,8 +181,11 @@ export const downloadReport = async (datasetId = null) => {
 
 export default {
   uploadCSV,
+  appendCSV,
   getSummary,
   getHistory,
+  getAggregate,
   getDataset,
+  subscribeEvents,
   downloadReport,
 };